@@ -1,11 +1,61 @@
 import streamlit as st
+from streamlit.errors import StreamlitAPIException
 from datetime import datetime
+import atexit
+import functools
 import json
+import os
+import sqlite3
 import time
+import uuid
+
+from corpus import DocumentCorpus, GithubSource, cached_pdf_text
+from conversation import (
+    HISTORY_BUDGET_CHARS, RECENT_TURNS, REQUEST_BUDGET_CHARS, build_history, history_budget, new_summary
+)
+from corpus_index import DEFAULT_INDEX_PATH, MappedIndex
+from intents import ANSWER_SUBMISSION, GREETING, HELP, INTENTS, LOCAL_INTENTS, NINE_MARK, QUIZ_REQUEST, IntentRouter
+from llm import CONNECT_TIMEOUT, POOL_SIZE, REQUEST_TIMEOUT, ClientRegistry
+from metrics import Metrics
+from outbox import DEFAULT_OUTBOX_PATH, Outbox
+from prompting import SYSTEM_PROMPT, openai_request, record_usage
+from providers import (
+    FIRST_TOKEN_DEADLINE, HEDGE_MIN_DELAY, TOTAL_DEADLINE, AnthropicProvider, OpenAIProvider, ProviderPool, StubProvider
+)
+from question_bank import (
+    DEFAULT_BANK_PATH, QuestionBank, answer_key, format_quiz, marks_fraction, quiz_length, unit_for, wants_mcq
+)
+from quiz_store import DEFAULT_STORE_PATH, QuizStore
+from rendering import REVEAL_FPS, IncrementalHtml, markdown_to_html, message_html, reveal_frames
+from response_cache import MAX_ENTRIES, SIMILARITY_THRESHOLD, TTL_SECONDS, ResponseCache, is_cacheable
+from retrieval import (
+    CHARS_PER_TOKEN, CONTEXT_BUDGET_CHARS, TOP_K, BM25Index, full_context, full_context_chars, pack_context
+)
+from routing import EXTENDED_MARKING, GENERAL, SHORT_MARKING, load_routes, record_route_usage, route_for, timed
+from scheduler import REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE, Scheduler
+from sheets import BATCH_SIZE, FLUSH_INTERVAL, MemoryBuffer, SheetWriter, open_google_sheet
+from singleflight import SingleFlight, request_fingerprint
+from speculation import MAX_WORKERS, Speculation, new_pool
+from text_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, TextCache
 
 # Typing speed control
 TYPING_DELAY = 0.06
 
+# Minimum seconds between redraws while a reply is streaming in
+STREAM_UPDATE_INTERVAL = 0.05
+
+# Messages drawn on every rerun; older ones are loaded a page at a time on request
+HISTORY_WINDOW = 20
+HISTORY_PAGE = 20
+
+# Records or students shown per page in the teacher dashboard
+DASHBOARD_PAGE = 25
+
+CHAT_INPUT_PLACEHOLDER = "Ask a Business question or request a quiz…"
+
+# Topic used when a question was asked before onboarding
+PENDING_PROMPT_TOPIC = "OCR GCSE Business"
+
 def get_dynamic_delay(message):
     length = len(message)
     if length < 80:
@@ -40,6 +90,10 @@ elif is_admin:
 if 'messages' not in st.session_state:
     st.session_state.messages = []
 
+# Identifies this session in the shared request queue
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
 # Student identity & session metadata
 if 'student_name' not in st.session_state:
     st.session_state.student_name = ""
@@ -61,10 +115,19 @@ if 'quiz_history' not in st.session_state:
     st.session_state.quiz_history = []
 if 'current_quiz_set' not in st.session_state:
     st.session_state.current_quiz_set = None
+# Question bank: questions already set this session, the last quiz set from it, and marks per unit
+if 'bank_seen' not in st.session_state:
+    st.session_state.bank_seen = set()
+if 'bank_quiz' not in st.session_state:
+    st.session_state.bank_quiz = None
+if 'bank_mastery' not in st.session_state:
+    st.session_state.bank_mastery = {}
 
 # Pending prompt state
 if 'pending_prompt' not in st.session_state:
     st.session_state.pending_prompt = None
+if 'speculation' not in st.session_state:
+    st.session_state.speculation = None
 if 'pending_source' not in st.session_state:
     st.session_state.pending_source = None
 
@@ -72,19 +135,46 @@ if 'pending_source' not in st.session_state:
 if 'setup_started' not in st.session_state:
     st.session_state.setup_started = False
 
+# Pages of older messages the student has asked to see above the recent window
+if 'history_pages' not in st.session_state:
+    st.session_state.history_pages = 0
+
 # NEW: Track which message should show typing effect (store message index)
 if 'typing_message_index' not in st.session_state:
     st.session_state.typing_message_index = None
 
+# Rolling summary of turns that have aged out of the model's context window
+if 'context_summary' not in st.session_state:
+    st.session_state.context_summary = new_summary()
+# Messages answered by the tutor so far; only the first can share a cached reply
+if 'model_turns' not in st.session_state:
+    st.session_state.model_turns = 0
+
+# On-disk cache of extracted PDF text, keyed by content hash
+@st.cache_resource
+def get_text_cache():
+    """Open the PDF text cache once per server process"""
+    cache_dir = st.secrets.get("PDF_TEXT_CACHE_DIR", DEFAULT_CACHE_DIR)
+    max_mb = st.secrets.get("PDF_TEXT_CACHE_MB", DEFAULT_MAX_BYTES // (1024 * 1024))
+    return TextCache(cache_dir, max_bytes=int(max_mb) * 1024 * 1024)
+
+# Process-wide document corpus, shared by every browser session
+@st.cache_resource
+def get_document_corpus():
+    """Create the document corpus once per server process"""
+    return DocumentCorpus(text_cache=get_text_cache())
+
+document_corpus = get_document_corpus()
+
 # GitHub document loading function
 def load_documents_from_github():
-    """Load documents from GitHub using credentials in secrets"""
+    """Sync the shared corpus with GitHub using credentials in secrets"""
     error_log = []
     
     try:
         if 'github' not in st.secrets:
             error_log.append("❌ No 'github' section in secrets")
-            st.session_state['github_error'] = error_log
+            document_corpus.error_log = error_log
             return {}
         
         github_token = st.secrets['github'].get('token', '')
@@ -92,94 +182,215 @@ def load_documents_from_github():
         
         if not github_token or not repo_name:
             error_log.append("❌ Missing token or repo_name")
-            st.session_state['github_error'] = error_log
+            document_corpus.error_log = error_log
             return {}
         
         error_log.append(f"📡 Connecting to GitHub repo: {repo_name}")
         
         from github import Github
-        import base64
         
         g = Github(github_token)
         repo = g.get_repo(repo_name)
         
         error_log.append(f"✅ Connected to repository: {repo.full_name}")
         
-        def get_all_files(path=""):
-            all_files = []
-            try:
-                contents = repo.get_contents(path)
-                error_log.append(f"📂 Scanning folder: '{path if path else 'root'}' - found {len(contents)} items")
-                for content in contents:
-                    if content.type == "dir":
-                        error_log.append(f"📁 Entering subfolder: {content.path}")
-                        all_files.extend(get_all_files(content.path))
-                    elif content.name.endswith(('.txt', '.pdf', '.docx', '.doc', '.md')):
-                        error_log.append(f"📄 Found file: {content.name}")
-                        all_files.append(content)
-                    else:
-                        error_log.append(f"⏭️ Skipped (wrong type): {content.name}")
-            except Exception as e:
-                error_log.append(f"⚠️ Error reading path '{path}': {str(e)}")
-            return all_files
-        
-        files = get_all_files()
-        error_log.append(f"📊 Total files to process: {len(files)}")
-        documents = {}
-        
-        for idx, content in enumerate(files):
-            try:
-                # Handle different file types
-                if content.name.endswith('.txt') or content.name.endswith('.md'):
-                    text = content.decoded_content.decode('utf-8', errors='ignore')
-                    error_log.append(f"✅ Loaded text file: {content.name} ({len(text)} chars)")
-                elif content.name.endswith('.pdf'):
-                    # For PDFs, we need to decode and extract text
-                    import PyPDF2
-                    from io import BytesIO
-                    pdf_content = BytesIO(content.decoded_content)
-                    pdf_reader = PyPDF2.PdfReader(pdf_content)
-                    text = ""
-                    for page in pdf_reader.pages:
-                        text += page.extract_text() + "\n\n"
-                    error_log.append(f"✅ Loaded PDF: {content.name} ({len(text)} chars)")
-                elif content.name.endswith(('.docx', '.doc')):
-                    # For Word docs, note that they're present but need conversion
-                    text = f"[Word document: {content.name}]\nNote: Word documents need to be converted to .txt or .pdf for processing."
-                    error_log.append(f"⚠️ Word doc found (needs conversion): {content.name}")
-                else:
-                    continue
-                
-                documents[f"doc_{idx}"] = {
-                    'name': content.name,
-                    'type': 'GitHub Document',
-                    'content': text,
-                    'uploaded_at': datetime.now().strftime("%Y-%m-%d %H:%M")
-                }
-            except Exception as e:
-                error_log.append(f"❌ Error loading {content.name}: {str(e)}")
-                continue
-        
-        error_log.append(f"✅ Successfully loaded {len(documents)} documents")
-        st.session_state['github_error'] = error_log
-        return documents
+        # One recursive tree call, then only blobs whose SHA changed are downloaded
+        workers = int(st.secrets['github'].get('download_workers', 8))
+        return document_corpus.refresh(GithubSource(repo), error_log, max_workers=workers)
     except Exception as e:
         error_log.append(f"❌ Fatal error: {str(e)}")
-        st.session_state['github_error'] = error_log
+        document_corpus.error_log = error_log
         return {}
 
-# Initialize uploaded documents
-if 'uploaded_documents' not in st.session_state:
+def load_initial_documents():
+    """First load of the shared corpus, falling back to the DOCUMENTS_JSON secret"""
+    # A prebuilt index (see corpus_index.py) makes cold start a file mmap
+    index_path = st.secrets.get("CORPUS_INDEX_PATH", DEFAULT_INDEX_PATH)
+    if os.path.exists(index_path):
+        try:
+            document_corpus.load_index(MappedIndex(index_path))
+        except Exception as e:
+            print(f"Failed to load corpus index {index_path}: {e}")
+        else:
+            # The artifact is a snapshot: its blob SHAs are checked against GitHub and changed files fetched
+            if 'github' in st.secrets:
+                index_log = document_corpus.error_log
+                load_documents_from_github()
+                document_corpus.error_log = index_log + document_corpus.error_log
+            return
     try:
         github_docs = load_documents_from_github()
-        if github_docs:
-            st.session_state.uploaded_documents = github_docs
-        elif 'DOCUMENTS_JSON' in st.secrets:
-            st.session_state.uploaded_documents = json.loads(st.secrets['DOCUMENTS_JSON'])
-        else:
-            st.session_state.uploaded_documents = {}
+        if not github_docs and 'DOCUMENTS_JSON' in st.secrets:
+            document_corpus.replace(json.loads(st.secrets['DOCUMENTS_JSON']))
     except:
-        st.session_state.uploaded_documents = {}
+        pass
+
+# Initialize uploaded documents (loaded once per process, not once per session)
+document_corpus.ensure_loaded(load_initial_documents)
+st.session_state.uploaded_documents = document_corpus.documents
+
+# Teacher-adjustable settings shared by every session
+@st.cache_resource
+def get_runtime_settings():
+    """Process-wide settings the teacher dashboard can change at runtime"""
+    return {
+        'retrieval_enabled': True,
+        'retrieval_top_k': int(st.secrets.get("RETRIEVAL_TOP_K", TOP_K)),
+        'retrieval_budget_chars': int(st.secrets.get("RETRIEVAL_BUDGET_CHARS", CONTEXT_BUDGET_CHARS)),
+        'response_cache_enabled': bool(st.secrets.get("RESPONSE_CACHE_ENABLED", True)),
+        'speculation_enabled': bool(st.secrets.get("SPECULATIVE_ONBOARDING", True)),
+        'intent_routing_enabled': bool(st.secrets.get("INTENT_ROUTING", True)),
+        'question_bank_enabled': bool(st.secrets.get("QUESTION_BANK", True)),
+        'question_bank_adaptive': bool(st.secrets.get("QUESTION_BANK_ADAPTIVE", True)),
+    }
+
+runtime_settings = get_runtime_settings()
+
+# Counters and timings shown in the teacher Performance tab
+@st.cache_resource
+def get_metrics():
+    """Process-wide metrics shared by every session"""
+    return Metrics()
+
+app_metrics = get_metrics()
+
+# Provider clients (and their keep-alive connection pools) shared by every session
+@st.cache_resource
+def get_client_registry():
+    """Create the provider client registry once per server process"""
+    return ClientRegistry(
+        pool_size=int(st.secrets.get("LLM_POOL_SIZE", POOL_SIZE)),
+        timeout=float(st.secrets.get("LLM_TIMEOUT", REQUEST_TIMEOUT)),
+        connect_timeout=float(st.secrets.get("LLM_CONNECT_TIMEOUT", CONNECT_TIMEOUT)),
+        # Rate-limited requests are retried by the scheduler, which pauses every session, not inside its slot
+        max_retries=0,
+        base_urls={
+            "openai": st.secrets.get("OPENAI_BASE_URL"),
+            "anthropic": st.secrets.get("ANTHROPIC_BASE_URL"),
+        }
+    )
+
+# Both providers behind one interface, tried in order with deadlines and circuit breakers
+@st.cache_resource
+def get_provider_pool():
+    """Create the provider pool once per server process"""
+    registry = get_client_registry()
+    providers = []
+    if st.secrets.get("OPENAI_API_KEY", ""):
+        providers.append(OpenAIProvider(registry.get("openai", st.secrets["OPENAI_API_KEY"])))
+    if st.secrets.get("ANTHROPIC_API_KEY", ""):
+        providers.append(AnthropicProvider(registry.get("anthropic", st.secrets["ANTHROPIC_API_KEY"])))
+    # Local stand-ins with injected latency and errors, for trying the app without API keys
+    for options in st.secrets.get("LLM_STUB_PROVIDERS", []):
+        providers.append(StubProvider(**dict(options)))
+    return ProviderPool(
+        providers,
+        first_token_deadline=float(st.secrets.get("LLM_FIRST_TOKEN_DEADLINE", FIRST_TOKEN_DEADLINE)),
+        total_deadline=float(st.secrets.get("LLM_DEADLINE", TOTAL_DEADLINE)),
+        hedge=bool(st.secrets.get("LLM_HEDGE", False)),
+        hedge_min_delay=float(st.secrets.get("LLM_HEDGE_MIN_DELAY", HEDGE_MIN_DELAY)),
+        metrics=app_metrics
+    )
+
+# Every session's model requests queue here, within the provider's rate limits
+@st.cache_resource
+def get_scheduler():
+    """Create the shared request scheduler once per server process"""
+    return Scheduler(
+        requests_per_minute=int(st.secrets.get("LLM_REQUESTS_PER_MINUTE", REQUESTS_PER_MINUTE)),
+        tokens_per_minute=int(st.secrets.get("LLM_TOKENS_PER_MINUTE", TOKENS_PER_MINUTE)),
+        max_concurrent=int(st.secrets.get("LLM_POOL_SIZE", POOL_SIZE)),
+        metrics=app_metrics
+    )
+
+# Identical requests in flight at the same moment share one provider call
+@st.cache_resource
+def get_single_flight():
+    """Create the shared in-flight request table once per server process"""
+    return SingleFlight(metrics=app_metrics)
+
+# Replies to repeated questions, shared by every session
+@st.cache_resource
+def get_response_cache():
+    """Create the shared response cache once per server process"""
+    return ResponseCache(
+        threshold=float(st.secrets.get("RESPONSE_CACHE_THRESHOLD", SIMILARITY_THRESHOLD)),
+        ttl=float(st.secrets.get("RESPONSE_CACHE_TTL_HOURS", TTL_SECONDS / 3600)) * 3600,
+        max_entries=int(st.secrets.get("RESPONSE_CACHE_MAX_ENTRIES", MAX_ENTRIES))
+    )
+
+# Local classifier answering greetings, help and off-topic messages without a model call
+@st.cache_resource
+def get_intent_router():
+    """Train the intent classifier once per server process"""
+    return IntentRouter.from_file()
+
+# Pre-generated quiz questions (see question_bank.py), or None if the bank has not been built
+@st.cache_resource
+def get_question_bank():
+    """Map the question bank once per server process"""
+    path = st.secrets.get("QUESTION_BANK_PATH", DEFAULT_BANK_PATH)
+    if not os.path.exists(path):
+        return None
+    try:
+        return QuestionBank(path)
+    except (OSError, ValueError) as e:
+        print(f"Question bank not loaded: {e}")
+        return None
+
+# Quiz records from every session, for the teacher dashboard
+@st.cache_resource
+def get_quiz_store():
+    """Open the shared quiz-history store once per server process"""
+    try:
+        return QuizStore(st.secrets.get("QUIZ_STORE_PATH", DEFAULT_STORE_PATH))
+    except (OSError, sqlite3.Error) as e:
+        # Without a writable disk, records are shared in memory until the server restarts
+        print(f"Quiz history store unavailable, keeping it in memory: {e}")
+        return QuizStore(":memory:")
+
+# Background writer draining the local outbox to Google Sheets in batches
+@st.cache_resource
+def get_sheet_writer():
+    """Start the Sheets writer once per server process, or None if Sheets is not configured"""
+    if 'gsheet' not in st.secrets or 'SHEET_ID' not in st.secrets:
+        return None
+    try:
+        buffer = Outbox(st.secrets.get("SHEETS_OUTBOX_PATH", DEFAULT_OUTBOX_PATH))
+    except (OSError, sqlite3.Error) as e:
+        # Without a writable disk, records wait in memory instead
+        print(f"Sheets outbox unavailable, buffering in memory: {e}")
+        buffer = MemoryBuffer()
+    writer = SheetWriter(
+        functools.partial(open_google_sheet, dict(st.secrets["gsheet"]), st.secrets["SHEET_ID"]),
+        buffer=buffer,
+        batch_size=int(st.secrets.get("SHEETS_BATCH_SIZE", BATCH_SIZE)),
+        flush_interval=float(st.secrets.get("SHEETS_FLUSH_SECONDS", FLUSH_INTERVAL)),
+        metrics=app_metrics
+    )
+    # Rows still buffered when the server stops are written before it exits
+    atexit.register(writer.close)
+    return writer
+
+# Model, output length and context size per class of request
+@st.cache_resource
+def get_model_routes():
+    """Default routes with overrides from the MODEL_ROUTES secrets table"""
+    return load_routes(st.secrets.get("MODEL_ROUTES", {}))
+
+# Worker threads answering pending prompts while students onboard
+@st.cache_resource
+def get_speculation_pool():
+    """Create the speculative request pool once per server process"""
+    return new_pool(int(st.secrets.get("SPECULATION_WORKERS", MAX_WORKERS)))
+
+# BM25 index over the shared corpus, rebuilt only when the corpus changes
+@st.cache_resource(max_entries=1)
+def get_retrieval_index(corpus_version):
+    """Chunk and index the current corpus, reusing the prebuilt index while it is current"""
+    if document_corpus.mapped_index is not None and corpus_version == document_corpus.mapped_version:
+        return document_corpus.mapped_index
+    return BM25Index.from_documents(document_corpus.documents)
 
 # Custom CSS
 st.markdown("""
@@ -303,58 +514,12 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# System prompt
-SYSTEM_PROMPT = """You are the OCR Business Revision Buddy, a friendly AI tutor for OCR GCSE Business (J204).
-
-🎓 BEHAVIOUR RULES:
-- Only answer OCR GCSE Business (J204) questions
-- Use British English always
-- Be friendly, supportive, encouraging, clear and structured
-- Use OCR command words: Identify, State, Explain, Analyse, Evaluate, Justify
-
-📚 CONTENT:
-- Component 1 - Business 1: business activity, marketing and people (01):
-  * Units 1.1-1.6: Business activity
-  * Units 2.1-2.4: Marketing
-  * Units 3.1-3.7: People
-- Component 2 - Business 2: operations, finance and influences on business (02):
-  * Units 4.1-4.6: Operations
-  * Units 5.1-5.5: Finance
-  * Units 6.1-6.3: Influences on business
-  * Unit 7: The interdependent nature of business
-- Use real business examples (cafés, gyms, shops, services)
-- Keep explanations concise and exam-focused
-
-📝 QUIZ/TEST BEHAVIOUR - CRITICAL:
-When student asks for tests/quizzes/MCQs/practice questions:
-1. Generate 3-5 exam-style questions
-2. Mix AO1 (1-2 marks), AO2 (2-3 marks), AO3 (3-6+ marks)
-3. ⚠️ DO NOT give answers in same response
-4. Say: "Here are your questions. Try them first, then send me your answers and I'll mark them."
-5. Only reveal answers when student submits their answers
-
-✅ MARKING BEHAVIOUR:
-When student submits answers:
-- Mark each question separately
-- State AO level (AO1/AO2/AO3)
-- Show: ✅ What was good, ❌ What was missing
-- Provide model answer
-- Give "💡 Next time" tip
-
-🚫 SAFETY:
-If non-Business topics: "I'm designed for OCR GCSE Business (J204). What Business topic would you like to revise?"
-
-Use uploaded documents if available for accuracy."""
-
 def extract_text_from_pdf(pdf_file):
     """Extract text from PDF file"""
     try:
-        import PyPDF2
         pdf_file.seek(0)
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n\n"
+        # Re-uploads of the same file are served from the text cache
+        text = cached_pdf_text(pdf_file.read(), get_text_cache())
         return text if len(text.strip()) > 100 else f"⚠️ Only {len(text)} characters extracted."
     except Exception as e:
         return f"❌ Error: {str(e)}"
@@ -381,239 +546,497 @@ def process_uploaded_file(uploaded_file, doc_type):
             'uploaded_at': datetime.now().strftime("%Y-%m-%d %H:%M")
         }
 
-def show_admin_panel():
-    """Show admin panel for document management and student tracking"""
-    st.markdown("## 🔧 Teacher Dashboard")
-    
-    # Create tabs for different sections
-    tab1, tab2, tab3, tab4 = st.tabs(["📚 Documents", "📊 Quiz History", "👥 Students", "📈 Analytics"])
+def class_filter(quiz_store, key):
+    """Class picker for a dashboard list; ``None`` means every class"""
+    choice = st.selectbox("Class", ["All classes"] + quiz_store.classes(), key=key)
+    return None if choice == "All classes" else choice
+
+def page_offset(total, key):
+    """Page picker for a dashboard list of ``total`` items; returns the chosen page's offset"""
+    pages = max(1, -(-total // DASHBOARD_PAGE))
+    if pages == 1:
+        return 0
+    page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, step=1, key=key)
+    return (int(page) - 1) * DASHBOARD_PAGE
+
+def rerun_fragment():
+    """Rerun only the fragment this is called from, or the whole app outside a fragment rerun"""
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        # Fragment-scoped reruns are refused during a full-app run
+        st.rerun()
+
+@st.fragment
+def admin_documents_tab():
+    """Documents tab: GitHub sync, PDF text cache and loaded documents"""
+    st.markdown("### Document Management")
     
-    with tab1:
-        st.markdown("### Document Management")
+    if 'github' in st.secrets:
+        st.success(f"✅ Connected to GitHub: `{st.secrets['github']['repo_name']}`")
+        st.info(f"📚 {len(st.session_state.uploaded_documents)} documents loaded")
         
-        if 'github' in st.secrets:
-            st.success(f"✅ Connected to GitHub: `{st.secrets['github']['repo_name']}`")
-            st.info(f"📚 {len(st.session_state.uploaded_documents)} documents loaded")
-            
-            # Show any errors from GitHub loading
-            if 'github_error' in st.session_state and st.session_state['github_error']:
-                st.warning("**Loading Log:**")
-                for error in st.session_state['github_error']:
-                    st.write(error)
-            
-            if st.button("🔄 Reload from GitHub"):
-                with st.spinner("Loading documents from GitHub..."):
-                    github_docs = load_documents_from_github()
-                    if github_docs:
-                        st.session_state.uploaded_documents = github_docs
-                        st.success(f"✅ Reloaded {len(github_docs)} documents!")
-                    else:
-                        st.error("⚠️ No documents loaded. Check the log above for details.")
-                st.rerun()
+        cache_stats = get_text_cache().stats()
+        lookups = cache_stats['hits'] + cache_stats['misses']
+        hit_rate = f"{cache_stats['hits'] / lookups:.0%}" if lookups else "n/a"
+        st.caption(
+            f"🗄️ PDF text cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses ({hit_rate}) · "
+            f"{cache_stats['entries']} entries · {cache_stats['bytes'] / (1024 * 1024):.1f} MB · "
+            f"{cache_stats['evictions']} evicted"
+        )
         
-        if st.session_state.uploaded_documents:
-            st.markdown("**Loaded Documents:**")
-            for doc_id, doc in st.session_state.uploaded_documents.items():
-                st.write(f"- {doc['name']} ({doc['type']})")
-        else:
-            st.info("No documents currently loaded. Click 'Reload from GitHub' to load documents.")
-    
-    with tab2:
-        st.markdown("### Quiz History & Marking Records")
+        # Show any errors from GitHub loading
+        if document_corpus.error_log:
+            st.warning("**Loading Log:**")
+            for error in document_corpus.error_log:
+                st.write(error)
         
-        # Google Sheets status with detailed debug
-        with st.expander("🔍 Google Sheets Configuration Debug"):
-            st.write("**Checking secrets configuration...**")
-            
-            # Check for gsheet section
-            has_gsheet = 'gsheet' in st.secrets
-            st.write(f"- Has `[gsheet]` section: {has_gsheet}")
-            
-            if has_gsheet:
-                gsheet_keys = list(st.secrets['gsheet'].keys())
-                st.write(f"- Keys in `[gsheet]`: {gsheet_keys}")
-                st.write(f"- `type` value: {st.secrets['gsheet'].get('type', 'NOT FOUND')}")
-                st.write(f"- `client_email`: {st.secrets['gsheet'].get('client_email', 'NOT FOUND')}")
-            
-            # Check for SHEET_ID
-            has_sheet_id = 'SHEET_ID' in st.secrets
-            st.write(f"- Has `SHEET_ID` at root level: {has_sheet_id}")
-            
-            if has_sheet_id:
-                sheet_id = st.secrets['SHEET_ID']
-                st.write(f"- `SHEET_ID` value: `{sheet_id[:20]}...`")
-                st.write(f"- Length: {len(sheet_id)} characters")
-            else:
-                # Check if it's mistakenly inside gsheet
-                if has_gsheet and 'SHEET_ID' in st.secrets['gsheet']:
-                    st.error("❌ `SHEET_ID` is inside `[gsheet]` - it should be at root level!")
-                    st.write(f"- Found at: `[gsheet]` → `SHEET_ID`")
+        if st.button("🔄 Reload from GitHub"):
+            with st.spinner("Loading documents from GitHub..."):
+                github_docs = load_documents_from_github()
+                if github_docs:
+                    st.session_state.uploaded_documents = github_docs
+                    st.success(f"✅ Reloaded {len(github_docs)} documents!")
                 else:
-                    st.error("❌ `SHEET_ID` not found anywhere in secrets!")
-            
-            # Overall status
-            st.markdown("---")
-            if has_gsheet and has_sheet_id:
-                st.success("✅ Configuration looks correct!")
+                    st.error("⚠️ No documents loaded. Check the log above for details.")
+            rerun_fragment()
+    
+    if st.session_state.uploaded_documents:
+        st.markdown("**Loaded Documents:**")
+        for doc_id, doc in st.session_state.uploaded_documents.items():
+            st.write(f"- {doc['name']} ({doc['type']})")
+    else:
+        st.info("No documents currently loaded. Click 'Reload from GitHub' to load documents.")
+
+@st.fragment
+def admin_quiz_history_tab():
+    """Quiz History tab: every recorded quiz and its marking"""
+    st.markdown("### Quiz History & Marking Records")
+    
+    # Google Sheets status with detailed debug
+    with st.expander("🔍 Google Sheets Configuration Debug"):
+        st.write("**Checking secrets configuration...**")
+        
+        # Check for gsheet section
+        has_gsheet = 'gsheet' in st.secrets
+        st.write(f"- Has `[gsheet]` section: {has_gsheet}")
+        
+        if has_gsheet:
+            gsheet_keys = list(st.secrets['gsheet'].keys())
+            st.write(f"- Keys in `[gsheet]`: {gsheet_keys}")
+            st.write(f"- `type` value: {st.secrets['gsheet'].get('type', 'NOT FOUND')}")
+            st.write(f"- `client_email`: {st.secrets['gsheet'].get('client_email', 'NOT FOUND')}")
+        
+        # Check for SHEET_ID
+        has_sheet_id = 'SHEET_ID' in st.secrets
+        st.write(f"- Has `SHEET_ID` at root level: {has_sheet_id}")
+        
+        if has_sheet_id:
+            sheet_id = st.secrets['SHEET_ID']
+            st.write(f"- `SHEET_ID` value: `{sheet_id[:20]}...`")
+            st.write(f"- Length: {len(sheet_id)} characters")
+        else:
+            # Check if it's mistakenly inside gsheet
+            if has_gsheet and 'SHEET_ID' in st.secrets['gsheet']:
+                st.error("❌ `SHEET_ID` is inside `[gsheet]` - it should be at root level!")
+                st.write(f"- Found at: `[gsheet]` → `SHEET_ID`")
             else:
-                st.error("❌ Configuration incomplete - see issues above")
+                st.error("❌ `SHEET_ID` not found anywhere in secrets!")
         
-        # Google Sheets status
-        if 'gsheet' in st.secrets and 'SHEET_ID' in st.secrets:
-            col1, col2 = st.columns([3, 1])
-            with col1:
-                st.success("✅ Google Sheets: Connected & Auto-saving")
-            with col2:
-                sheet_url = f"https://docs.google.com/spreadsheets/d/{st.secrets['SHEET_ID']}"
-                st.markdown(f"[📊 Open Sheet]({sheet_url})")
+        # Overall status
+        st.markdown("---")
+        if has_gsheet and has_sheet_id:
+            st.success("✅ Configuration looks correct!")
         else:
-            st.info("ℹ️ Google Sheets not configured. Records are temporary (lost on restart).")
+            st.error("❌ Configuration incomplete - see issues above")
+    
+    # Google Sheets status
+    if 'gsheet' in st.secrets and 'SHEET_ID' in st.secrets:
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            st.success("✅ Google Sheets: Connected & Auto-saving")
+        with col2:
+            sheet_url = f"https://docs.google.com/spreadsheets/d/{st.secrets['SHEET_ID']}"
+            st.markdown(f"[📊 Open Sheet]({sheet_url})")
+        writer = get_sheet_writer()
+        writer_stats = writer.stats()
+        oldest_age = writer.buffer.oldest_age() if isinstance(writer.buffer, Outbox) else None
+        st.caption(
+            f"📮 Outbox: {writer_stats['pending']} records waiting"
+            + (f" (oldest {oldest_age:.0f}s)" if oldest_age is not None else "")
+            + f" · {writer_stats['written']} rows written in {writer_stats['batches']} batches · "
+            f"{writer_stats['skipped']} already in the sheet · {writer_stats['errors']} failed writes (retried) · "
+            f"{writer_stats['dropped']} dropped because the buffer was full"
+        )
+        if writer_stats['last_error']:
+            st.caption(f"Last error: {writer_stats['last_error']}")
+    else:
+        st.info("ℹ️ Google Sheets not configured. Records are only kept in this server's quiz history store.")
+    
+    # Debug info
+    with st.expander("🔍 Session Debug Info"):
+        st.write(f"**Total records in memory:** {len(st.session_state.quiz_history)}")
+        st.write(f"**Current session has student data:** {bool(st.session_state.get('student_name'))}")
+        
+        if st.session_state.get('student_name'):
+            st.info(f"📝 Active student: {st.session_state.student_name} ({st.session_state.student_class})")
         
-        # Debug info
-        with st.expander("🔍 Session Debug Info"):
-            st.write(f"**Total records in memory:** {len(st.session_state.quiz_history)}")
-            st.write(f"**Current session has student data:** {bool(st.session_state.get('student_name'))}")
+        st.warning("""
+        **⚠️ Important:** These are this browser session's records, and they will be lost when:
+        - You refresh the page
+        - The app restarts
+        - You close the browser
+        
+        The lists below and the Students and Analytics tabs read every session's records
+        from the server's quiz history store instead.
+        """)
+        
+        if st.session_state.quiz_history:
+            st.write("**Last 3 records:**")
+            for record in st.session_state.quiz_history[-3:]:
+                st.json(record)
+    
+    quiz_store = get_quiz_store()
+    total = quiz_store.count()
+    if total:
+        st.info(f"📝 {total} quiz attempts recorded across all sessions")
+        
+        # Export button and download
+        col1, col2 = st.columns([1, 3])
+        with col1:
+            export_csv = st.button("📥 Export as CSV")
+        
+        if export_csv:
+            import csv
+            from io import StringIO
             
-            if st.session_state.get('student_name'):
-                st.info(f"📝 Active student: {st.session_state.student_name} ({st.session_state.student_class})")
+            output = StringIO()
+            writer = csv.writer(output)
+            writer.writerow(["Timestamp", "Student Name", "Class", "Topic", "Marking Details"])
             
-            st.warning("""
-            **⚠️ Important:** Quiz history is stored in browser memory and will be lost when:
-            - You refresh the page
-            - The app restarts
-            - You close the browser
+            # Streamed from the store in chunks rather than loaded at once
+            for record in quiz_store.iter_records():
+                writer.writerow([
+                    record.get("timestamp", ""),
+                    record.get("student_name", ""),
+                    record.get("student_class", ""),
+                    record.get("topic", ""),
+                    record.get("raw_marking_text", "")[:200] + "..."  # Truncate long text
+                ])
             
-            **To test:** Complete a student quiz session, then WITHOUT refreshing, 
-            type the teacher password to check the data.
-            """)
+            csv_data = output.getvalue()
             
-            if st.session_state.quiz_history:
-                st.write("**Last 3 records:**")
-                for record in st.session_state.quiz_history[-3:]:
-                    st.json(record)
+            with col2:
+                st.download_button(
+                    label="⬇️ Download CSV File",
+                    data=csv_data,
+                    file_name=f"quiz_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                    mime="text/csv"
+                )
         
-        if st.session_state.quiz_history:
-            st.info(f"📝 {len(st.session_state.quiz_history)} quiz attempts recorded")
-            
-            # Export button and download
-            col1, col2 = st.columns([1, 3])
-            with col1:
-                export_csv = st.button("📥 Export as CSV")
-            
-            if export_csv:
-                import csv
-                from io import StringIO
-                
-                output = StringIO()
-                writer = csv.writer(output)
-                writer.writerow(["Timestamp", "Student Name", "Class", "Topic", "Marking Details"])
-                
-                for record in st.session_state.quiz_history:
-                    writer.writerow([
-                        record.get("timestamp", ""),
-                        record.get("student_name", ""),
-                        record.get("student_class", ""),
-                        record.get("topic", ""),
-                        record.get("raw_marking_text", "")[:200] + "..."  # Truncate long text
-                    ])
-                
-                csv_data = output.getvalue()
+        st.markdown("---")
+        
+        # Display one page of quiz records, newest first
+        student_class = class_filter(quiz_store, "quiz_history_class")
+        offset = page_offset(quiz_store.count(student_class), f"quiz_history_page_{student_class}")
+        for record in quiz_store.records(DASHBOARD_PAGE, offset, student_class):
+            with st.expander(f"🎯 {record.get('student_name', 'Unknown')} - {record.get('timestamp', '')}"):
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.write(f"**Student:** {record.get('student_name', 'N/A')}")
+                    st.write(f"**Class:** {record.get('student_class', 'N/A')}")
+                with col2:
+                    st.write(f"**Topic:** {record.get('topic', 'N/A')}")
+                    st.write(f"**Time:** {record.get('timestamp', 'N/A')}")
                 
+                st.markdown("**Marking/Feedback:**")
+                st.text_area("", record.get('raw_marking_text', ''), height=150, key=f"quiz_{record['record_id']}", disabled=True)
+    else:
+        st.info("No quiz history yet. Students' quiz attempts will appear here.")
+
+@st.fragment
+def admin_students_tab():
+    """Students tab: attempts and topics per student"""
+    st.markdown("### Student Sessions")
+    
+    # Students from every session, grouped in the store a page at a time
+    quiz_store = get_quiz_store()
+    student_class = class_filter(quiz_store, "students_class")
+    student_total = quiz_store.student_count(student_class)
+    
+    if student_total:
+        st.info(f"👥 {student_total} unique students have used the app")
+        
+        # Display student list
+        offset = page_offset(student_total, f"students_page_{student_class}")
+        for data in quiz_store.students(DASHBOARD_PAGE, offset, student_class):
+            with st.expander(f"👤 {data['name']} ({data['class']})"):
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.write(f"**Quiz Attempts:** {data['attempts']}")
+                    st.write(f"**Last Attempt:** {data['last_attempt']}")
                 with col2:
-                    st.download_button(
-                        label="⬇️ Download CSV File",
-                        data=csv_data,
-                        file_name=f"quiz_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                        mime="text/csv"
-                    )
-            
-            st.markdown("---")
-            
-            # Display quiz records
-            for idx, record in enumerate(reversed(st.session_state.quiz_history)):
-                with st.expander(f"🎯 {record.get('student_name', 'Unknown')} - {record.get('timestamp', '')}"):
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        st.write(f"**Student:** {record.get('student_name', 'N/A')}")
-                        st.write(f"**Class:** {record.get('student_class', 'N/A')}")
-                    with col2:
-                        st.write(f"**Topic:** {record.get('topic', 'N/A')}")
-                        st.write(f"**Time:** {record.get('timestamp', 'N/A')}")
-                    
-                    st.markdown("**Marking/Feedback:**")
-                    st.text_area("", record.get('raw_marking_text', ''), height=150, key=f"quiz_{idx}", disabled=True)
-        else:
-            st.info("No quiz history yet. Students' quiz attempts will appear here.")
+                    st.write(f"**Topics Covered:** {', '.join(data['topics'])}")
+    else:
+        st.info("No student sessions yet. Student data will appear here once they start using the app.")
+
+@st.fragment
+def admin_analytics_tab():
+    """Analytics tab: topic and class breakdowns"""
+    st.markdown("### Class Analytics")
     
-    with tab3:
-        st.markdown("### Student Sessions")
+    quiz_store = get_quiz_store()
+    summary = quiz_store.summary()
+    if summary['records']:
+        # Counted by the store's indexes, across every session
+        col1, col2 = st.columns(2)
         
-        # Get unique students from quiz history
-        students = {}
-        for record in st.session_state.quiz_history:
-            name = record.get('student_name', 'Unknown')
-            class_name = record.get('student_class', 'Unknown')
-            key = f"{name} ({class_name})"
-            
-            if key not in students:
-                students[key] = {
-                    'name': name,
-                    'class': class_name,
-                    'attempts': 0,
-                    'topics': set()
-                }
-            
-            students[key]['attempts'] += 1
-            students[key]['topics'].add(record.get('topic', 'Unknown'))
+        with col1:
+            st.markdown("**📚 Most Popular Topics:**")
+            for topic, count in quiz_store.topic_counts(5):
+                st.write(f"- {topic}: {count} attempts")
         
-        if students:
-            st.info(f"👥 {len(students)} unique students have used the app")
-            
-            # Display student list
-            for student_key, data in sorted(students.items()):
-                with st.expander(f"👤 {student_key}"):
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        st.write(f"**Quiz Attempts:** {data['attempts']}")
-                    with col2:
-                        st.write(f"**Topics Covered:** {', '.join(data['topics'])}")
-        else:
-            st.info("No student sessions yet. Student data will appear here once they start using the app.")
+        with col2:
+            st.markdown("**🏫 Classes Using the App:**")
+            for class_name, count in quiz_store.class_counts():
+                st.write(f"- {class_name}: {count} attempts")
+        
+        st.markdown("---")
+        st.markdown("**📊 Usage Summary:**")
+        st.write(f"- Total quiz attempts: {summary['records']}")
+        st.write(f"- Unique students: {summary['students']}")
+        st.write(f"- Topics covered: {summary['topics']}")
+    else:
+        st.info("Analytics will appear here once students start using the app.")
+
+@st.fragment
+def admin_performance_tab():
+    """Performance tab: teacher settings and request statistics"""
+    st.markdown("### Document Retrieval")
+    
+    runtime_settings['retrieval_enabled'] = st.toggle(
+        "Send only the most relevant document chunks (BM25)",
+        value=runtime_settings['retrieval_enabled'],
+        help="Turn off to send the start of every document on every turn, as before."
+    )
+    col1, col2 = st.columns(2)
+    with col1:
+        runtime_settings['retrieval_top_k'] = st.number_input(
+            "Chunks per turn", min_value=1, max_value=50,
+            value=runtime_settings['retrieval_top_k']
+        )
+    with col2:
+        runtime_settings['retrieval_budget_chars'] = st.number_input(
+            "Context budget (characters)", min_value=1000, max_value=200000, step=1000,
+            value=runtime_settings['retrieval_budget_chars']
+        )
+    
+    index = get_retrieval_index(document_corpus.version)
+    full_chars = full_context_chars(document_corpus.documents)
+    budget_chars = runtime_settings['retrieval_budget_chars']
+    st.caption(
+        f"🔎 {index.chunk_count} chunks · {index.term_count} indexed terms · "
+        f"send-everything context ≈ {full_chars:,} chars (~{full_chars // CHARS_PER_TOKEN:,} tokens) "
+        f"vs retrieval budget {budget_chars:,} chars (~{budget_chars // CHARS_PER_TOKEN:,} tokens)"
+    )
+
+    st.markdown("### Prompt Caching")
+    cache_rows = []
+    for provider in ("openai", "anthropic"):
+        requests_made = app_metrics.counter(f"{provider}_requests")
+        if requests_made:
+            input_tokens = app_metrics.counter(f"{provider}_input_tokens")
+            cached_tokens = app_metrics.counter(f"{provider}_cached_tokens")
+            hit_rate = cached_tokens / input_tokens if input_tokens else 0
+            row = (f"- **{provider.title()}**: {app_metrics.counter(f'{provider}_cache_hits')} of {requests_made} "
+                   f"requests read the cache · {cached_tokens:,} of {input_tokens:,} input tokens served from "
+                   f"cache ({hit_rate:.0%})")
+            written = app_metrics.counter(f"{provider}_cache_write_tokens")
+            if written:
+                row += f" · {written:,} tokens written to it"
+            cache_rows.append(row)
+    if cache_rows:
+        st.markdown("\n".join(cache_rows))
+    else:
+        st.info("Cache hit rates will appear here after the first model request.")
+    
+    st.markdown("### Response Cache")
+    response_cache = get_response_cache()
+    runtime_settings['response_cache_enabled'] = st.toggle(
+        "Reuse replies to repeated questions",
+        value=runtime_settings['response_cache_enabled'],
+        help="Answers submitted for marking are never cached."
+    )
+    col1, col2 = st.columns(2)
+    with col1:
+        response_cache.threshold = st.slider(
+            "Similarity threshold", min_value=0.5, max_value=1.0, step=0.05,
+            value=float(response_cache.threshold),
+            help="How alike two questions must be (estimated Jaccard similarity) to share a reply."
+        )
+    with col2:
+        response_cache.ttl = st.number_input(
+            "Keep replies for (hours)", min_value=1, max_value=24 * 30,
+            value=max(1, int(response_cache.ttl // 3600))
+        ) * 3600
+    cache_stats = response_cache.stats
+    lookups = cache_stats['exact_hits'] + cache_stats['near_hits'] + cache_stats['misses']
+    hits = cache_stats['exact_hits'] + cache_stats['near_hits']
+    st.caption(
+        f"🗂️ {len(response_cache)} cached replies · {hits} of {lookups} lookups served from cache "
+        f"({cache_stats['exact_hits']} exact, {cache_stats['near_hits']} near-duplicate) · "
+        f"{cache_stats['skipped']} not cacheable · {cache_stats['evictions']} evicted"
+    )
+    if st.button("🗑️ Clear response cache"):
+        response_cache.clear()
+        rerun_fragment()
+    
+    st.markdown("### Speculative Onboarding")
+    runtime_settings['speculation_enabled'] = st.toggle(
+        "Start answering questions asked before onboarding",
+        value=runtime_settings['speculation_enabled'],
+        help="The reply is generated while the student types their name and class, and discarded if the request changes."
+    )
+    head_start = app_metrics.summary("speculation_head_start")
+    st.caption(
+        f"⏩ {app_metrics.counter('speculation_started')} started · "
+        f"{app_metrics.counter('speculation_used')} used · "
+        f"{app_metrics.counter('speculation_discarded')} discarded · "
+        f"median head start {head_start['p50']:.1f}s"
+    )
+    
+    st.markdown("### Intent Routing")
+    runtime_settings['intent_routing_enabled'] = st.toggle(
+        "Answer greetings, help and off-topic messages locally",
+        value=runtime_settings['intent_routing_enabled']
+    )
+    intent_counts = {intent: app_metrics.counter(f"intent_{intent}") for intent in INTENTS}
+    routed = sum(intent_counts.values())
+    if routed:
+        local_count = sum(intent_counts[intent] for intent in LOCAL_INTENTS)
+        st.caption(
+            f"🧭 {local_count} of {routed} messages answered without a model call · " +
+            " · ".join(f"{intent.replace('_', ' ')} {count}" for intent, count in intent_counts.items() if count)
+        )
+    else:
+        st.info("Intent counts will appear here once students start chatting.")
+    
+    st.markdown("### Question Bank")
+    question_bank = get_question_bank()
+    if question_bank is None:
+        st.info("No question bank found. Run `python question_bank.py` to generate one; until then every quiz "
+                "is written by the model.")
+    else:
+        runtime_settings['question_bank_enabled'] = st.toggle(
+            "Set quizzes from the question bank",
+            value=runtime_settings['question_bank_enabled']
+        )
+        runtime_settings['question_bank_adaptive'] = st.toggle(
+            "Adapt the AO mix to each student's marks",
+            value=runtime_settings['question_bank_adaptive'],
+            help="Students scoring under half on a unit get more AO1 questions; over 80% get more AO3. "
+                 "Otherwise questions are drawn at random with an even mix."
+        )
+        served = app_metrics.counter("question_bank_served")
+        st.caption(
+            f"🗃️ {len(question_bank):,} questions across {len(question_bank.units)} units "
+            f"(built {question_bank.meta.get('built_at', '?')}) · {served} quizzes served "
+            f"({app_metrics.counter('question_bank_questions')} questions) without a model call · "
+            f"{app_metrics.counter('question_bank_exhausted')} sent to the model because the bank ran out"
+        )
+    
+    st.markdown("### Providers")
+    provider_pool = get_provider_pool()
+    provider_pool.hedge = st.toggle(
+        "Hedge slow requests with a second provider",
+        value=provider_pool.hedge,
+        disabled=len(provider_pool.providers) < 2,
+        help="If the first provider has sent nothing after its p95 time to first token, "
+             "start the next provider too and use whichever answers first."
+    )
+    provider_rows = []
+    for provider in provider_pool.providers:
+        first_token = app_metrics.summary(f"{provider.name}_first_token_seconds")
+        provider_rows.append(
+            f"- **{provider.name}**: breaker {provider_pool.breakers[provider.name].state} · "
+            f"{app_metrics.counter(f'{provider.name}_replies')} replies · "
+            f"{app_metrics.counter(f'{provider.name}_failures')} failures · "
+            f"first token p95 {first_token['p95']:.1f}s"
+        )
+    if provider_rows:
+        st.markdown("\n".join(provider_rows))
+        st.caption(f"{app_metrics.counter('failovers')} failovers · {app_metrics.counter('hedged_requests')} hedged "
+                   f"requests · deadlines {provider_pool.first_token_deadline:g}s to first token, "
+                   f"{provider_pool.total_deadline:g}s in total")
+    else:
+        st.info("No model provider is configured.")
     
+    st.markdown("### Request Queue")
+    scheduler = get_scheduler()
+    queue_wait = app_metrics.summary("scheduler_wait_seconds")
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Waiting now", scheduler.queued)
+    col2.metric("In flight", scheduler.in_flight)
+    col3.metric("Queue wait p95", f"{queue_wait['p95']:.1f}s")
+    col4.metric("Rate-limit retries", app_metrics.counter("scheduler_rate_limited"))
+    st.caption(f"Limits: {int(st.secrets.get('LLM_REQUESTS_PER_MINUTE', REQUESTS_PER_MINUTE))} requests and "
+               f"{int(st.secrets.get('LLM_TOKENS_PER_MINUTE', TOKENS_PER_MINUTE)):,} tokens per minute "
+               f"(`LLM_REQUESTS_PER_MINUTE`, `LLM_TOKENS_PER_MINUTE`), {scheduler.max_concurrent} in flight at once.")
+    
+    st.markdown("### In-flight Coalescing")
+    collapsed = app_metrics.counter("singleflight_collapsed")
+    st.caption(
+        f"🔗 {collapsed} requests joined an identical call already in flight instead of making their own · "
+        f"{app_metrics.counter('singleflight_fallbacks')} fell back to their own call · "
+        f"{len(get_single_flight())} calls in flight now"
+    )
+    
+    st.markdown("### Model Routes")
+    route_rows = []
+    for route in get_model_routes().values():
+        latency = app_metrics.summary(f"route_{route.name}_seconds")
+        first_token = app_metrics.summary(f"route_{route.name}_first_token_seconds")
+        input_tokens = app_metrics.summary(f"route_{route.name}_input_tokens")
+        output_tokens = app_metrics.summary(f"route_{route.name}_output_tokens")
+        row = (f"- **{route.name.replace('_', ' ').title()}**: `{route.openai_model}` / `{route.anthropic_model}`, "
+               f"max {route.max_tokens} tokens")
+        if latency['count']:
+            row += (f" · {latency['count']} replies · first token p50 {first_token['p50']:.1f}s · "
+                    f"total p50 {latency['p50']:.1f}s / p95 {latency['p95']:.1f}s · "
+                    f"~{input_tokens['mean']:.0f} in / {output_tokens['mean']:.0f} out tokens")
+        route_rows.append(row)
+    st.markdown("\n".join(route_rows))
+    st.caption("Override a route in secrets, e.g. `[MODEL_ROUTES.extended_marking]` with `openai_model`, "
+               "`anthropic_model`, `max_tokens`, `temperature`, `top_k` or `context_chars`.")
+    
+    st.markdown("### Conversation Context")
+    saved = app_metrics.summary("history_tokens_saved")
+    sent = app_metrics.summary("history_tokens_sent")
+    if saved['count']:
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Turns", saved['count'])
+        col2.metric("History tokens sent / turn", f"{sent['mean']:.0f}")
+        col3.metric("Tokens saved / turn", f"{saved['mean']:.0f}", help=f"{saved['total']:,} saved in total")
+    else:
+        st.info("Context statistics will appear here once students start chatting.")
+
+def show_admin_panel():
+    """Show admin panel for document management and student tracking"""
+    st.markdown("## 🔧 Teacher Dashboard")
+    
+    # Create tabs for different sections
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["📚 Documents", "📊 Quiz History", "👥 Students", "📈 Analytics", "⚡ Performance"])
+    
+    with tab1:
+        admin_documents_tab()
+    with tab2:
+        admin_quiz_history_tab()
+    with tab3:
+        admin_students_tab()
     with tab4:
-        st.markdown("### Class Analytics")
-        
-        if st.session_state.quiz_history:
-            # Topic frequency
-            topic_count = {}
-            class_count = {}
-            
-            for record in st.session_state.quiz_history:
-                topic = record.get('topic', 'Unknown')
-                class_name = record.get('student_class', 'Unknown')
-                
-                topic_count[topic] = topic_count.get(topic, 0) + 1
-                class_count[class_name] = class_count.get(class_name, 0) + 1
-            
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                st.markdown("**📚 Most Popular Topics:**")
-                for topic, count in sorted(topic_count.items(), key=lambda x: x[1], reverse=True)[:5]:
-                    st.write(f"- {topic}: {count} attempts")
-            
-            with col2:
-                st.markdown("**🏫 Classes Using the App:**")
-                for class_name, count in sorted(class_count.items(), key=lambda x: x[1], reverse=True):
-                    st.write(f"- {class_name}: {count} attempts")
-            
-            st.markdown("---")
-            st.markdown("**📊 Usage Summary:**")
-            st.write(f"- Total quiz attempts: {len(st.session_state.quiz_history)}")
-            st.write(f"- Unique students: {len(set(r.get('student_name', '') for r in st.session_state.quiz_history))}")
-            st.write(f"- Topics covered: {len(topic_count)}")
-        else:
-            st.info("Analytics will appear here once students start using the app.")
+        admin_analytics_tab()
+    with tab5:
+        admin_performance_tab()
     
     st.markdown("---")
     if st.button("🔄 Exit Teacher Mode"):
@@ -641,13 +1064,21 @@ def record_quiz_history(assistant_message):
             "student_name": st.session_state.get("student_name", ""),
             "student_class": st.session_state.get("student_class", ""),
             "topic": st.session_state.get("student_topic", ""),
-            "raw_marking_text": assistant_message
+            "raw_marking_text": assistant_message,
+            # Lets the Sheets writer recognise a row it has already written
+            "record_id": uuid.uuid4().hex
         }
         
         # Save to session state (temporary)
         st.session_state.quiz_history.append(quiz_record)
         
-        # Save to Google Sheets (permanent)
+        # Shared with the teacher dashboard, whichever session it is opened in
+        try:
+            get_quiz_store().add(quiz_record)
+        except Exception as e:
+            print(f"Failed to save to the quiz history store: {e}")
+        
+        # Save to Google Sheets (permanent): committed to the local outbox, then written in the background
         try:
             save_to_google_sheets(quiz_record)
         except Exception as e:
@@ -655,88 +1086,31 @@ def record_quiz_history(assistant_message):
             print(f"Failed to save to Google Sheets: {e}")
 
 def save_to_google_sheets(quiz_record):
-    """Save quiz record to Google Sheets"""
-    try:
-        import gspread
-        from google.oauth2.service_account import Credentials
-        
-        # Check if Google Sheets is configured
-        if 'gsheet' not in st.secrets or 'SHEET_ID' not in st.secrets:
-            return  # Skip if not configured
-        
-        # Set up credentials
-        scopes = [
-            'https://www.googleapis.com/auth/spreadsheets',
-            'https://www.googleapis.com/auth/drive'
-        ]
-        
-        creds = Credentials.from_service_account_info(
-            st.secrets["gsheet"],
-            scopes=scopes
-        )
-        
-        client = gspread.authorize(creds)
-        
-        # Open the sheet
-        sheet = client.open_by_key(st.secrets["SHEET_ID"]).sheet1
-        
-        # Prepare row data
-        row = [
-            quiz_record["timestamp"],
-            quiz_record["student_name"],
-            quiz_record["student_class"],
-            quiz_record["topic"],
-            quiz_record["raw_marking_text"][:1000]  # Truncate if too long
-        ]
-        
-        # Append row
-        sheet.append_row(row)
-        
-    except Exception as e:
-        # Log error but don't crash the app
-        print(f"Google Sheets error: {e}")
-        raise  # Re-raise so record_quiz_history can catch it
+    """Queue a quiz record for the background Google Sheets writer"""
+    writer = get_sheet_writer()
+    if writer is None:
+        return  # Skip if not configured
+    writer.put(quiz_record)
 
 def simple_markdown_to_html(text):
     """Convert basic markdown to HTML without external libraries"""
-    import re
-    
-    # Replace **bold** with <strong>
-    text = re.sub(r'\*\*(.+?)\*\*', r'<strong>\1</strong>', text)
-    
-    # Replace *italic* with <em>
-    text = re.sub(r'\*(.+?)\*', r'<em>\1</em>', text)
-    
-    # Replace newlines with <br>
-    text = text.replace('\n', '<br>')
-    
-    # Handle numbered lists (1. item)
-    text = re.sub(r'^(\d+)\.\s+(.+)$', r'<div style="margin-left: 20px;">\1. \2</div>', text, flags=re.MULTILINE)
-    
-    # Handle bullet points (- item or * item)
-    text = re.sub(r'^[-*]\s+(.+)$', r'<div style="margin-left: 20px;">• \1</div>', text, flags=re.MULTILINE)
-    
-    return text
+    return markdown_to_html(text)
 
 def show_message_with_typing(message_content, placeholder):
-    """Display a message with typing effect"""
-    delay = get_dynamic_delay(message_content)
-    
-    displayed_text = ""
-    for char in message_content:
-        displayed_text += char
-        html_content = simple_markdown_to_html(displayed_text)
-        
+    """Display a message with typing effect, a few words per frame"""
+    # At most REVEAL_FPS redraws a second, and a bounded reveal time however long the message
+    seconds = len(message_content) * get_dynamic_delay(message_content)
+    for html_content in reveal_frames(message_content, seconds):
         placeholder.markdown(f"""
         <div class="chat-message assistant">
             <div class="message-role">📘 OCR Business Buddy</div>
             <div class="message-content">{html_content}▊</div>
         </div>
         """, unsafe_allow_html=True)
-        time.sleep(delay)
+        time.sleep(1 / REVEAL_FPS)
     
     # Final display without cursor
-    html_content = simple_markdown_to_html(displayed_text)
+    html_content = simple_markdown_to_html(message_content)
     
     placeholder.markdown(f"""
     <div class="chat-message assistant">
@@ -745,222 +1119,342 @@ def show_message_with_typing(message_content, placeholder):
     </div>
     """, unsafe_allow_html=True)
 
-def call_ai(user_message, stream_placeholder=None):
-    """Call AI with document context"""
-    try:
-        # Show thinking indicator if placeholder provided
-        if stream_placeholder:
-            stream_placeholder.markdown("""
+def stream_to_placeholder(deltas, placeholder):
+    """Show streamed text in the placeholder as it arrives and return the full reply"""
+    parts = []
+    renderer = IncrementalHtml()
+    last_update = 0.0
+    for delta in deltas:
+        parts.append(delta)
+        renderer.feed(delta)
+        if placeholder and time.monotonic() - last_update >= STREAM_UPDATE_INTERVAL:
+            last_update = time.monotonic()
+            placeholder.markdown(f"""
             <div class="chat-message assistant">
                 <div class="message-role">📘 OCR Business Buddy</div>
-                <div class="message-content">🤔 Thinking...</div>
+                <div class="message-content">{renderer.html()}▊</div>
             </div>
             """, unsafe_allow_html=True)
-        
-        openai_key = st.secrets.get("OPENAI_API_KEY", "")
-        anthropic_key = st.secrets.get("ANTHROPIC_API_KEY", "")
-        
-        # Build document context
-        doc_context = ""
-        if st.session_state.uploaded_documents:
-            for doc_id, doc in st.session_state.uploaded_documents.items():
-                content = doc.get('content', '')[:15000]
-                doc_context += f"\n[OCR Document: {doc['name']}]\n{content}\n"
-        
-        # Add student context
-        student_context = ""
-        if st.session_state.get('student_name'):
-            student_context = f"\nStudent: {st.session_state.student_name}"
-            if st.session_state.get('student_class'):
-                student_context += f" (Class {st.session_state.student_class})"
-            if st.session_state.get('student_topic'):
-                student_context += f"\nFocusing on: {st.session_state.student_topic}"
-        
-        messages = [{"role": m["role"], "content": m["content"]} for m in st.session_state.messages]
-        messages.append({"role": "user", "content": user_message})
-        
-        # Try OpenAI
-        if openai_key:
-            import openai
-            client = openai.OpenAI(api_key=openai_key)
-            
-            system_msg = SYSTEM_PROMPT
-            if doc_context:
-                system_msg += f"\n\n{doc_context}"
-            if student_context:
-                system_msg += f"\n\n{student_context}"
-            
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "system", "content": system_msg}] + messages,
-                max_tokens=1500,
-                temperature=0.7
-            )
-            
-            return response.choices[0].message.content
-        
-        # Try Anthropic
-        elif anthropic_key:
-            import anthropic
-            client = anthropic.Anthropic(api_key=anthropic_key)
-            
-            system_msg = SYSTEM_PROMPT
-            if student_context:
-                system_msg += f"\n\n{student_context}"
-            
-            full_msg = user_message
-            if doc_context:
-                full_msg = f"{doc_context}\n\nStudent: {user_message}"
-            
-            response = client.messages.create(
-                model="claude-sonnet-4-20250514",
-                max_tokens=1500,
-                system=system_msg,
-                messages=messages[:-1] + [{"role": "user", "content": full_msg}]
-            )
-            
-            return response.content[0].text
-        
-        else:
-            return "⚠️ No API key configured. Please add OPENAI_API_KEY or ANTHROPIC_API_KEY to secrets."
     
-    except Exception as e:
-        return f"⚠️ Error: {str(e)}"
+    text = "".join(parts)
+    if placeholder:
+        placeholder.markdown(f"""
+        <div class="chat-message assistant">
+            <div class="message-role">📘 OCR Business Buddy</div>
+            <div class="message-content">{simple_markdown_to_html(text)}</div>
+        </div>
+        """, unsafe_allow_html=True)
+    return text
 
-# Main app logic
-if st.session_state.admin_mode:
-    st.markdown("""
-    <div style="text-align: center; padding: 2rem;">
-        <h1 style="color: #202123;">👨‍🏫 Teacher Dashboard</h1>
-        <p style="color: #6e6e80;">OCR Business Revision Buddy - Teacher View</p>
-    </div>
-    """, unsafe_allow_html=True)
-    show_admin_panel()
+def request_key(user_message, student_topic, route):
+    """Everything besides the student's name that shapes the reply to ``user_message``"""
+    return (
+        user_message, student_topic, route.name, document_corpus.version,
+        runtime_settings['retrieval_enabled'], runtime_settings['retrieval_top_k'],
+        runtime_settings['retrieval_budget_chars']
+    )
 
-elif not st.session_state.setup_started:
-    # Hero section with chips
-    st.markdown("""
-    <div class="hero-container">
-        <div class="hero-icon">📘</div>
-        <h1 class="hero-title">OCR Business Revision Buddy</h1>
-        <p class="hero-subtitle">
-            Friendly GCSE OCR Business revision helper with interactive questions and feedback
-        </p>
-    </div>
-    """, unsafe_allow_html=True)
+def prepare_ai_request(user_message, history, summary, student_name="", student_class="", student_topic="",
+                       route=None, on_wait=None):
+    """Build the model request for this turn and return its (not yet started) text stream.
     
-    # Suggestion chips
-    col1, col2, col3, col4 = st.columns(4)
+    ``route`` sets the model, output length and context size. The request
+    waits its turn in the shared scheduler, calling ``on_wait(position)``
+    while queued. Returns an error string instead if no provider is
+    configured. Without ``on_wait`` the stream does not touch session state,
+    so it can be read on another thread.
+    """
+    route = route or get_model_routes()[GENERAL]
+    # Build document context from the chunks most relevant to this turn
+    doc_context = ""
+    if st.session_state.uploaded_documents:
+        if runtime_settings['retrieval_enabled']:
+            index = get_retrieval_index(document_corpus.version)
+            query = f"{user_message} {student_topic}"
+            # The route can only narrow the teacher's retrieval settings
+            top_k = min(runtime_settings['retrieval_top_k'], route.top_k or runtime_settings['retrieval_top_k'])
+            budget = min(runtime_settings['retrieval_budget_chars'],
+                         route.context_chars or runtime_settings['retrieval_budget_chars'])
+            doc_context = pack_context(index.search(query, k=top_k), budget)
+        else:
+            doc_context = full_context(st.session_state.uploaded_documents)
     
-    with col1:
-        if st.button("📚 Aims & objectives (1.4)", key="chip1", use_container_width=True):
-            st.session_state.setup_started = True
-            st.session_state.pending_prompt = "Explain business aims and objectives (Unit 1.4)"
-            st.session_state.pending_source = "chip"
-            
-            response = "👋 Before we start your revision, I need your first name or initials and your class (e.g. 10ABS) so your teacher knows who completed it.\n\nPlease type:\n**\"Name/Initials, Class\"**\n\nExample: \"A.J., 10B1\"\n\nOnce I have that, I'll ask which topic you want to revise!"
-            
-            st.session_state.messages.append({"role": "assistant", "content": response})
-            st.session_state.typing_message_index = len(st.session_state.messages) - 1
-            st.session_state.awaiting_student_info = True
-            st.rerun()
+    # Add student context
+    student_context = ""
+    if student_name:
+        student_context = f"\nStudent: {student_name}"
+        if student_class:
+            student_context += f" (Class {student_class})"
+        if student_topic:
+            student_context += f"\nFocusing on: {student_topic}"
     
-    with col2:
-        if st.button("👥 Test me on Unit 1.5", key="chip2", use_container_width=True):
-            st.session_state.setup_started = True
-            st.session_state.pending_prompt = "Test me on Unit 1.5 - Stakeholders in business"
-            st.session_state.pending_source = "chip"
-            
-            response = "👋 Before we start your revision, I need your first name or initials and your class (e.g. 10ABS) so your teacher knows who completed it.\n\nPlease type:\n**\"Name/Initials, Class\"**\n\nExample: \"A.J., 10B1\"\n\nOnce I have that, I'll ask which topic you want to revise!"
-            
-            st.session_state.messages.append({"role": "assistant", "content": response})
-            st.session_state.typing_message_index = len(st.session_state.messages) - 1
-            st.session_state.awaiting_student_info = True
-            st.rerun()
+    # Recent turns verbatim, older turns folded into the rolling summary,
+    # sized so the whole request stays under its budget
+    budget_chars = history_budget(
+        len(SYSTEM_PROMPT) + len(doc_context) + len(student_context),
+        request_budget=int(st.secrets.get("REQUEST_BUDGET_CHARS", REQUEST_BUDGET_CHARS)),
+        history_budget=int(st.secrets.get("HISTORY_BUDGET_CHARS", HISTORY_BUDGET_CHARS))
+    )
+    messages, history_summary, history_stats = build_history(
+        history, user_message, summary,
+        recent_turns=int(st.secrets.get("HISTORY_RECENT_TURNS", RECENT_TURNS)),
+        budget_chars=budget_chars
+    )
+    saved_tokens = (history_stats['full_chars'] - history_stats['sent_chars']) // CHARS_PER_TOKEN
+    app_metrics.observe("history_tokens_saved", max(0, saved_tokens))
+    app_metrics.observe("history_tokens_sent", history_stats['sent_chars'] // CHARS_PER_TOKEN)
+    if history_summary:
+        student_context += f"\n\nEarlier in this session (summary):\n{history_summary}"
+    # Answers to a quiz set from the question bank are marked against its model answers
+    bank_quiz = st.session_state.get('bank_quiz')
+    if bank_quiz and route.name in (SHORT_MARKING, EXTENDED_MARKING):
+        student_context += f"\n\n{answer_key(bank_quiz['questions'])}"
     
-    with col3:
-        if st.button("📊 5 MCQs on Unit 2.2", key="chip3", use_container_width=True):
-            st.session_state.setup_started = True
-            st.session_state.pending_prompt = "Give me 5 MCQs on Unit 2.2 - Market research"
-            st.session_state.pending_source = "chip"
-            
-            response = "👋 Before we start your revision, I need your first name or initials and your class (e.g. 10ABS) so your teacher knows who completed it.\n\nPlease type:\n**\"Name/Initials, Class\"**\n\nExample: \"A.J., 10B1\"\n\nOnce I have that, I'll ask which topic you want to revise!"
-            
-            st.session_state.messages.append({"role": "assistant", "content": response})
-            st.session_state.typing_message_index = len(st.session_state.messages) - 1
-            st.session_state.awaiting_student_info = True
-            st.rerun()
+    # Configured providers in order, with failover, deadlines and optional hedging
+    provider_pool = get_provider_pool()
+    if not provider_pool.providers:
+        return "⚠️ No API key configured. Please add OPENAI_API_KEY or ANTHROPIC_API_KEY to secrets."
     
-    with col4:
-        if st.button("📝 Mark my 9-mark answer", key="chip4", use_container_width=True):
-            st.session_state.setup_started = True
-            st.session_state.pending_prompt = "I have a 9-mark answer to be marked"
-            st.session_state.pending_source = "chip"
-            
-            response = "👋 Before we start your revision, I need your first name or initials and your class (e.g. 10ABS) so your teacher knows who completed it.\n\nPlease type:\n**\"Name/Initials, Class\"**\n\nExample: \"A.J., 10B1\"\n\nOnce I have that, I'll ask which topic you want to revise!"
-            
-            st.session_state.messages.append({"role": "assistant", "content": response})
-            st.session_state.typing_message_index = len(st.session_state.messages) - 1
-            st.session_state.awaiting_student_info = True
-            st.rerun()
-
-else:
-    # Chat mode
-    col1, col2, col3 = st.columns([8, 1, 1])
+    def start():
+        return provider_pool.stream(
+            route, SYSTEM_PROMPT, doc_context, student_context, messages,
+            on_usage=lambda provider, usage: record_ai_usage(provider, route, usage)
+        )
     
-    with col3:
-        if st.button("↻", key="restart_chat", help="Restart"):
-            # Reset all session state
-            st.session_state.messages = []
-            st.session_state.setup_started = False
-            st.session_state.student_name = ""
-            st.session_state.student_class = ""
-            st.session_state.student_topic = ""
-            st.session_state.student_info_submitted = False
-            st.session_state.awaiting_student_info = True
-            st.session_state.awaiting_topic = False
-            st.session_state.pending_prompt = None
-            st.session_state.pending_source = None
-            st.session_state.typing_message_index = None
-            st.rerun()
+    # Fair queueing across classes, then students; rate limits count the prompt plus max_tokens
+    request_chars = len(SYSTEM_PROMPT) + len(doc_context) + len(student_context) + sum(len(m["content"]) for m in messages)
+    scheduler = get_scheduler()
+    # Per session, not per name: two students can share initials within a class
+    owner = st.session_state.session_id
     
-    # Session info
-    if st.session_state.student_name:
-        col_info1, col_info2 = st.columns([3, 1])
-        with col_info1:
-            st.caption(f"👤 {st.session_state.student_name} – {st.session_state.student_class} – {st.session_state.student_topic}")
-        with col_info2:
-            if len(st.session_state.quiz_history) > 0:
-                st.caption(f"📊 {len(st.session_state.quiz_history)} quiz(zes) completed")
+    def scheduled():
+        return scheduler.stream(
+            start,
+            group=student_class,
+            owner=owner,
+            tokens=request_chars // CHARS_PER_TOKEN + route.max_tokens,
+            on_wait=on_wait
+        )
     
-    # Display chat messages with typing effect for flagged message
-    for idx, message in enumerate(st.session_state.messages):
-        role = "You" if message["role"] == "user" else "OCR Business Buddy"
-        role_class = message["role"]
-        icon = "👤" if message["role"] == "user" else "📘"
-        
-        # Check if this message should show typing effect
-        should_type = (idx == st.session_state.typing_message_index and message["role"] == "assistant")
+    # An identical request already in flight (e.g. the same chip clicked across a class) is joined, not repeated
+    fingerprint = request_fingerprint(
+        "+".join(provider_pool.names), f"{route.openai_model}+{route.anthropic_model}", document_corpus.version,
+        openai_request(SYSTEM_PROMPT, doc_context, student_context, messages),
+        max_tokens=route.max_tokens, temperature=route.temperature
+    )
+    return timed(get_single_flight().stream(fingerprint, scheduled), app_metrics, route)
+
+def record_ai_usage(provider, route, usage):
+    """Add a response's token usage to the app's metrics, overall and for its route"""
+    record_usage(app_metrics, provider, usage)
+    record_route_usage(app_metrics, route, provider, usage)
+
+def classify_intent(prompt):
+    """Intent tag for a message bound for the model, or ``None`` if routing is off or unsure"""
+    if not runtime_settings['intent_routing_enabled']:
+        return None
+    return get_intent_router().classify(prompt).tag
+
+def quiz_from_bank(prompt):
+    """Unseen questions from the question bank for a quiz request, or ``[]`` to ask the model"""
+    bank = get_question_bank()
+    if bank is None or not runtime_settings['question_bank_enabled']:
+        return []
+    unit = unit_for(prompt) or unit_for(st.session_state.get('student_topic', ''))
+    if not unit:
+        return []
+    mastery = st.session_state.bank_mastery.get(unit) if runtime_settings['question_bank_adaptive'] else None
+    questions = bank.select(unit, quiz_length(prompt), seen=st.session_state.bank_seen, mcq=wants_mcq(prompt),
+                            mastery=mastery)
+    if not questions:
+        app_metrics.incr("question_bank_exhausted")
+    return questions
+
+def record_bank_marks(reply):
+    """Update the student's mastery of the unit of the last bank quiz from the marks in ``reply``"""
+    bank_quiz = st.session_state.get('bank_quiz')
+    fraction = marks_fraction(reply)
+    if not bank_quiz or fraction is None:
+        return
+    previous = st.session_state.bank_mastery.get(bank_quiz['unit'])
+    st.session_state.bank_mastery[bank_quiz['unit']] = fraction if previous is None else (previous + fraction) / 2
+
+def cacheable_turn(prompt, intent):
+    """True if the reply to ``prompt`` may come from, and go into, the shared response cache"""
+    return (runtime_settings['response_cache_enabled'] and st.session_state.model_turns == 0
+            and intent not in (ANSWER_SUBMISSION, NINE_MARK) and is_cacheable(prompt))
+
+def start_speculation(prompt):
+    """Send a pending prompt to the model now, while the student is still onboarding"""
+    cancel_speculation()
+    if not runtime_settings['speculation_enabled']:
+        return
+    intent = classify_intent(prompt)
+    shared = cacheable_turn(prompt, intent)
+    if shared and get_response_cache().get(prompt, document_corpus.version) is not None:
+        return
+    bank = get_question_bank()
+    if bank is not None and runtime_settings['question_bank_enabled'] and intent == QUIZ_REQUEST:
+        if bank.matching_units(unit_for(prompt)):
+            return
+    try:
+        # Without a name yet; the reply is reused if nothing else has changed by then
+        route = route_for(get_model_routes(), intent, prompt)
+        topic = "" if shared else PENDING_PROMPT_TOPIC
+        deltas = prepare_ai_request(prompt, [], new_summary(), student_topic=topic, route=route)
+    except Exception:
+        return
+    if isinstance(deltas, str):
+        return
+    key = request_key(prompt, topic, route)
+    st.session_state.speculation = Speculation(key, deltas, get_speculation_pool())
+    app_metrics.incr("speculation_started")
+
+def cancel_speculation():
+    """Stop this session's background request, if one is running"""
+    speculation = st.session_state.get('speculation')
+    if speculation is not None:
+        speculation.cancel()
+        st.session_state.speculation = None
+
+def set_pending_prompt(prompt, source):
+    """Hold a request made before onboarding and start answering it in the background"""
+    st.session_state.pending_prompt = prompt
+    st.session_state.pending_source = source
+    start_speculation(prompt)
+
+def local_reply(intent):
+    """Fixed reply for an intent that needs no model call"""
+    name = st.session_state.get('student_name', '')
+    topic = st.session_state.get('student_topic', '') or "OCR GCSE Business"
+    if intent == GREETING:
+        return f"Hi {name}! 👋 What would you like to revise? You can ask me to explain something from {topic}, test you, or mark an answer."
+    if intent == HELP:
+        return ("Here's what I can do: 📚\n\n"
+                "- **Explain** any OCR GCSE Business (J204) topic, e.g. \"Explain cash flow (Unit 5.3)\"\n"
+                "- **Quiz** you with exam-style questions, e.g. \"Test me on Unit 1.5\"\n"
+                "- **Mark** your answers, including 9-mark questions, with AO levels and a model answer\n\n"
+                "Just type your question below!")
+    return "I'm designed for OCR GCSE Business (J204). What Business topic would you like to revise?"
+
+def show_chat_message(idx, message):
+    """Draw one message of the chat, with the typing effect if it is flagged for it"""
+    role = "You" if message["role"] == "user" else "OCR Business Buddy"
+    role_class = message["role"]
+    icon = "👤" if message["role"] == "user" else "📘"
+    
+    # Check if this message should show typing effect
+    should_type = (idx == st.session_state.typing_message_index and message["role"] == "assistant")
+    
+    if should_type:
+        # Show with typing effect
+        placeholder = st.empty()
+        show_message_with_typing(message["content"], placeholder)
+        # Clear the flag after showing typing
+        st.session_state.typing_message_index = None
+    else:
+        # Show normally - each message is converted to HTML once and the result kept on it
+        html_content = message_html(message)
         
-        if should_type:
-            # Show with typing effect
-            placeholder = st.empty()
-            show_message_with_typing(message["content"], placeholder)
-            # Clear the flag after showing typing
-            st.session_state.typing_message_index = None
-        else:
-            # Show normally - convert markdown to HTML using simple converter
-            html_content = simple_markdown_to_html(message["content"])
-            
-            st.markdown(f"""
-            <div class="chat-message {role_class}">
-                <div class="message-role">{icon} {role}</div>
-                <div class="message-content">{html_content}</div>
+        st.markdown(f"""
+        <div class="chat-message {role_class}">
+            <div class="message-role">{icon} {role}</div>
+            <div class="message-content">{html_content}</div>
+        </div>
+        """, unsafe_allow_html=True)
+
+def show_queue_position(placeholder, position):
+    """Tell a waiting student where they are in the shared request queue"""
+    if position == 0:
+        status = "⏳ Lots of students are asking at once. Retrying in a moment..."
+    elif position == 1:
+        status = "⏳ You're next in the queue..."
+    else:
+        status = f"⏳ Lots of students are asking at once. You're #{position} in the queue..."
+    placeholder.markdown(f"""
+    <div class="chat-message assistant">
+        <div class="message-role">📘 OCR Business Buddy</div>
+        <div class="message-content">{status}</div>
+    </div>
+    """, unsafe_allow_html=True)
+
+def call_ai(user_message, stream_placeholder=None, intent=None):
+    """Call AI with document context, routed by the message's intent"""
+    # Decided before this turn counts, as only a conversation's first turn is shared
+    shared = cacheable_turn(user_message, intent)
+    st.session_state.model_turns += 1
+    try:
+        # Show thinking indicator if placeholder provided
+        if stream_placeholder:
+            stream_placeholder.markdown("""
+            <div class="chat-message assistant">
+                <div class="message-role">📘 OCR Business Buddy</div>
+                <div class="message-content">🤔 Thinking...</div>
             </div>
             """, unsafe_allow_html=True)
+        
+        # Quizzes are set from the question bank while it has unseen questions on the unit
+        if intent == QUIZ_REQUEST:
+            questions = quiz_from_bank(user_message)
+            if questions:
+                cancel_speculation()
+                st.session_state.bank_seen.update(question['id'] for question in questions)
+                st.session_state.bank_quiz = {'unit': unit_for(user_message) or questions[0]['unit'],
+                                              'questions': questions}
+                app_metrics.incr("question_bank_served")
+                app_metrics.incr("question_bank_questions", len(questions))
+                return stream_to_placeholder([format_quiz(questions)], stream_placeholder)
+        
+        # Serve repeated opening questions from the shared cache; answers for marking never are
+        response_cache = get_response_cache()
+        if shared:
+            cached = response_cache.get(user_message, document_corpus.version)
+            if cached is not None:
+                cancel_speculation()
+                return stream_to_placeholder([cached], stream_placeholder)
+        
+        # Reuse the reply started during onboarding if it was for this same request
+        speculation = st.session_state.get('speculation')
+        st.session_state.speculation = None
+        route = route_for(get_model_routes(), intent, user_message)
+        # A reply that may be shared is asked for without the student's details or history
+        topic = "" if shared else st.session_state.get('student_topic', '')
+        key = request_key(user_message, topic, route)
+        if speculation is not None and speculation.matches(key) and not speculation.failed:
+            app_metrics.incr("speculation_used")
+            app_metrics.observe("speculation_head_start", time.monotonic() - speculation.started)
+            deltas = speculation.deltas()
+        else:
+            if speculation is not None:
+                speculation.cancel()
+                app_metrics.incr("speculation_discarded")
+            deltas = prepare_ai_request(
+                user_message,
+                [] if shared else st.session_state.messages,
+                new_summary() if shared else st.session_state.context_summary,
+                student_name="" if shared else st.session_state.get('student_name', ''),
+                student_class=st.session_state.get('student_class', ''),
+                student_topic=topic,
+                route=route,
+                on_wait=(lambda position: show_queue_position(stream_placeholder, position)) if stream_placeholder else None
+            )
+            if isinstance(deltas, str):
+                return deltas
+        
+        reply = stream_to_placeholder(deltas, stream_placeholder)
+        if route.name in (SHORT_MARKING, EXTENDED_MARKING):
+            record_bank_marks(reply)
+        if shared and reply:
+            response_cache.put(user_message, document_corpus.version, reply)
+        return reply
+    
+    except Exception as e:
+        return f"⚠️ Error: {str(e)}"
 
-# Chat input
-if prompt := st.chat_input("Ask a Business question or request a quiz…"):
+def handle_chat_input(prompt):
+    """Answer a chat message: the teacher password, onboarding, or a question for the tutor"""
+    # Earlier pages collapse again once the conversation moves on
+    st.session_state.history_pages = 0
     
     # Check for teacher mode password first
     teacher_password = st.secrets.get("TEACHER_PASSWORD", "")
@@ -978,8 +1472,7 @@ if prompt := st.chat_input("Ask a Business question or request a quiz…"):
         
         if not is_greeting:
             # Save meaningful questions/requests for later
-            st.session_state.pending_prompt = prompt
-            st.session_state.pending_source = "chat"
+            set_pending_prompt(prompt, "chat")
         
         response = "👋 Before we start your revision, I need your first name or initials and your class (e.g. 10ABS) so your teacher knows who completed it.\n\nPlease type:\n**\"Name/Initials, Class\"**\n\nExample: \"A.J., 10B1\"\n\nOnce I have that, I'll ask which topic you want to revise!"
         
@@ -1010,7 +1503,7 @@ if prompt := st.chat_input("Ask a Business question or request a quiz…"):
                     
                     # Check if there's a pending prompt - skip topic question
                     if st.session_state.pending_prompt:
-                        st.session_state.student_topic = "OCR GCSE Business"
+                        st.session_state.student_topic = PENDING_PROMPT_TOPIC
                         st.session_state.student_info_submitted = True
                         
                         response = f"Great! Thanks **{st.session_state.student_name}** from **{st.session_state.student_class}**! 📚"
@@ -1022,32 +1515,31 @@ if prompt := st.chat_input("Ask a Business question or request a quiz…"):
                         
                         # Show thinking indicator
                         thinking_placeholder = st.empty()
-                        ai_response = call_ai(followup_prompt, thinking_placeholder)
+                        ai_response = call_ai(followup_prompt, thinking_placeholder, intent=classify_intent(followup_prompt))
                         st.session_state.messages.append({"role": "assistant", "content": ai_response})
-                        st.session_state.typing_message_index = len(st.session_state.messages) - 1
                         record_quiz_history(ai_response)
                         
                         st.session_state.pending_prompt = None
                         st.session_state.pending_source = None
-                        st.rerun()
+                        rerun_fragment()
                     else:
                         # No pending prompt - just greet and ask for topic directly
                         st.session_state.awaiting_topic = True
                         response = f"Hello **{st.session_state.student_name}** from **{st.session_state.student_class}**! 👋\n\nWhat topic would you like to revise today?\n\n- A specific unit (e.g. \"Unit 1.4 - Business aims\")\n- A topic area (e.g. \"Marketing\" or \"Finance\")\n- \"General revision\" for mixed questions\n\nWhat would you like to focus on?"
                         st.session_state.messages.append({"role": "assistant", "content": response})
-                        st.rerun()
+                        rerun_fragment()
                 else:
                     # Invalid format - looks like a question, not name/class
                     st.session_state.messages.append({"role": "user", "content": prompt})
                     reminder = "I see you have a question! 😊 But first, I need to know who you are.\n\nPlease provide your **name and class** in this format:\n**\"Name, Class\"**\n\nExample: \"Hassan, 11B\"\n\nThen I'll be happy to help with your question!"
                     st.session_state.messages.append({"role": "assistant", "content": reminder})
-                    st.rerun()
+                    rerun_fragment()
         else:
             # No comma - remind them of the format
             st.session_state.messages.append({"role": "user", "content": prompt})
             reminder = "I need your **name and class** separated by a comma.\n\nPlease type:\n**\"Name, Class\"**\n\nExample: \"A.J., 10B1\""
             st.session_state.messages.append({"role": "assistant", "content": reminder})
-            st.rerun()
+            rerun_fragment()
     
     # Check if awaiting topic
     elif st.session_state.get('awaiting_topic', False):
@@ -1068,25 +1560,180 @@ if prompt := st.chat_input("Ask a Business question or request a quiz…"):
             
             # Show thinking indicator
             thinking_placeholder = st.empty()
-            ai_response = call_ai(followup_prompt, thinking_placeholder)
+            ai_response = call_ai(followup_prompt, thinking_placeholder, intent=classify_intent(followup_prompt))
             st.session_state.messages.append({"role": "assistant", "content": ai_response})
-            st.session_state.typing_message_index = len(st.session_state.messages) - 1
             record_quiz_history(ai_response)
             
             st.session_state.pending_prompt = None
             st.session_state.pending_source = None
         
-        st.rerun()
+        rerun_fragment()
     
     else:
         # Normal chat flow - student has completed setup
-        st.session_state.messages.append({"role": "user", "content": prompt})
+        # Greetings, help and off-topic messages are answered locally; the rest are tagged for the model
+        intent = None
+        if runtime_settings['intent_routing_enabled']:
+            classified = get_intent_router().classify(prompt)
+            app_metrics.incr(f"intent_{classified.name}")
+            st.session_state.messages.append({"role": "user", "content": prompt, "intent": classified.name})
+            if classified.local:
+                st.session_state.messages.append({"role": "assistant", "content": local_reply(classified.name)})
+                st.session_state.typing_message_index = len(st.session_state.messages) - 1
+                rerun_fragment()
+            intent = classified.tag
+        else:
+            st.session_state.messages.append({"role": "user", "content": prompt})
         
         # Show thinking indicator
         thinking_placeholder = st.empty()
-        response = call_ai(prompt, thinking_placeholder)
+        # The reply was streamed into the placeholder, so it is not replayed
+        response = call_ai(prompt, thinking_placeholder, intent=intent)
         st.session_state.messages.append({"role": "assistant", "content": response})
-        st.session_state.typing_message_index = len(st.session_state.messages) - 1
         record_quiz_history(response)
         
-        st.rerun()
+        rerun_fragment()
+
+@st.fragment
+def show_hero():
+    """Hero banner and suggestion chips; a chip starts onboarding with a full rerun"""
+    st.markdown("""
+    <div class="hero-container">
+        <div class="hero-icon">📘</div>
+        <h1 class="hero-title">OCR Business Revision Buddy</h1>
+        <p class="hero-subtitle">
+            Friendly GCSE OCR Business revision helper with interactive questions and feedback
+        </p>
+    </div>
+    """, unsafe_allow_html=True)
+
+    # Suggestion chips
+    col1, col2, col3, col4 = st.columns(4)
+
+    with col1:
+        if st.button("📚 Aims & objectives (1.4)", key="chip1", use_container_width=True):
+            st.session_state.setup_started = True
+            set_pending_prompt("Explain business aims and objectives (Unit 1.4)", "chip")
+            
+            response = "👋 Before we start your revision, I need your first name or initials and your class (e.g. 10ABS) so your teacher knows who completed it.\n\nPlease type:\n**\"Name/Initials, Class\"**\n\nExample: \"A.J., 10B1\"\n\nOnce I have that, I'll ask which topic you want to revise!"
+            
+            st.session_state.messages.append({"role": "assistant", "content": response})
+            st.session_state.typing_message_index = len(st.session_state.messages) - 1
+            st.session_state.awaiting_student_info = True
+            st.rerun()
+
+    with col2:
+        if st.button("👥 Test me on Unit 1.5", key="chip2", use_container_width=True):
+            st.session_state.setup_started = True
+            set_pending_prompt("Test me on Unit 1.5 - Stakeholders in business", "chip")
+            
+            response = "👋 Before we start your revision, I need your first name or initials and your class (e.g. 10ABS) so your teacher knows who completed it.\n\nPlease type:\n**\"Name/Initials, Class\"**\n\nExample: \"A.J., 10B1\"\n\nOnce I have that, I'll ask which topic you want to revise!"
+            
+            st.session_state.messages.append({"role": "assistant", "content": response})
+            st.session_state.typing_message_index = len(st.session_state.messages) - 1
+            st.session_state.awaiting_student_info = True
+            st.rerun()
+
+    with col3:
+        if st.button("📊 5 MCQs on Unit 2.2", key="chip3", use_container_width=True):
+            st.session_state.setup_started = True
+            set_pending_prompt("Give me 5 MCQs on Unit 2.2 - Market research", "chip")
+            
+            response = "👋 Before we start your revision, I need your first name or initials and your class (e.g. 10ABS) so your teacher knows who completed it.\n\nPlease type:\n**\"Name/Initials, Class\"**\n\nExample: \"A.J., 10B1\"\n\nOnce I have that, I'll ask which topic you want to revise!"
+            
+            st.session_state.messages.append({"role": "assistant", "content": response})
+            st.session_state.typing_message_index = len(st.session_state.messages) - 1
+            st.session_state.awaiting_student_info = True
+            st.rerun()
+
+    with col4:
+        if st.button("📝 Mark my 9-mark answer", key="chip4", use_container_width=True):
+            st.session_state.setup_started = True
+            set_pending_prompt("I have a 9-mark answer to be marked", "chip")
+            
+            response = "👋 Before we start your revision, I need your first name or initials and your class (e.g. 10ABS) so your teacher knows who completed it.\n\nPlease type:\n**\"Name/Initials, Class\"**\n\nExample: \"A.J., 10B1\"\n\nOnce I have that, I'll ask which topic you want to revise!"
+            
+            st.session_state.messages.append({"role": "assistant", "content": response})
+            st.session_state.typing_message_index = len(st.session_state.messages) - 1
+            st.session_state.awaiting_student_info = True
+            st.rerun()
+
+@st.fragment
+def show_chat():
+    """Chat history and input; a chat turn reruns and resends only this fragment"""
+    col1, col2, col3 = st.columns([8, 1, 1])
+    
+    with col3:
+        if st.button("↻", key="restart_chat", help="Restart"):
+            # Reset all session state
+            st.session_state.messages = []
+            st.session_state.setup_started = False
+            st.session_state.student_name = ""
+            st.session_state.student_class = ""
+            st.session_state.student_topic = ""
+            st.session_state.student_info_submitted = False
+            st.session_state.awaiting_student_info = True
+            st.session_state.awaiting_topic = False
+            st.session_state.pending_prompt = None
+            st.session_state.pending_source = None
+            cancel_speculation()
+            st.session_state.bank_seen = set()
+            st.session_state.bank_quiz = None
+            st.session_state.bank_mastery = {}
+            st.session_state.history_pages = 0
+            st.session_state.typing_message_index = None
+            st.session_state.context_summary = new_summary()
+            st.session_state.model_turns = 0
+            st.rerun()
+    
+    # Session info
+    if st.session_state.student_name:
+        col_info1, col_info2 = st.columns([3, 1])
+        with col_info1:
+            st.caption(f"👤 {st.session_state.student_name} – {st.session_state.student_class} – {st.session_state.student_topic}")
+        with col_info2:
+            if len(st.session_state.quiz_history) > 0:
+                st.caption(f"📊 {len(st.session_state.quiz_history)} quiz(zes) completed")
+    
+    # Only the latest messages are drawn on every rerun, so long sessions stay quick to redraw
+    messages = st.session_state.messages
+    window = int(st.secrets.get("CHAT_HISTORY_WINDOW", HISTORY_WINDOW))
+    recent_start = max(0, len(messages) - window) if window > 0 else 0
+    loaded_start = max(0, recent_start - st.session_state.history_pages * HISTORY_PAGE)
+    if loaded_start:
+        if st.button(f"⬆️ Show earlier messages ({loaded_start} hidden)", key="show_earlier"):
+            st.session_state.history_pages += 1
+            rerun_fragment()
+    if loaded_start < recent_start:
+        with st.expander(f"Earlier messages ({recent_start - loaded_start})", expanded=True):
+            for idx in range(loaded_start, recent_start):
+                show_chat_message(idx, messages[idx])
+    for idx in range(recent_start, len(messages)):
+        show_chat_message(idx, messages[idx])
+    
+    # Written to the bottom container from inside the fragment, so it stays pinned and its turns rerun only the chat
+    with st.bottom:
+        prompt = st.chat_input(CHAT_INPUT_PLACEHOLDER)
+    if prompt:
+        handle_chat_input(prompt)
+
+# Main app logic
+if st.session_state.admin_mode:
+    st.markdown("""
+    <div style="text-align: center; padding: 2rem;">
+        <h1 style="color: #202123;">👨‍🏫 Teacher Dashboard</h1>
+        <p style="color: #6e6e80;">OCR Business Revision Buddy - Teacher View</p>
+    </div>
+    """, unsafe_allow_html=True)
+    show_admin_panel()
+
+elif not st.session_state.setup_started:
+    show_hero()
+
+else:
+    show_chat()
+
+# Chat input on the hero and the teacher dashboard; in chat mode it belongs to the chat fragment
+if st.session_state.admin_mode or not st.session_state.setup_started:
+    if prompt := st.chat_input(CHAT_INPUT_PLACEHOLDER):
+        handle_chat_input(prompt)
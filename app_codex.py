@@ -18,6 +18,7 @@ from helpers import (
     tracking_table,
     update_tracking,
 )
+from question_bank import DEFAULT_BANK_PATH, QuestionBank, unit_for
 
 
 st.set_page_config(
@@ -28,6 +29,8 @@ st.set_page_config(
 )
 
 init_state(st.session_state)
+if "bank_seen" not in st.session_state:
+    st.session_state.bank_seen = set()
 
 # Styling for centred layout and chat look
 st.markdown(
@@ -88,6 +91,28 @@ def add_assistant_message(text: str):
     add_message(st.session_state, "assistant", text)
 
 
+@st.cache_resource
+def get_question_bank() -> Optional[QuestionBank]:
+    path = st.secrets.get("QUESTION_BANK_PATH", DEFAULT_BANK_PATH)
+    return QuestionBank(path) if os.path.exists(path) else None
+
+
+def bank_quiz_question(topic: str) -> Optional[dict]:
+    """An unseen question on ``topic`` from the shared question bank, pitched by recent scores"""
+    bank = get_question_bank()
+    unit = unit_for(topic)
+    if bank is None or not unit:
+        return None
+    scores = [item["score"] for item in st.session_state.quiz_history if item.get("topic") == topic][-5:]
+    mastery = sum(scores) / (2 * len(scores)) if scores else None
+    selected = bank.select(unit, 1, seen=st.session_state.bank_seen, mastery=mastery)
+    if not selected:
+        return None
+    question = selected[0]
+    st.session_state.bank_seen.add(question["id"])
+    return {"question": question["question"], "model_answer": question["answer"]}
+
+
 # Conversation logic ---------------------------------------------------------
 
 def onboarding_response(prompt: str):
@@ -151,7 +176,10 @@ def craft_response(prompt: str) -> str:
 def start_quiz():
     st.session_state.quiz_active = True
     st.session_state.pending_action = None
-    question = generate_quiz_question(st.session_state.selected_topic)
+    # The model only writes a question once the bank has none left on this topic
+    question = bank_quiz_question(st.session_state.selected_topic) or generate_quiz_question(
+        st.session_state.selected_topic
+    )
     st.session_state.current_question = question
     add_assistant_message(
         f"Quiz time. One question at a time.\n\n**{question['question']}**\n\nType your answer or press End quiz to stop."
@@ -0,0 +1,61 @@
+"""Rerun time and page payload of the chat view as the history grows.
+
+Run from the repository root:
+
+    python -m benchmarks.chat_history --sizes 10,100,500
+
+Runs ``app.py`` headless with Streamlit's ``AppTest`` for a student with a
+history of each size. It reports the mean time of a rerun and the number and
+size of the markdown elements sent. ``CHAT_HISTORY_WINDOW = 0`` draws every
+message, as before windowing; ``--window`` (default 20, as in the app) draws
+only the latest ones.
+"""
+import argparse
+import os
+import time
+
+from streamlit.testing.v1 import AppTest
+
+from benchmarks.chat_render import history
+from rendering import message_html
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+
+def measure(size, window, repeats):
+    """(mean rerun seconds, markdown elements, payload bytes) for a session with ``size`` messages"""
+    at = AppTest.from_file(APP_PATH, default_timeout=60)
+    at.secrets["CHAT_HISTORY_WINDOW"] = window
+    messages = history(size)
+    for message in messages:
+        message_html(message)  # As after the rerun that added each message
+    for key, value in (("setup_started", True), ("awaiting_student_info", False), ("student_name", "AJ"),
+                       ("student_class", "10B"), ("student_topic", "Marketing"), ("messages", messages)):
+        at.session_state[key] = value
+    at.run()
+    started = time.perf_counter()
+    for _ in range(repeats):
+        at.run()
+    seconds = (time.perf_counter() - started) / repeats
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    elements = list(at.markdown)
+    return seconds, len(elements), sum(len(element.value.encode('utf-8')) for element in elements)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10,100,500", help="history lengths in messages")
+    parser.add_argument("--window", type=int, default=20, help="messages drawn on every rerun")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'messages':>9} {'view':>9} {'rerun ms':>9} {'elements':>9} {'payload KB':>11}")
+    for size in (int(value) for value in args.sizes.split(",")):
+        for label, window in (("all", 0), ("windowed", args.window)):
+            seconds, elements, payload = measure(size, window, args.repeats)
+            print(f"{size:>9} {label:>9} {seconds * 1000:>9.1f} {elements:>9} {payload / 1024:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
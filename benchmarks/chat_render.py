@@ -0,0 +1,69 @@
+"""Time to redraw the chat history on a rerun, by history length.
+
+Run from the repository root:
+
+    python -m benchmarks.chat_render --sizes 10,100,500
+
+Every Streamlit rerun builds the HTML bubble of every message in the
+session. For histories of each size this compares the original converter
+(patterns compiled on every call), ``rendering.markdown_to_html``
+(precompiled patterns) and ``rendering.message_html`` (converted once, then
+served from the copy kept on the message).
+"""
+import argparse
+import time
+
+from benchmarks.typing_effect import SAMPLE, per_character_html
+from rendering import markdown_to_html, message_html
+
+
+def history(size):
+    """Alternating student questions and multi-line tutor replies"""
+    messages = []
+    for i in range(size):
+        if i % 2:
+            messages.append({"role": "assistant", "content": SAMPLE * 4 + f"**Score: {i % 7}/6**"})
+        else:
+            messages.append({"role": "user", "content": f"Explain stakeholders in business, question {i}"})
+    return messages
+
+
+def rerun(messages, convert):
+    """Bubble HTML for every message, as the chat loop builds it"""
+    bubbles = []
+    for message in messages:
+        bubbles.append(f"""
+            <div class="chat-message {message['role']}">
+                <div class="message-content">{convert(message)}</div>
+            </div>
+            """)
+    return bubbles
+
+
+def time_reruns(messages, convert, repeats):
+    rerun(messages, convert)  # Warm-up; fills the cache for message_html
+    started = time.perf_counter()
+    for _ in range(repeats):
+        rerun(messages, convert)
+    return (time.perf_counter() - started) / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10,100,500", help="history lengths in messages")
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    methods = (
+        ("original", lambda message: per_character_html(message["content"])),
+        ("precompiled", lambda message: markdown_to_html(message["content"])),
+        ("cached", message_html),
+    )
+    print(f"{'messages':>9} " + " ".join(f"{label + ' ms':>15}" for label, _ in methods))
+    for size in (int(value) for value in args.sizes.split(",")):
+        timings = [time_reruns(history(size), convert, args.repeats) for _, convert in methods]
+        print(f"{size:>9} " + " ".join(f"{seconds * 1000:>15.2f}" for seconds in timings))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Server CPU and bytes sent for each chat turn, measured against a live server.
+
+Run from the repository root:
+
+    python -m benchmarks.chat_turn --turns 20
+
+Starts ``streamlit run app.py`` headless and drives it over the same
+websocket a browser uses. The only provider is a local stub that replies at
+once, so nothing leaves the machine and the timings are the app's own. A
+student onboards, then asks a question each turn (the response cache is off,
+so every turn streams a reply). For each turn it reports the server's CPU time
+(from ``/proc``, so Linux only), the bytes of every message sent back until
+the run finishes, and how many elements they draw.
+
+The chat area is a fragment, so a turn reruns and resends only the chat.
+``--app`` points at another copy of the app to compare with.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+from benchmarks.typing_effect import SAMPLE
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ONBOARDING = ("hi", "A.J., 10B", "Marketing")
+TURN = "Explain how stakeholders can affect a business"
+SECRETS = f"""
+RESPONSE_CACHE_ENABLED = false
+LLM_STUB_PROVIDERS = [{{ name = "stub", reply = {json.dumps(SAMPLE * 3, ensure_ascii=False)} }}]
+"""
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def cpu_seconds(pid):
+    """User plus system CPU time of a process"""
+    with open(f"/proc/{pid}/stat") as stat:
+        fields = stat.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def start_server(app, port, workdir):
+    """A headless server for ``app``, reading secrets from ``workdir``"""
+    os.makedirs(os.path.join(workdir, ".streamlit"))
+    with open(os.path.join(workdir, ".streamlit", "secrets.toml"), "w") as secrets:
+        secrets.write(SECRETS)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", app, "--server.headless", "true",
+         "--server.port", str(port), "--server.enableXsrfProtection", "false",
+         "--server.fileWatcherType", "none", "--browser.gatherUsageStats", "false"],
+        cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        env={**os.environ, "PYTHONPATH": ROOT})
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1)
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("server did not start")
+
+
+class Browser:
+    """The parts of the Streamlit frontend a chat turn needs"""
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.chat_input = None
+        self.fragment_id = ""
+
+    async def run(self, text=None):
+        """Send a rerun (typing ``text`` into the chat input) and read until it finishes: (bytes, elements)"""
+        message = BackMsg()
+        state = message.rerun_script
+        state.SetInParent()
+        if text is not None:
+            widget = WidgetState(id=self.chat_input)
+            widget.chat_input_value.data = text
+            state.widget_states.widgets.append(widget)
+            state.fragment_id = self.fragment_id
+        await self.websocket.send(message.SerializeToString())
+        received = elements = 0
+        while True:
+            data = await self.websocket.recv()
+            received += len(data)
+            forward = ForwardMsg()
+            forward.ParseFromString(data)
+            if forward.HasField("delta"):
+                elements += 1
+                if forward.delta.new_element.HasField("chat_input"):
+                    self.chat_input = forward.delta.new_element.chat_input.id
+                    self.fragment_id = forward.delta.fragment_id
+            if (forward.HasField("script_finished")
+                    and forward.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN):
+                return received, elements
+
+
+async def session(port, turns, pid):
+    """Per-turn (cpu seconds, bytes, elements, wall seconds) for ``turns`` questions after onboarding"""
+    url = f"ws://127.0.0.1:{port}/_stcore/stream"
+    async with websockets.connect(url, subprotocols=["streamlit"], max_size=None) as websocket:
+        browser = Browser(websocket)
+        await browser.run()
+        for text in ONBOARDING:
+            await browser.run(text)
+        results = []
+        for _ in range(turns):
+            cpu, started = cpu_seconds(pid), time.perf_counter()
+            received, elements = await browser.run(TURN)
+            results.append((cpu_seconds(pid) - cpu, received, elements, time.perf_counter() - started))
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app", default=os.path.join(ROOT, "app.py"))
+    parser.add_argument("--turns", type=int, default=20)
+    args = parser.parse_args()
+
+    port = free_port()
+    with tempfile.TemporaryDirectory() as workdir:
+        server = start_server(os.path.abspath(args.app), port, workdir)
+        try:
+            results = asyncio.run(session(port, args.turns, server.pid))
+        finally:
+            server.terminate()
+            server.wait()
+
+    cpu, received, elements, wall = (list(column) for column in zip(*results))
+    print(f"{'turns':>6} {'CPU ms/turn':>12} {'KB/turn':>8} {'elements/turn':>14} {'wall s/turn':>12}")
+    print(f"{len(results):>6} {statistics.mean(cpu) * 1000:>12.1f} {statistics.mean(received) / 1024:>8.1f} "
+          f"{statistics.mean(elements):>14.1f} {statistics.mean(wall):>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""Provider failover, deadlines and hedging against local stub providers.
+
+Run from the repository root:
+
+    python -m benchmarks.failover --requests 20
+
+Each scenario sends requests through ``providers.ProviderPool`` with a
+primary and a backup ``StubProvider``. The stubs inject slow first tokens,
+errors and hung connections. For each scenario the script prints how many
+replies arrived, which provider served them, the latency and the final state
+of the primary's circuit breaker.
+
+Two more scenarios cancel the primary's half-open trial request before its
+outcome is known: once by losing a hedge, once by the reader closing the
+stream. The primary, healthy again, should then get the next trial and close
+its breaker rather than stay half-open.
+
+The last scenarios send requests through ``scheduler.Scheduler`` to a primary
+that answers with 429s, more of them than ``BREAKER_FAILURES``. Rate limits
+are the scheduler's to back off and retry, so the breaker must stay closed:
+once the limit lifts the primary answers, and a request that runs out of
+retries sees the 429 itself, never ``ProvidersUnavailable``.
+"""
+import argparse
+import random
+import time
+
+from metrics import Metrics
+from providers import BREAKER_FAILURES, ProviderPool, StubProvider
+from routing import DEFAULT_ROUTES, GENERAL
+from scheduler import Scheduler
+
+
+class ServerError(Exception):
+    status_code = 500
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+class RateLimited(StubProvider):
+    """A stub that answers its first ``limited`` requests with a 429"""
+
+    def __init__(self, name, limited):
+        super().__init__(name)
+        self.limited = limited
+
+    def stream(self, *args, **kwargs):
+        self.error = RateLimitError("429") if self.calls < self.limited else None
+        return super().stream(*args, **kwargs)
+
+
+class SometimesSlow(StubProvider):
+    """A stub whose first token is slow on a fraction of requests"""
+
+    def __init__(self, name, slow_rate, slow_delay, fast_delay):
+        super().__init__(name, first_token_delay=fast_delay)
+        self.slow_rate = slow_rate
+        self.slow_delay = slow_delay
+        self.fast_delay = fast_delay
+
+    def stream(self, *args, **kwargs):
+        self.first_token_delay = self.slow_delay if random.random() < self.slow_rate else self.fast_delay
+        return super().stream(*args, **kwargs)
+
+
+def scenarios(args):
+    yield "healthy", [StubProvider("primary", first_token_delay=0.05), StubProvider("backup", first_token_delay=0.05)], {}
+    yield "primary errors", [StubProvider("primary", error=ServerError("500")), StubProvider("backup")], {}
+    yield "primary hangs", [StubProvider("primary", hang=True), StubProvider("backup")], \
+        {"first_token_deadline": args.deadline}
+    yield "slow tail", [SometimesSlow("primary", 0.2, 1.0, 0.05), StubProvider("backup", first_token_delay=0.1)], {}
+    yield "slow tail, hedged", [SometimesSlow("primary", 0.2, 1.0, 0.05), StubProvider("backup", first_token_delay=0.1)], \
+        {"hedge": True, "hedge_min_delay": args.hedge_delay}
+
+
+def cancelled_trials(args):
+    """(label, breaker state after the cancelled trial, after the next request, who served it)"""
+    for label in ("trial loses hedge", "trial stream closed"):
+        primary = StubProvider("primary", error=ServerError("500"))
+        hedged = label == "trial loses hedge"
+        pool = ProviderPool([primary, StubProvider("backup")], breaker_reset_after=args.reset_after,
+                            hedge=hedged, hedge_min_delay=args.hedge_delay)
+        while pool.breakers['primary'].state == "closed":
+            "".join(pool.stream(DEFAULT_ROUTES[GENERAL], "system", "", "", [{"role": "user", "content": "hi"}]))
+        time.sleep(args.reset_after)
+        primary.error = None
+        if hedged:
+            # Slower than the backup, which is started after the hedge delay and wins
+            primary.first_token_delay = args.hedge_delay * 4
+            "".join(pool.stream(DEFAULT_ROUTES[GENERAL], "system", "", "", [{"role": "user", "content": "hi"}]))
+            primary.first_token_delay = 0.0
+        else:
+            stream = pool.stream(DEFAULT_ROUTES[GENERAL], "system", "", "", [{"role": "user", "content": "hi"}])
+            next(stream)
+            stream.close()
+        after_cancel = pool.breakers['primary'].state
+        calls = primary.calls
+        "".join(pool.stream(DEFAULT_ROUTES[GENERAL], "system", "", "", [{"role": "user", "content": "hi"}]))
+        yield label, after_cancel, pool.breakers['primary'].state, "primary" if primary.calls > calls else "backup"
+
+
+def rate_limits(args):
+    """(label, replies, errors by type, 429s sent, primary's breaker state) through the scheduler"""
+    for label, limited, retries in (("429s, then ok", BREAKER_FAILURES + 1, BREAKER_FAILURES + 1),
+                                    ("always 429", None, 1)):
+        primary = RateLimited("primary", limited if limited is not None else float("inf"))
+        pool = ProviderPool([primary])
+        scheduler = Scheduler(max_retries=retries)
+        replies, errors = 0, {}
+        for student in range(args.rate_limited_requests):
+            def start():
+                return pool.stream(DEFAULT_ROUTES[GENERAL], "system", "", "", [{"role": "user", "content": "hi"}])
+            try:
+                "".join(scheduler.stream(start, "10A", f"student{student}", 100))
+                replies += 1
+            except Exception as e:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+        rejected = primary.calls - replies
+        yield label, replies, errors, rejected, pool.breakers['primary'].state
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--deadline", type=float, default=0.5, help="first-token deadline for the hang scenario")
+    parser.add_argument("--hedge-delay", type=float, default=0.15)
+    parser.add_argument("--reset-after", type=float, default=0.2, help="breaker reset time for the trial scenarios")
+    parser.add_argument("--rate-limited-requests", type=int, default=3,
+                        help="requests per rate-limit scenario")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    route = DEFAULT_ROUTES[GENERAL]
+    print(f"{'scenario':>18} {'ok':>4} {'errors':>7} {'by provider':>22} {'p50 s':>7} {'p95 s':>7} {'breaker':>10}")
+    for label, providers, options in scenarios(args):
+        metrics = Metrics()
+        pool = ProviderPool(providers, metrics=metrics, breaker_reset_after=60, **options)
+        errors, times = 0, []
+        for _ in range(args.requests):
+            started = time.perf_counter()
+            try:
+                "".join(pool.stream(route, "system", "", "", [{"role": "user", "content": "hi"}]))
+                times.append(time.perf_counter() - started)
+            except Exception:
+                errors += 1
+        times.sort()
+        p50 = times[len(times) // 2] if times else 0
+        p95 = times[min(len(times) - 1, int(len(times) * 0.95))] if times else 0
+        by_provider = " ".join(f"{p.name}={metrics.counter(f'{p.name}_replies')}" for p in providers)
+        print(f"{label:>18} {len(times):>4} {errors:>7} {by_provider:>22} {p50:>7.2f} {p95:>7.2f} "
+              f"{pool.breakers['primary'].state:>10}")
+
+    print(f"\n{'scenario':>20} {'after cancel':>13} {'next served by':>15} {'breaker':>10}")
+    for label, after_cancel, state, served_by in cancelled_trials(args):
+        print(f"{label:>20} {after_cancel:>13} {served_by:>15} {state:>10}")
+
+    print(f"\n{'scenario':>20} {'ok':>4} {'429s':>5} {'errors':>28} {'breaker':>10}")
+    for label, replies, errors, rejected, state in rate_limits(args):
+        shown = " ".join(f"{name}={count}" for name, count in errors.items()) or "none"
+        print(f"{label:>20} {replies:>4} {rejected:>5} {shown:>28} {state:>10}")
+
+
+if __name__ == "__main__":
+    main()
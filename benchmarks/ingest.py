@@ -0,0 +1,52 @@
+"""Benchmark GitHub document ingestion against file count, offline.
+
+Run from the repository root:
+
+    python -m benchmarks.ingest --latency 0.05 --files 25 50 100 200
+"""
+import argparse
+import time
+
+from corpus import DocumentCorpus, LocalSource
+
+
+def synthetic_repo(file_count):
+    """Build an in-memory syllabus repo spread over a few unit folders"""
+    files = {}
+    for idx in range(file_count):
+        folder = f"component{idx % 2 + 1}/unit{idx % 7 + 1}"
+        body = f"Unit notes {idx}\n" + "Stakeholders, aims and objectives. " * 200
+        files[f"{folder}/notes_{idx:03d}.txt"] = body.encode("utf-8")
+    return files
+
+
+def time_refresh(source, workers):
+    corpus = DocumentCorpus()
+    started = time.perf_counter()
+    corpus.refresh(source, [], max_workers=workers)
+    cold = time.perf_counter() - started
+
+    requests_before = source.requests
+    started = time.perf_counter()
+    corpus.refresh(source, [], max_workers=workers)
+    warm = time.perf_counter() - started
+    return cold, warm, source.requests - requests_before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, nargs="+", default=[25, 50, 100, 200])
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated seconds per API request")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 8])
+    args = parser.parse_args()
+
+    print(f"{'files':>6} {'workers':>8} {'cold (s)':>10} {'no-change (s)':>14} {'no-change requests':>19}")
+    for file_count in args.files:
+        for workers in args.workers:
+            source = LocalSource(synthetic_repo(file_count), latency=args.latency)
+            cold, warm, requests = time_refresh(source, workers)
+            print(f"{file_count:>6} {workers:>8} {cold:>10.2f} {warm:>14.2f} {requests:>19}")
+
+
+if __name__ == "__main__":
+    main()
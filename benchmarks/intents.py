@@ -0,0 +1,56 @@
+"""Precision and recall of the local intent router on a labelled fixture set.
+
+Run from the repository root:
+
+    python -m benchmarks.intents --fixtures benchmarks/intent_fixtures.jsonl
+
+The fixtures are held out from the training examples in
+``intent_examples.jsonl``. A wrong local reply (e.g. refusing a Business
+question as off-topic) is worse than an unnecessary model call, so the
+precision of the local intents matters most.
+"""
+import argparse
+import os
+import time
+
+from intents import INTENTS, IntentRouter, load_examples
+
+DEFAULT_FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "intent_fixtures.jsonl")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES)
+    parser.add_argument("--threshold", type=float, default=None)
+    parser.add_argument("--show-errors", action="store_true")
+    args = parser.parse_args()
+
+    router = IntentRouter.from_file() if args.threshold is None else IntentRouter.from_file(threshold=args.threshold)
+    fixtures = load_examples(args.fixtures)
+
+    started = time.perf_counter()
+    predictions = [router.classify(text) for text, _ in fixtures]
+    per_message = (time.perf_counter() - started) / len(fixtures)
+
+    print(f"{'intent':>18} {'precision':>10} {'recall':>8} {'support':>8}")
+    for intent in INTENTS:
+        predicted = sum(p.name == intent for p in predictions)
+        actual = sum(label == intent for _, label in fixtures)
+        correct = sum(p.name == intent and label == intent for p, (_, label) in zip(predictions, fixtures))
+        precision = correct / predicted if predicted else 0.0
+        recall = correct / actual if actual else 0.0
+        print(f"{intent:>18} {precision:>10.2f} {recall:>8.2f} {actual:>8}")
+
+    local = [(p, label) for p, (_, label) in zip(predictions, fixtures) if p.local]
+    wrong_local = sum(p.name != label for p, label in local)
+    accuracy = sum(p.name == label for p, (_, label) in zip(predictions, fixtures)) / len(fixtures)
+    print(f"\naccuracy {accuracy:.2f} · {len(local)} answered locally, {wrong_local} of them wrongly · "
+          f"{per_message * 1e6:.0f} µs per message")
+    if args.show_errors:
+        for p, (text, label) in zip(predictions, fixtures):
+            if p.name != label:
+                print(f"  {label:>18} -> {p!r}: {text}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Count HTTP connections opened per model request, against a local mock API.
+
+Run from the repository root:
+
+    python -m benchmarks.llm_connections --requests 30 --threads 5
+
+The mock server speaks enough of the OpenAI Chat Completions API (plain and
+streamed) and counts every TCP connection it accepts. A fresh client per
+request (the old behaviour) opens one connection per message; the shared
+``ClientRegistry`` reuses keep-alive connections. Whether a *streamed* reply
+hands its connection back depends on the SDK reading the body to the end after
+``[DONE]``, which varies between SDK releases, so both modes are reported.
+"""
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from llm import ClientRegistry, openai_stream
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not request.get("stream"):
+            self.send_body("application/json", {
+                "id": "c", "object": "chat.completion", "created": 0, "model": "mock",
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": "Stakeholders are groups affected by a business."}}],
+                "usage": {"prompt_tokens": 10, "completion_tokens": 7, "total_tokens": 17},
+            })
+            return
+        events = []
+        for word in ("Stakeholders ", "are ", "groups ", "affected ", "by ", "a ", "business."):
+            events.append({"id": "c", "object": "chat.completion.chunk", "created": 0, "model": "mock",
+                           "choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}]})
+        events.append({"id": "c", "object": "chat.completion.chunk", "created": 0, "model": "mock", "choices": [],
+                       "usage": {"prompt_tokens": 10, "completion_tokens": 7, "total_tokens": 17}})
+        self.send_body("text/event-stream", "".join(f"data: {json.dumps(event)}\n\n" for event in events) + "data: [DONE]\n\n")
+
+    def send_body(self, content_type, body):
+        payload = (body if isinstance(body, str) else json.dumps(body)).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class CountingServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.connections = 0
+        self._count_lock = threading.Lock()
+
+    def process_request(self, request, client_address):
+        with self._count_lock:
+            self.connections += 1
+        super().process_request(request, client_address)
+
+
+def run(server, client_for_request, total, threads, stream):
+    before = server.connections
+    messages = [{"role": "user", "content": "hi"}]
+
+    def one(_):
+        client = client_for_request()
+        if stream:
+            return "".join(openai_stream(client, model="mock", messages=messages))
+        return client.chat.completions.create(model="mock", messages=messages).choices[0].message.content
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        replies = list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - started
+    assert all(reply.endswith("business.") for reply in replies)
+    return server.connections - before, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=30)
+    parser.add_argument("--threads", type=int, default=5)
+    args = parser.parse_args()
+
+    server = CountingServer(("127.0.0.1", 0), MockHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+    fresh = ClientRegistry(base_urls={"openai": base_url})
+
+    def fresh_client():
+        # The old behaviour: a brand new client (and connection pool) per message
+        return fresh._create("openai", "test-key")
+
+    shared = ClientRegistry(base_urls={"openai": base_url})
+
+    print(f"{'mode':>8} {'clients':>14} {'requests':>9} {'connections':>12} {'seconds':>8}")
+    for stream in (False, True):
+        for label, factory in (("new per call", fresh_client), ("shared", lambda: shared.get("openai", "test-key"))):
+            connections, elapsed = run(server, factory, args.requests, args.threads, stream)
+            mode = "stream" if stream else "plain"
+            print(f"{mode:>8} {label:>14} {args.requests:>9} {connections:>12} {elapsed:>8.2f}")
+    shared.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Prompt-cache hit rate and net input cost of the request layouts.
+
+Run from the repository root:
+
+    python -m benchmarks.prompt_cache --turns 200
+
+Builds the request prefix (system prompt, specification, reference block and
+student details) for a run of turns in which retrieval picks a different set
+of document chunks most turns, then prices each request the way the
+provider's cache does:
+
+* Anthropic reads the prefix up to the ``cache_control`` breakpoint from the
+  cache if an identical prefix was written in the last five minutes, writes it
+  otherwise, and caches nothing below the model's minimum length. Writes cost
+  1.25 times normal input and reads a tenth.
+* OpenAI caches automatically: the longest prefix shared with an earlier
+  request, in 128-token steps from 1,024 tokens, at half price (gpt-4o-mini).
+
+The resulting ``usage`` objects go through ``prompting.record_usage``, and the
+hit rate is read back from the metrics as in the Performance tab. Input cost
+is in full-price tokens per request; the conversation itself is the same in
+every layout and left out. Token counts are estimated at four characters per
+token.
+
+The previous Anthropic layout sent the system prompt alone and put the
+breakpoint after the reference block. "with specification" is the OpenAI
+request with the specification added after the system prompt, as Anthropic's
+now has it.
+"""
+import argparse
+import hashlib
+import os
+import random
+from types import SimpleNamespace
+
+from metrics import Metrics
+from prompting import SYSTEM_PROMPT, anthropic_request, openai_request, record_usage
+from retrieval import CHARS_PER_TOKEN
+from syllabus import SYLLABUS
+
+ANTHROPIC_MIN_TOKENS = {"sonnet": 1024, "haiku": 2048}
+OPENAI_MIN_TOKENS = 1024
+OPENAI_CACHE_STEP = 128
+CACHE_TTL = 300.0
+# Price of a token relative to normal input
+CACHE_WRITE_PRICE = 1.25
+CACHE_READ_PRICE = 0.1
+OPENAI_CACHED_PRICE = 0.5
+
+
+def previous_request(system_prompt, reference, student_context):
+    blocks = [{"type": "text", "text": system_prompt}]
+    if reference:
+        blocks.append({"type": "text", "text": reference})
+    blocks[-1]["cache_control"] = {"type": "ephemeral"}
+    if student_context:
+        blocks.append({"type": "text", "text": student_context.strip()})
+    return blocks
+
+
+class AnthropicCache:
+    """Usage for a request under Anthropic's breakpoint cache rules"""
+
+    def __init__(self, min_tokens):
+        self.min_tokens = min_tokens
+        self.written = {}
+
+    def usage(self, blocks, now):
+        tokens = [len(block["text"]) // CHARS_PER_TOKEN for block in blocks]
+        marked = max((i for i, block in enumerate(blocks) if "cache_control" in block), default=None)
+        prefix_tokens = sum(tokens[:marked + 1]) if marked is not None else 0
+        read = written = 0
+        if prefix_tokens >= self.min_tokens:
+            key = hashlib.sha1("".join(block["text"] for block in blocks[:marked + 1]).encode()).hexdigest()
+            if now - self.written.get(key, float("-inf")) <= CACHE_TTL:
+                read = prefix_tokens
+            else:
+                written = prefix_tokens
+            # A read refreshes the entry's lifetime, as a write starts it
+            self.written[key] = now
+        return SimpleNamespace(input_tokens=sum(tokens) - read - written, cache_read_input_tokens=read,
+                               cache_creation_input_tokens=written, output_tokens=300)
+
+
+class OpenAICache:
+    """Usage for a request under OpenAI's automatic prefix cache rules"""
+
+    def __init__(self):
+        self.seen = {}
+
+    def usage(self, messages, now):
+        text = "\n".join(message["content"] for message in messages)
+        shared = max((len(os.path.commonprefix([text, earlier])) for earlier, at in self.seen.items()
+                      if now - at <= CACHE_TTL), default=0)
+        self.seen[text] = now
+        shared_tokens = shared // CHARS_PER_TOKEN
+        cached = shared_tokens // OPENAI_CACHE_STEP * OPENAI_CACHE_STEP if shared_tokens >= OPENAI_MIN_TOKENS else 0
+        return SimpleNamespace(prompt_tokens=len(text) // CHARS_PER_TOKEN, completion_tokens=300,
+                               prompt_tokens_details=SimpleNamespace(cached_tokens=cached))
+
+
+def layouts():
+    """(provider, model, layout, cache, build(reference, student_context))"""
+    for model, min_tokens in ANTHROPIC_MIN_TOKENS.items():
+        yield "anthropic", model, "previous", AnthropicCache(min_tokens), \
+            lambda reference, student: previous_request(SYSTEM_PROMPT, reference, student)
+        yield "anthropic", model, "current", AnthropicCache(min_tokens), \
+            lambda reference, student: anthropic_request(SYSTEM_PROMPT, reference, student)
+    yield "openai", "4o-mini", "current", OpenAICache(), \
+        lambda reference, student: openai_request(SYSTEM_PROMPT, reference, student, [])
+    yield "openai", "4o-mini", "with specification", OpenAICache(), \
+        lambda reference, student: openai_request(f"{SYSTEM_PROMPT}\n\n{SYLLABUS}", reference, student, [])
+
+
+def input_cost(provider, metrics):
+    """Input cost of every request in ``metrics``, in full-price tokens"""
+    total = metrics.counter(f"{provider}_input_tokens")
+    cached = metrics.counter(f"{provider}_cached_tokens")
+    if provider == "openai":
+        return total - cached + cached * OPENAI_CACHED_PRICE
+    written = metrics.counter(f"{provider}_cache_write_tokens")
+    return total - cached - written + written * CACHE_WRITE_PRICE + cached * CACHE_READ_PRICE
+
+
+def run(provider, cache, build, args):
+    rng = random.Random(args.seed)
+    chunks = [f"[Document chunk {i}] " + "Business content for retrieval. " * 40 for i in range(args.chunks)]
+    metrics = Metrics()
+    for turn in range(args.turns):
+        reference = "\n\n".join(rng.sample(chunks, args.top_k))
+        student_context = f"\nStudent: S{rng.randrange(30)} (Class 10B)"
+        record_usage(metrics, provider, cache.usage(build(reference, student_context), turn * args.interval))
+    return metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--interval", type=float, default=3.0, help="seconds between requests across the class")
+    parser.add_argument("--chunks", type=int, default=40, help="document chunks retrieval chooses from")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"system prompt ~{len(SYSTEM_PROMPT) // CHARS_PER_TOKEN} tokens, "
+          f"specification ~{len(SYLLABUS) // CHARS_PER_TOKEN} tokens")
+    print(f"{'provider':>9} {'model':>7} {'layout':>18} {'hit requests':>13} {'cached input':>13} "
+          f"{'input tokens':>13} {'input cost':>11}")
+    for provider, model, layout, cache, build in layouts():
+        metrics = run(provider, cache, build, args)
+        requests = metrics.counter(f"{provider}_requests")
+        input_tokens = metrics.counter(f"{provider}_input_tokens")
+        print(f"{provider:>9} {model:>7} {layout:>18} "
+              f"{metrics.counter(f'{provider}_cache_hits') / requests:>13.0%} "
+              f"{metrics.counter(f'{provider}_cached_tokens') / input_tokens:>13.0%} "
+              f"{input_tokens / requests:>13,.0f} {input_cost(provider, metrics) / requests:>11,.0f}")
+
+
+if __name__ == "__main__":
+    main()
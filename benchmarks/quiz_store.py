@@ -0,0 +1,125 @@
+"""Teacher dashboard reads from the quiz-history store at year-group scale.
+
+Run from the repository root:
+
+    python -m benchmarks.quiz_store --records 50000
+
+Fills a ``quiz_store.QuizStore`` in a temporary directory with synthetic
+records: a year group of classes and students over a school year. It then
+times each query a dashboard rerun makes (first and last page of records,
+a page of students, topic and class counts, the summary) and one export of
+every record. For comparison it times the Students and Analytics tabs'
+previous approach of building their tables in Python from a list of every
+record. ``--plans`` prints SQLite's query plan for each read, to check it
+uses an index.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from quiz_store import QuizStore
+
+CLASSES = [f"{year}{form}" for year in (10, 11) for form in "ABCDEF"]
+TOPICS = [f"Unit {unit}" for unit in ("1.1", "1.2", "1.3", "1.4", "1.5", "2.1", "2.2", "2.3", "2.4", "2.5",
+                                       "3.1", "3.2", "3.3", "4.1", "4.2", "4.3", "5.1", "5.2", "5.3", "6.1")]
+PAGE = 25
+
+
+def synthetic_records(count, students_per_class=28, seed=1):
+    rng = random.Random(seed)
+    start = datetime(2025, 9, 1)
+    students = [(f"Student {class_name}-{i}", class_name) for class_name in CLASSES for i in range(students_per_class)]
+    records = []
+    for _ in range(count):
+        name, class_name = rng.choice(students)
+        records.append({
+            "record_id": uuid.UUID(int=rng.getrandbits(128)).hex,
+            "timestamp": (start + timedelta(seconds=rng.randrange(300 * 86400))).isoformat(timespec="seconds"),
+            "student_name": name,
+            "student_class": class_name,
+            "topic": rng.choice(TOPICS),
+            "raw_marking_text": "**Score: 4/6** ✅ Good use of the case study. 💡 Next time: add a counter-argument.",
+        })
+    return records
+
+
+def python_tabs(records):
+    """The Students and Analytics tables as the tabs built them from a list of records"""
+    students = {}
+    topic_count = {}
+    class_count = {}
+    for record in records:
+        key = f"{record['student_name']} ({record['student_class']})"
+        entry = students.setdefault(key, {'attempts': 0, 'topics': set()})
+        entry['attempts'] += 1
+        entry['topics'].add(record['topic'])
+        topic_count[record['topic']] = topic_count.get(record['topic'], 0) + 1
+        class_count[record['student_class']] = class_count.get(record['student_class'], 0) + 1
+    return sorted(students.items()), sorted(topic_count.items(), key=lambda x: x[1], reverse=True)[:5]
+
+
+def timed(repeats, call):
+    started = time.perf_counter()
+    for _ in range(repeats):
+        call()
+    return (time.perf_counter() - started) / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=50000)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--plans", action="store_true", help="print the query plan of each read")
+    args = parser.parse_args()
+
+    records = synthetic_records(args.records)
+    with tempfile.TemporaryDirectory() as directory:
+        store = QuizStore(os.path.join(directory, "quiz-history.db"))
+        started = time.perf_counter()
+        for record in records[:1000]:
+            store.add(record)
+        single = (time.perf_counter() - started) / 1000
+        started = time.perf_counter()
+        store.add_many(records[1000:])
+        print(f"{args.records} records · add {single * 1e6:.0f} µs each "
+              f"(bulk load of the rest {time.perf_counter() - started:.1f}s) · "
+              f"{os.path.getsize(store.path) / (1024 * 1024):.1f} MB plus WAL")
+
+        students = store.student_count()
+        last_page = (students - 1) // PAGE * PAGE
+        reads = (
+            ("records, first page", lambda: store.records(PAGE)),
+            ("records, last page", lambda: store.records(PAGE, offset=(args.records - 1) // PAGE * PAGE)),
+            ("records, one class", lambda: store.records(PAGE, student_class="10C")),
+            ("record count", lambda: store.count()),
+            ("students, first page", lambda: store.students(PAGE)),
+            ("students, last page", lambda: store.students(PAGE, offset=last_page)),
+            ("students, one class", lambda: store.students(PAGE, student_class="10C")),
+            ("top topics", lambda: store.topic_counts(5)),
+            ("class counts", lambda: store.class_counts()),
+            ("summary", lambda: store.summary()),
+        )
+        print(f"{'read':>22} {'ms':>8}")
+        for label, read in reads:
+            print(f"{label:>22} {timed(args.repeats, read) * 1000:>8.2f}")
+        print(f"{'export all (stream)':>22} {timed(1, lambda: sum(1 for _ in store.iter_records())) * 1000:>8.1f}")
+        print(f"{'python list (before)':>22} {timed(3, lambda: python_tabs(records)) * 1000:>8.1f}")
+
+        if args.plans:
+            for sql in (
+                "SELECT * FROM quiz_records ORDER BY timestamp DESC, id DESC LIMIT 25",
+                "SELECT * FROM quiz_records WHERE student_class = '10C' ORDER BY timestamp DESC, id DESC LIMIT 25",
+                "SELECT student_name, COUNT(*) FROM quiz_records GROUP BY student_class, student_name",
+                "SELECT topic, COUNT(*) FROM quiz_records GROUP BY topic",
+            ):
+                plan = store._query(f"EXPLAIN QUERY PLAN {sql}")
+                print(sql, "->", "; ".join(row[3] for row in plan))
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Hit rate of the shared response cache, and the prompts it must refuse.
+
+Run from the repository root:
+
+    python -m benchmarks.response_cache --students 30
+
+Each simulated student opens a conversation with one of a few common
+questions, phrased their own way (filler words, punctuation, case). The
+first student to ask fills the cache; later ones should hit it. A second set
+of prompts carries students' own answers or statements for checking, which
+must never be stored or served; any that ``is_cacheable`` accepts are
+printed as leaks.
+"""
+import argparse
+import random
+import time
+
+from response_cache import ResponseCache, is_cacheable
+
+QUESTIONS = [
+    ["Explain business aims and objectives (Unit 1.4)", "explain business aims and objectives (unit 1.4)",
+     "Can you explain business aims and objectives, Unit 1.4?"],
+    ["What is market segmentation?", "what is market segmentation", "Please, what is market segmentation??"],
+    ["Define gross profit margin", "define gross profit margin please", "Could you define gross profit margin?"],
+    ["Why do businesses use primary research?", "why do businesses use primary research",
+     "Why do businesses use primary research? thanks"],
+    ["What are the advantages of a partnership?", "what are the advantages of a partnership",
+     "What are the advantages of partnerships?"],
+]
+
+# Marking requests and statements for checking: never shared between students
+NEVER_CACHED = [
+    "1. B 2. C 3. A",
+    "1) B 2) C 3) A",
+    "Q1 A, Q2 C, Q3 B",
+    "q1: b\nq2: d\nq3: a",
+    "Profit is revenue minus total costs",
+    "Market research reduces risk for new businesses",
+    "my answers: a, c, b, d",
+    "Here is my answer: a sole trader has unlimited liability",
+    "Mark this: motivation increases productivity because workers feel valued",
+    "Explain that again",
+    "what about a charity?",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    cache = ResponseCache()
+    lookups = []
+    for student in range(args.students):
+        prompt = rng.choice(rng.choice(QUESTIONS))
+        started = time.perf_counter()
+        reply = cache.get(prompt, "v1")
+        lookups.append(time.perf_counter() - started)
+        if reply is None:
+            cache.put(prompt, "v1", f"reply for student {student}")
+
+    stats = cache.stats
+    hits = stats['exact_hits'] + stats['near_hits']
+    print(f"{args.students} opening questions · {hits} hits ({stats['exact_hits']} exact, "
+          f"{stats['near_hits']} near) · {stats['misses']} misses · {len(cache)} entries · "
+          f"{sum(lookups) / len(lookups) * 1e6:.0f} µs per lookup")
+
+    leaks = [prompt for prompt in NEVER_CACHED if is_cacheable(prompt)]
+    for prompt in NEVER_CACHED:
+        cache.put(prompt, "v1", "a student's marking")
+    served = [prompt for prompt in NEVER_CACHED if cache.get(prompt, "v1") is not None]
+    print(f"{len(NEVER_CACHED)} marking requests and statements · {len(leaks)} accepted as cacheable · "
+          f"{len(served)} served from the cache")
+    for prompt in leaks:
+        print(f"  leak: {prompt!r}")
+
+
+if __name__ == "__main__":
+    main()
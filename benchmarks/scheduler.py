@@ -0,0 +1,136 @@
+"""Load-test the request scheduler against a fake rate-limited provider.
+
+Run from the repository root:
+
+    python -m benchmarks.scheduler --classes 3 --students 10 --busy 3 --rpm 20
+
+Every simulated student sends a request at the same moment, as when a
+teacher says "everyone start now", and the first class (arriving first)
+sends ``--busy`` requests per student. ``FakeProvider`` enforces requests- and
+tokens-per-minute limits with continuously refilling buckets and answers over
+the limit with a 429, as the real APIs do. Calling it directly shows how many students would
+see an error; going through ``scheduler.Scheduler`` shows the queueing delay
+instead. ``--minute`` shortens the rate-limit window so a run takes seconds.
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import Metrics
+from scheduler import Scheduler, TokenBucket
+
+
+class FakeResponse:
+    def __init__(self, retry_after):
+        self.headers = {"retry-after": f"{retry_after:.2f}"}
+
+
+class FakeRateLimitError(Exception):
+    """Shaped like the SDKs' ``RateLimitError``"""
+
+    status_code = 429
+
+    def __init__(self, retry_after):
+        super().__init__("429 Too Many Requests")
+        self.response = FakeResponse(retry_after)
+
+
+class FakeProvider:
+    """Streams a canned reply, with per-minute rate limits and fixed latency"""
+
+    def __init__(self, rpm, tpm, minute=60.0, latency=0.2, words=20):
+        self.request_limit = TokenBucket(rpm, period=minute)
+        self.token_limit = TokenBucket(tpm, period=minute)
+        self.latency = latency
+        self.words = words
+        self.requests = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def _admit(self, tokens):
+        now = time.monotonic()
+        with self._lock:
+            self.requests += 1
+            wait = max(self.request_limit.wait_time(1, now), self.token_limit.wait_time(tokens, now))
+            if wait > 0:
+                self.rejected += 1
+                raise FakeRateLimitError(wait)
+            self.request_limit.take(1, now)
+            self.token_limit.take(tokens, now)
+
+    def stream(self, tokens):
+        self._admit(tokens)
+        time.sleep(self.latency)
+        for i in range(self.words):
+            yield f"word{i} "
+
+
+def run(provider, students, tokens, scheduler=None, fair=True):
+    """Send one request per ``(class, student)``, class by class; return (class, error, seconds) per request"""
+    def one(student):
+        group, owner = student
+        started = time.monotonic()
+        try:
+            if scheduler is None:
+                "".join(provider.stream(tokens))
+            else:
+                # One shared group makes the queue plain first-come, first-served
+                "".join(scheduler.stream(lambda: provider.stream(tokens), group if fair else "", owner, tokens))
+            return group, None, time.monotonic() - started
+        except Exception as e:
+            return group, e, time.monotonic() - started
+
+    with ThreadPoolExecutor(max_workers=len(students)) as pool:
+        futures = []
+        for student in students:
+            futures.append(pool.submit(one, student))
+            time.sleep(0.001)
+        return [future.result() for future in futures]
+
+
+def report(label, results):
+    errors = sum(error is not None for _, error, _ in results)
+    times = sorted(seconds for _, error, seconds in results if error is None)
+    p50 = times[len(times) // 2] if times else 0
+    p95 = times[min(len(times) - 1, int(len(times) * 0.95))] if times else 0
+    by_class = {}
+    for group, error, seconds in results:
+        if error is None:
+            by_class.setdefault(group, []).append(seconds)
+    spread = " ".join(f"{group}={sum(s) / len(s):.1f}s" for group, s in sorted(by_class.items()))
+    print(f"{label:>10} {len(results):>9} {errors:>7} {p50:>8.2f} {p95:>8.2f}   {spread}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--classes", type=int, default=3)
+    parser.add_argument("--students", type=int, default=10, help="students per class")
+    parser.add_argument("--busy", type=int, default=3, help="requests per student in the first class")
+    parser.add_argument("--rpm", type=int, default=20, help="provider requests per minute")
+    parser.add_argument("--tpm", type=int, default=40000, help="provider tokens per minute")
+    parser.add_argument("--tokens", type=int, default=1500, help="estimated tokens per request")
+    parser.add_argument("--headroom", type=float, default=1.0,
+                        help="scheduler limits as a multiple of the provider's, >1 to provoke 429s")
+    parser.add_argument("--minute", type=float, default=3.0, help="seconds in a simulated minute")
+    args = parser.parse_args()
+
+    students = [(f"10{chr(65 + c)}", f"student{s}")
+                for c in range(args.classes) for s in range(args.students) for _ in range(args.busy if c == 0 else 1)]
+
+    print(f"{'':>10} {'requests':>9} {'errors':>7} {'p50 s':>8} {'p95 s':>8}   mean per class")
+    provider = FakeProvider(args.rpm, args.tpm, minute=args.minute)
+    report("direct", run(provider, students, args.tokens))
+
+    for label, fair in (("fifo", False), ("fair", True)):
+        time.sleep(args.minute)
+        provider = FakeProvider(args.rpm, args.tpm, minute=args.minute)
+        metrics = Metrics()
+        scheduler = Scheduler(int(args.rpm * args.headroom), int(args.tpm * args.headroom),
+                              metrics=metrics, period=args.minute)
+        report(label, run(provider, students, args.tokens, scheduler, fair))
+        print(f"{'':>10} provider saw {provider.requests} requests, {provider.rejected} rate-limited and retried")
+
+
+if __name__ == "__main__":
+    main()
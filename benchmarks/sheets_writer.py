@@ -0,0 +1,120 @@
+"""Quiz-record persistence: a Sheets write per record against the write-behind writer.
+
+Run from the repository root:
+
+    python -m benchmarks.sheets_writer --records 200 --students 10
+
+Students on parallel threads record quiz results into a local
+``sheets.FakeSheet`` that sleeps like the Sheets API. ``direct`` does what
+the app used to do for every record on the student's own thread: authorise,
+open the spreadsheet and append one row. ``write-behind`` puts records into
+``sheets.SheetWriter`` with its in-memory buffer, and ``outbox`` with the
+SQLite ``outbox.Outbox`` the app uses, each closed at the end, which flushes
+what is left. The script reports the time each record holds up a student, the
+API calls made, the rows that reached the sheet and how long the final flush
+took. ``--fail-calls`` makes the first appends fail to show the retries.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+import uuid
+
+from outbox import Outbox
+from sheets import FakeSheet, SheetWriter
+
+RECORD = {
+    "timestamp": "2026-01-01T09:00:00",
+    "student_name": "AJ",
+    "student_class": "10B",
+    "topic": "Marketing",
+    "raw_marking_text": "**Score: 4/6** ✅ Good use of the case study.",
+}
+
+
+class FakeClient:
+    """Authorising and opening a spreadsheet, as slow as ``latency`` seconds"""
+
+    def __init__(self, sheet, latency):
+        self.sheet = sheet
+        self.latency = latency
+        self.opens = 0
+
+    def open(self):
+        self.opens += 1
+        time.sleep(self.latency)
+        return self.sheet
+
+
+def run_students(args, record):
+    """Seconds each ``record()`` call took, from ``args.students`` threads"""
+    timings = []
+    lock = threading.Lock()
+
+    def student():
+        for _ in range(args.records // args.students):
+            started = time.perf_counter()
+            record()
+            with lock:
+                timings.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=student) for _ in range(args.students)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return timings
+
+
+def direct(args):
+    sheet = FakeSheet(args.latency, args.fail_calls)
+    client = FakeClient(sheet, args.open_latency)
+
+    def record():
+        try:
+            client.open().append_row(list(RECORD.values()))
+        except ConnectionError:
+            pass  # The app printed the error and lost the row
+
+    return run_students(args, record), sheet, client, 0.0
+
+
+def write_behind(args, buffer=None):
+    sheet = FakeSheet(args.latency, args.fail_calls)
+    client = FakeClient(sheet, args.open_latency)
+    writer = SheetWriter(client.open, buffer=buffer, batch_size=args.batch, flush_interval=args.interval)
+    timings = run_students(args, lambda: writer.put({**RECORD, "record_id": uuid.uuid4().hex}))
+    started = time.perf_counter()
+    writer.close()
+    return timings, sheet, client, time.perf_counter() - started
+
+
+def outbox(args):
+    with tempfile.TemporaryDirectory() as directory:
+        return write_behind(args, Outbox(os.path.join(directory, "outbox.db")))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=200)
+    parser.add_argument("--students", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.1, help="seconds per append call")
+    parser.add_argument("--open-latency", type=float, default=0.3, help="seconds to authorise and open the sheet")
+    parser.add_argument("--batch", type=int, default=20)
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds before a partial batch is written")
+    parser.add_argument("--fail-calls", type=int, default=0, help="number of first appends that fail")
+    args = parser.parse_args()
+
+    print(f"{'method':>12} {'mean ms':>8} {'p95 ms':>8} {'API calls':>10} {'opens':>6} {'rows':>5} {'flush s':>8}")
+    for label, method in (("direct", direct), ("write-behind", write_behind), ("outbox", outbox)):
+        timings, sheet, client, flush = method(args)
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        print(f"{label:>12} {statistics.mean(timings) * 1000:>8.1f} {p95 * 1000:>8.1f} {sheet.calls:>10} "
+              f"{client.opens:>6} {len(sheet.rows):>5} {flush:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Cost of the chat typing effect: per-character redraws against word frames.
+
+Run from the repository root:
+
+    python -m benchmarks.typing_effect --lengths 200,2000,8000
+
+For a marking-style reply of each length, the per-character reveal the app
+used to do (convert the whole prefix and redraw once per character) is
+compared with ``rendering.reveal_frames``. The script reports frames sent,
+HTML bytes sent, conversion time and the time spent sleeping between frames.
+"""
+import argparse
+import re
+import time
+
+from rendering import REVEAL_FPS, reveal_frames
+
+SAMPLE = (
+    "**Question 1 (AO2, 3 marks)** ✅ You explained that *stakeholders* are affected by a business.\n"
+    "- ❌ Missing: apply it to the café in the case study.\n"
+    "💡 Next time: link each point to the business in the question.\n"
+)
+
+
+def per_character_html(text):
+    """The converter as it ran on every character, recompiling its patterns each call"""
+    text = re.sub(r'\*\*(.+?)\*\*', r'<strong>\1</strong>', text)
+    text = re.sub(r'\*(.+?)\*', r'<em>\1</em>', text)
+    text = text.replace('\n', '<br>')
+    text = re.sub(r'^(\d+)\.\s+(.+)$', r'<div style="margin-left: 20px;">\1. \2</div>', text, flags=re.MULTILINE)
+    return re.sub(r'^[-*]\s+(.+)$', r'<div style="margin-left: 20px;">• \1</div>', text, flags=re.MULTILINE)
+
+
+def dynamic_delay(length):
+    return 0.005 if length < 80 else 0.01 if length < 300 else 0.015
+
+
+def measure(frames):
+    """(frames, bytes, seconds) to produce every frame's HTML"""
+    count = sent = 0
+    started = time.perf_counter()
+    for html in frames:
+        count += 1
+        sent += len(html.encode('utf-8'))
+    return count, sent, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lengths", default="200,2000,8000", help="reply lengths in characters")
+    args = parser.parse_args()
+
+    print(f"{'chars':>6} {'method':>10} {'frames':>7} {'KB sent':>9} {'convert ms':>11} {'reveal s':>9}")
+    for length in (int(value) for value in args.lengths.split(",")):
+        text = (SAMPLE * (length // len(SAMPLE) + 1))[:length]
+        seconds = length * dynamic_delay(length)
+        old = measure(per_character_html(text[:end]) for end in range(1, length + 1))
+        new = measure(reveal_frames(text, seconds))
+        for label, (frames, sent, convert) in (("per-char", old), ("frames", new)):
+            reveal = seconds if label == "per-char" else frames / REVEAL_FPS
+            print(f"{length:>6} {label:>10} {frames:>7} {sent / 1024:>9.0f} {convert * 1000:>11.1f} {reveal:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
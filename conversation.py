@@ -0,0 +1,88 @@
+"""Bounded conversation history for model requests.
+
+The last few turns are sent verbatim. Older turns are folded, one line each,
+into a rolling summary kept in session state. Folding is incremental: each
+request only summarises the messages that have newly aged out of the window,
+and the summary itself is trimmed from the oldest end.
+"""
+import re
+
+RECENT_TURNS = 4
+HISTORY_BUDGET_CHARS = 12000
+# Whole request: system prompt, documents, student details and history
+REQUEST_BUDGET_CHARS = 32000
+MIN_HISTORY_CHARS = 2000
+SUMMARY_LINE_CHARS = 200
+SUMMARY_MAX_CHARS = 2400
+
+MARKDOWN_NOISE = re.compile(r"[*_`#>]+")
+WHITESPACE = re.compile(r"\s+")
+
+
+def new_summary():
+    """Empty rolling summary, as stored in ``st.session_state.context_summary``"""
+    return {'lines': [], 'folded': 0}
+
+
+def summarise_message(message):
+    """One short line standing in for an old message"""
+    text = WHITESPACE.sub(" ", MARKDOWN_NOISE.sub("", message['content'])).strip()
+    if len(text) > SUMMARY_LINE_CHARS:
+        text = text[:SUMMARY_LINE_CHARS].rsplit(" ", 1)[0] + " …"
+    speaker = "Student" if message['role'] == "user" else "Tutor"
+    return f"- {speaker}: {text}"
+
+
+def _fold(summary, messages, upto):
+    for message in messages[summary['folded']:upto]:
+        summary['lines'].append(summarise_message(message))
+    summary['folded'] = max(summary['folded'], upto)
+    while summary['lines'] and sum(len(line) + 1 for line in summary['lines']) > SUMMARY_MAX_CHARS:
+        summary['lines'].pop(0)
+
+
+def history_budget(fixed_chars, request_budget=REQUEST_BUDGET_CHARS, history_budget=HISTORY_BUDGET_CHARS):
+    """Characters left for history once the fixed parts of a request are counted"""
+    return max(MIN_HISTORY_CHARS, min(history_budget, request_budget - fixed_chars))
+
+
+def build_history(messages, user_message, summary, recent_turns=RECENT_TURNS, budget_chars=HISTORY_BUDGET_CHARS):
+    """Messages to send for this turn, plus the summary text and size stats.
+
+    ``messages`` is the session's chat history and ``summary`` its rolling
+    summary, which is updated in place.
+    """
+    history = [{"role": m["role"], "content": m["content"]} for m in messages]
+    # The caller has usually already appended this turn's message to the history
+    if not history or history[-1]["role"] != "user" or history[-1]["content"] != user_message:
+        history.append({"role": "user", "content": user_message})
+
+    if summary['folded'] > len(history):
+        # The chat was restarted
+        summary.clear()
+        summary.update(new_summary())
+
+    keep_from = max(summary['folded'], len(history) - recent_turns * 2)
+    _fold(summary, history, keep_from)
+    recent = history[keep_from:]
+
+    # Fold further while over budget, always keeping the current message
+    def size():
+        return sum(len(line) + 1 for line in summary['lines']) + sum(len(m["content"]) for m in recent)
+
+    while len(recent) > 1 and size() > budget_chars:
+        keep_from += 1
+        _fold(summary, history, keep_from)
+        recent = history[keep_from:]
+    while summary['lines'] and size() > budget_chars:
+        summary['lines'].pop(0)
+    if size() > budget_chars:
+        room = max(0, budget_chars - sum(len(line) + 1 for line in summary['lines']))
+        recent = [{"role": "user", "content": recent[-1]["content"][:room]}]
+
+    summary_text = "\n".join(summary['lines'])
+    stats = {
+        'full_chars': sum(len(m["content"]) for m in history),
+        'sent_chars': size(),
+    }
+    return recent, summary_text, stats
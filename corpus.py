@@ -0,0 +1,303 @@
+"""Process-wide document corpus shared by every Streamlit session.
+
+The corpus remembers the git blob SHA of every file it has loaded, so a refresh
+only downloads and parses files whose SHA has changed since the last load. A
+refresh lists the repository with one recursive tree call and downloads the
+changed blobs through a bounded thread pool. PDF pages are extracted on the
+shared process pool in ``pdf_extract``.
+"""
+import base64
+import hashlib
+import os
+import posixpath
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from pdf_extract import PageStream
+
+SUPPORTED_EXTENSIONS = ('.txt', '.pdf', '.docx', '.doc', '.md')
+
+# Upper bound on concurrent blob downloads during a refresh
+DOWNLOAD_WORKERS = 8
+
+
+def extract_pdf_text(data, notes=None):
+    """Extract text from raw PDF bytes, noting in ``notes`` if a limit cut it short"""
+    stream = PageStream(data)
+    text = "".join(page + "\n\n" for page in stream)
+    if stream.stopped and notes is not None:
+        notes.append(stream.describe_stop())
+    return text, stream.cacheable
+
+
+def cached_pdf_text(data, text_cache=None, key=None, notes=None):
+    """Extract PDF text, going through ``text_cache`` keyed by content hash"""
+    if text_cache is not None:
+        key = key or git_blob_sha(data)
+        text = text_cache.get(key)
+        if text is not None:
+            return text
+    text, cacheable = extract_pdf_text(data, notes)
+    if text_cache is not None and cacheable:
+        text_cache.put(key, text)
+    return text
+
+
+def document_text(name, data, text_cache=None):
+    """Turn the raw bytes of a supported file into text"""
+    if name.endswith(('.txt', '.md')):
+        return data.decode('utf-8', errors='ignore')
+    if name.endswith('.pdf'):
+        return cached_pdf_text(data, text_cache)
+    return f"[Word document: {name}]\nNote: Word documents need to be converted to .txt or .pdf for processing."
+
+
+class TreeEntry:
+    """One file or folder from a recursive repository tree listing"""
+
+    def __init__(self, path, sha, type="blob"):
+        self.path = path
+        self.sha = sha
+        self.type = type
+        self.name = posixpath.basename(path)
+
+
+class GithubSource:
+    """Read a PyGithub repository with one tree call plus one call per blob"""
+
+    def __init__(self, repo, ref=None):
+        self.repo = repo
+        self.ref = ref or repo.default_branch
+
+    def list_tree(self, error_log):
+        tree = self.repo.get_git_tree(self.ref, recursive=True)
+        if tree.truncated:
+            error_log.append("⚠️ Tree listing was truncated by GitHub - some files may be missing")
+        return [TreeEntry(element.path, element.sha, element.type) for element in tree.tree]
+
+    def fetch_blob(self, sha):
+        blob = self.repo.get_git_blob(sha)
+        return base64.b64decode(blob.content)
+
+
+class LocalSource:
+    """Offline stand-in for the GitHub API, serving files held in memory.
+
+    ``latency`` seconds are slept on every simulated request so ingest time can be
+    benchmarked against file count without a network.
+    """
+
+    def __init__(self, files, latency=0.0):
+        self.files = {path: bytes(data) for path, data in files.items()}
+        self.latency = latency
+        self.requests = 0
+        self._blobs = {git_blob_sha(data): data for data in self.files.values()}
+        self._count_lock = threading.Lock()
+
+    @classmethod
+    def from_directory(cls, root, latency=0.0):
+        """Serve every file below ``root`` as if it were a repository"""
+        files = {}
+        for folder, _, names in os.walk(root):
+            for name in names:
+                full_path = os.path.join(folder, name)
+                with open(full_path, 'rb') as handle:
+                    files[os.path.relpath(full_path, root).replace(os.sep, '/')] = handle.read()
+        return cls(files, latency=latency)
+
+    def _request(self):
+        with self._count_lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def list_tree(self, error_log):
+        self._request()
+        entries = []
+        folders = set()
+        for path in sorted(self.files):
+            parent = posixpath.dirname(path)
+            while parent and parent not in folders:
+                folders.add(parent)
+                parent = posixpath.dirname(parent)
+            entries.append(TreeEntry(path, git_blob_sha(self.files[path])))
+        entries.extend(TreeEntry(folder, "", "tree") for folder in folders)
+        return sorted(entries, key=lambda entry: entry.path)
+
+    def fetch_blob(self, sha):
+        self._request()
+        return self._blobs[sha]
+
+
+def git_blob_sha(data):
+    """SHA-1 of ``data`` as git would name the blob"""
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def list_source_files(source, error_log):
+    """List every supported file in ``source`` with a single tree call"""
+    entries = source.list_tree(error_log)
+    error_log.append(f"📂 Listed repository tree - found {len(entries)} items")
+    files = []
+    for entry in entries:
+        if entry.type == "tree":
+            error_log.append(f"📁 Found subfolder: {entry.path}")
+        elif entry.type != "blob":
+            continue
+        elif entry.name.endswith(SUPPORTED_EXTENSIONS):
+            error_log.append(f"📄 Found file: {entry.name}")
+            files.append(entry)
+        else:
+            error_log.append(f"⏭️ Skipped (wrong type): {entry.name}")
+    return files
+
+
+def load_entry(source, entry, text_cache=None):
+    """Download and convert one file, returning ``(text, log message, complete)``
+
+    ``complete`` is False when a PDF was cut short by its time limit or an
+    error, so the text should be used for now but extracted again next time.
+    """
+    if entry.name.endswith(('.docx', '.doc')):
+        # Word docs are only listed, so there is nothing to download
+        return document_text(entry.name, b""), f"⚠️ Word doc found (needs conversion): {entry.name}", True
+    if entry.name.endswith('.pdf'):
+        # The blob SHA is a content hash, so a cached PDF needs no download
+        text = text_cache.get(entry.sha) if text_cache is not None else None
+        if text is not None:
+            return text, f"✅ Loaded PDF from cache: {entry.name} ({len(text)} chars)", True
+        notes = []
+        text, complete = extract_pdf_text(source.fetch_blob(entry.sha), notes)
+        suffix = f" - {notes[0]}" if notes else ""
+        if not complete:
+            return text, (f"⚠️ Partly loaded PDF: {entry.name} ({len(text)} chars){suffix}; "
+                          f"it will be extracted again on the next refresh"), False
+        if text_cache is not None:
+            text_cache.put(entry.sha, text)
+        return text, f"✅ Loaded PDF: {entry.name} ({len(text)} chars){suffix}", True
+    text = document_text(entry.name, source.fetch_blob(entry.sha))
+    return text, f"✅ Loaded text file: {entry.name} ({len(text)} chars)", True
+
+
+class DocumentCorpus:
+    """Documents loaded from GitHub, keyed by repository path"""
+
+    def __init__(self, text_cache=None):
+        self._lock = threading.RLock()
+        self.text_cache = text_cache
+        self.documents = {}
+        self.error_log = []
+        self.loaded = False
+        # Bumped whenever the set of documents or their content changes
+        self.version = 0
+        # Prebuilt memory-mapped index, valid while the corpus is at ``mapped_version``
+        self.mapped_index = None
+        self.mapped_version = None
+
+    def ensure_loaded(self, loader):
+        """Run ``loader`` once per process, even if many sessions ask at the same time"""
+        if self.loaded:
+            return self.documents
+        with self._lock:
+            if not self.loaded:
+                loader()
+                # A failed first load is not retried by every new session
+                self.loaded = True
+        return self.documents
+
+    def replace(self, documents, error_log=None):
+        """Install a fixed set of documents (e.g. from the DOCUMENTS_JSON secret)"""
+        with self._lock:
+            self.documents = dict(documents)
+            if error_log is not None:
+                self.error_log = error_log
+            self.loaded = True
+            self.version += 1
+
+    def load_index(self, index):
+        """Serve the corpus from a prebuilt ``corpus_index.MappedIndex``"""
+        from corpus_index import MappedDocument
+
+        with self._lock:
+            documents = {}
+            for doc_idx, meta in enumerate(index.documents):
+                documents[meta.get('path') or meta['name']] = MappedDocument(index, doc_idx, **meta)
+            self.documents = documents
+            self.error_log = [f"📦 Loaded prebuilt index {index.path} ({index.meta.get('built_at', '')}): "
+                              f"{len(documents)} documents, {index.chunk_count} chunks"]
+            self.loaded = True
+            self.version += 1
+            self.mapped_index = index
+            self.mapped_version = self.version
+            return documents
+
+    def refresh(self, source, error_log, max_workers=DOWNLOAD_WORKERS):
+        """Sync with ``source``, downloading only files whose blob SHA changed.
+
+        Changed blobs are fetched concurrently by at most ``max_workers`` threads.
+        """
+        with self._lock:
+            files = list_source_files(source, error_log)
+            error_log.append(f"📊 Total files to process: {len(files)}")
+
+            previous = self.documents
+            unchanged = {}
+            changed = []
+            for entry in files:
+                known = previous.get(entry.path)
+                if known is not None and known.get('sha') == entry.sha:
+                    unchanged[entry.path] = known
+                else:
+                    changed.append(entry)
+
+            def load(entry):
+                try:
+                    return load_entry(source, entry, self.text_cache)
+                except Exception as e:
+                    return None, f"❌ Error loading {entry.name}: {str(e)}", False
+
+            loaded = {}
+            if changed:
+                with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(changed)))) as pool:
+                    # map() keeps results, and so the log, in tree order
+                    for entry, (text, message, complete) in zip(changed, pool.map(load, changed)):
+                        error_log.append(message)
+                        if text is None:
+                            continue
+                        loaded[entry.path] = {
+                            'name': entry.name,
+                            'path': entry.path,
+                            # No SHA for a partial PDF, so the next refresh extracts it again
+                            'sha': entry.sha if complete else None,
+                            'type': 'GitHub Document',
+                            'content': text,
+                            'uploaded_at': datetime.now().strftime("%Y-%m-%d %H:%M")
+                        }
+
+            documents = {}
+            for entry in files:
+                if entry.path in unchanged:
+                    documents[entry.path] = unchanged[entry.path]
+                elif entry.path in loaded:
+                    documents[entry.path] = loaded[entry.path]
+
+            if unchanged:
+                error_log.append(f"♻️ Reused {len(unchanged)} unchanged documents")
+            if self.mapped_index is not None and self.mapped_version == self.version:
+                stale = len(changed) + len(previous.keys() - documents.keys())
+                if stale:
+                    error_log.append(f"⚠️ Prebuilt index {self.mapped_index.path} is out of date: {stale} files "
+                                     f"added, changed or removed since it was built. Rebuild it with "
+                                     f"python corpus_index.py")
+                else:
+                    error_log.append(f"✅ Prebuilt index {self.mapped_index.path} matches the repository")
+            error_log.append(f"✅ Successfully loaded {len(documents)} documents")
+
+            if documents.keys() != previous.keys() or loaded:
+                self.version += 1
+            self.documents = documents
+            self.error_log = error_log
+            self.loaded = True
+            return documents
@@ -0,0 +1,262 @@
+"""Offline build of a memory-mapped corpus index.
+
+``python corpus_index.py`` reads the same sources as the app's GitHub loader
+(or a local folder) and writes one binary artifact holding the document text,
+chunk offsets, per-chunk unit tags and BM25 postings. The app memory-maps the
+artifact at startup, so cold start skips GitHub and PDF parsing, and every
+session and worker process reads the same physical pages.
+
+File layout (little-endian)::
+
+    header    magic, format version, counts, average chunk length, section offsets
+    meta      JSON: document names, paths, blob SHAs, build time
+    docs      per document: text offset, text length (bytes)
+    chunks    per chunk: text offset, text length, document, token count, unit tag
+    terms     per term, sorted by UTF-8 bytes: string offset, string length,
+              first posting, posting count, idf
+    strings   term strings
+    postings  per posting: chunk id, term frequency
+    text      UTF-8 document text
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from collections import Counter
+from datetime import datetime
+
+from retrieval import CHUNK_CHARS, BM25Scorer, Chunk, bm25_idf, chunk_spans, tokenize, unit_tags
+
+MAGIC = b"RBCIDX01"
+FORMAT_VERSION = 1
+DEFAULT_INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus_index.bin")
+
+HEADER = struct.Struct("<8sIIIId7Q")
+DOC = struct.Struct("<QQ")
+CHUNK = struct.Struct("<QIII4s")
+TERM = struct.Struct("<IHIIf")
+POSTING = struct.Struct("<II")
+
+
+def write_index(path, documents, chunk_chars=CHUNK_CHARS, source=""):
+    """Chunk, index and write ``documents`` to ``path`` atomically"""
+    doc_ids = sorted(documents)
+    meta = {'built_at': datetime.now().isoformat(timespec="seconds"), 'source': source, 'documents': []}
+    doc_rows = []
+    chunk_rows = []
+    postings = {}
+    text_parts = []
+    text_bytes = 0
+
+    for doc_idx, doc_id in enumerate(doc_ids):
+        doc = documents[doc_id]
+        meta['documents'].append({
+            key: doc.get(key, "") for key in ('name', 'path', 'sha', 'type', 'uploaded_at')
+        })
+        text = doc.get('content', '')
+        encoded = text.encode('utf-8')
+        doc_start = text_bytes
+        doc_rows.append(DOC.pack(doc_start, len(encoded)))
+        text_parts.append(encoded)
+        text_bytes += len(encoded)
+
+        spans = chunk_spans(text, chunk_chars)
+        texts = [text[start:end] for start, end in spans]
+        # Convert character spans to byte offsets without re-encoding prefixes
+        char_pos = byte_pos = 0
+        for (start, end), chunk, unit in zip(spans, texts, unit_tags(texts)):
+            byte_pos += len(text[char_pos:start].encode('utf-8'))
+            byte_len = len(chunk.encode('utf-8'))
+            terms = Counter(tokenize(chunk))
+            chunk_id = len(chunk_rows)
+            chunk_rows.append(CHUNK.pack(doc_start + byte_pos, byte_len, doc_idx, sum(terms.values()),
+                                         unit.encode('ascii')))
+            for term, freq in terms.items():
+                postings.setdefault(term, []).append((chunk_id, freq))
+            char_pos = end
+            byte_pos += byte_len
+
+    lengths = [CHUNK.unpack(row)[3] for row in chunk_rows]
+    avg_length = (sum(lengths) / len(lengths)) if lengths else 0.0
+
+    term_rows = []
+    string_parts = []
+    string_pos = 0
+    posting_rows = []
+    for term_bytes in sorted(term.encode('utf-8') for term in postings):
+        posting = postings[term_bytes.decode('utf-8')]
+        term_rows.append(TERM.pack(string_pos, len(term_bytes), len(posting_rows), len(posting),
+                                   bm25_idf(len(chunk_rows), len(posting))))
+        string_parts.append(term_bytes)
+        string_pos += len(term_bytes)
+        posting_rows.extend(POSTING.pack(chunk_id, freq) for chunk_id, freq in posting)
+
+    sections = [
+        json.dumps(meta).encode('utf-8'),
+        b"".join(doc_rows),
+        b"".join(chunk_rows),
+        b"".join(term_rows),
+        b"".join(string_parts),
+        b"".join(posting_rows),
+        b"".join(text_parts),
+    ]
+    offsets = []
+    position = HEADER.size
+    for section in sections:
+        offsets.append(position)
+        position += len(section)
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, len(doc_rows), len(chunk_rows), len(term_rows),
+                         avg_length, *offsets)
+
+    # Write then rename, so a running app keeps its mapping of the old file
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "wb") as handle:
+        handle.write(header)
+        for section in sections:
+            handle.write(section)
+    os.replace(tmp_path, path)
+    return {'documents': len(doc_rows), 'chunks': len(chunk_rows), 'terms': len(term_rows), 'bytes': position}
+
+
+class MappedIndex(BM25Scorer):
+    """Read-only BM25 index served straight from a memory-mapped artifact"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as handle:
+            self._mmap = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        (magic, version, self.doc_count, self._chunk_count, self._term_count, self.avg_length,
+         meta_off, self._docs_off, self._chunks_off, self._terms_off, self._strings_off,
+         self._postings_off, self._text_off) = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a corpus index (format {FORMAT_VERSION})")
+        self.meta = json.loads(bytes(self._view[meta_off:self._docs_off]).decode('utf-8'))
+        self.documents = self.meta['documents']
+
+    @property
+    def chunk_count(self):
+        return self._chunk_count
+
+    @property
+    def term_count(self):
+        return self._term_count
+
+    def _term(self, idx):
+        string_off, string_len, first, count, idf = TERM.unpack_from(self._mmap, self._terms_off + idx * TERM.size)
+        start = self._strings_off + string_off
+        return bytes(self._view[start:start + string_len]), first, count, idf
+
+    def term_postings(self, term):
+        key = term.encode('utf-8')
+        low, high = 0, self._term_count
+        while low < high:
+            mid = (low + high) // 2
+            found, first, count, idf = self._term(mid)
+            if found < key:
+                low = mid + 1
+            elif found > key:
+                high = mid
+            else:
+                start = self._postings_off + first * POSTING.size
+                return idf, POSTING.iter_unpack(self._view[start:start + count * POSTING.size])
+        return None
+
+    def _chunk_row(self, chunk_id):
+        return CHUNK.unpack_from(self._mmap, self._chunks_off + chunk_id * CHUNK.size)
+
+    def chunk_length(self, chunk_id):
+        return self._chunk_row(chunk_id)[3]
+
+    def chunk_unit(self, chunk_id):
+        return self._chunk_row(chunk_id)[4].rstrip(b"\0").decode('ascii')
+
+    def get_chunk(self, chunk_id):
+        offset, length, doc_idx, _, unit = self._chunk_row(chunk_id)
+        start = self._text_off + offset
+        text = bytes(self._view[start:start + length]).decode('utf-8')
+        return Chunk(chunk_id, self.documents[doc_idx]['name'], text, unit.rstrip(b"\0").decode('ascii'))
+
+    def document_text(self, doc_idx):
+        offset, length = DOC.unpack_from(self._mmap, self._docs_off + doc_idx * DOC.size)
+        start = self._text_off + offset
+        return bytes(self._view[start:start + length]).decode('utf-8')
+
+    def document_size(self, doc_idx):
+        """Length of a document's text in UTF-8 bytes, read from its row without touching the text"""
+        return DOC.unpack_from(self._mmap, self._docs_off + doc_idx * DOC.size)[1]
+
+
+class MappedDocument(dict):
+    """Corpus entry whose ``content`` is decoded from a ``MappedIndex`` on each use, never kept on the heap"""
+
+    def __init__(self, index, doc_idx, **meta):
+        super().__init__(**meta)
+        self._index = index
+        self._doc_idx = doc_idx
+
+    def __missing__(self, key):
+        if key != 'content':
+            raise KeyError(key)
+        # Not stored: the text stays in the shared mapped pages, not in this process's heap
+        return self._index.document_text(self._doc_idx)
+
+    def content_size(self):
+        """Length of ``content`` in UTF-8 bytes (an upper bound on characters), without decoding it"""
+        return self._index.document_size(self._doc_idx)
+
+    def get(self, key, default=None):
+        return self[key] if key == 'content' or key in self else default
+
+
+def read_github_secrets(path=".streamlit/secrets.toml"):
+    """The ``[github]`` section of the app's secrets file, if there is one"""
+    import tomllib
+
+    try:
+        with open(path, "rb") as handle:
+            return tomllib.load(handle).get('github', {})
+    except FileNotFoundError:
+        return {}
+
+
+def main(argv=None):
+    from corpus import DocumentCorpus, GithubSource, LocalSource
+
+    parser = argparse.ArgumentParser(description="Build the memory-mapped corpus index used by app.py")
+    parser.add_argument("--dir", help="index a local folder instead of the GitHub repository")
+    parser.add_argument("--repo", help="GitHub repository (default: [github] repo_name in secrets)")
+    parser.add_argument("--token", help="GitHub token (default: $GITHUB_TOKEN or [github] token in secrets)")
+    parser.add_argument("--secrets", default=".streamlit/secrets.toml")
+    parser.add_argument("--chunk-chars", type=int, default=CHUNK_CHARS)
+    parser.add_argument("-o", "--output", default=DEFAULT_INDEX_PATH)
+    args = parser.parse_args(argv)
+
+    if args.dir:
+        source, label = LocalSource.from_directory(args.dir), os.path.abspath(args.dir)
+    else:
+        secrets = read_github_secrets(args.secrets)
+        repo_name = args.repo or secrets.get('repo_name', '')
+        token = args.token or os.environ.get("GITHUB_TOKEN") or secrets.get('token', '')
+        if not repo_name or not token:
+            parser.error("no source: pass --dir, or --repo/--token, or configure [github] in secrets")
+        from github import Github
+
+        source, label = GithubSource(Github(token).get_repo(repo_name)), repo_name
+
+    error_log = []
+    documents = DocumentCorpus().refresh(source, error_log)
+    for line in error_log:
+        print(line)
+    stats = write_index(args.output, documents, chunk_chars=args.chunk_chars, source=label)
+    print(f"📦 Wrote {args.output}: {stats['documents']} documents, {stats['chunks']} chunks, "
+          f"{stats['terms']} terms, {stats['bytes'] / 1024:.0f} KB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
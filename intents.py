@@ -0,0 +1,248 @@
+"""Local intent classification for chat messages, before any model call.
+
+Greetings, requests for help and off-topic questions have fixed answers, so
+they are answered without a model request. Everything else is tagged with an
+intent (explain, quiz request, answer submission or 9-mark marking) and sent
+on. Classification runs in two stages:
+
+1. Keyword rules, for messages whose intent is unambiguous.
+2. A multinomial naive Bayes model over word unigrams and bigrams, trained on
+   the labelled examples in ``intent_examples.jsonl`` when the router is built.
+
+A message is only answered locally when the model is confident and, for help
+and off-topic, when it shares no vocabulary with the syllabus. That vocabulary
+is built from the unit titles and content in ``syllabus.py``, so it follows
+the specification. Anything
+uncertain goes to the model.
+"""
+import json
+import math
+import os
+import re
+from collections import Counter
+
+from response_cache import CONTINUATION, FOLLOW_UP, looks_like_answer_submission
+from syllabus import UNIT_CONTENT, UNITS
+
+DEFAULT_EXAMPLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "intent_examples.jsonl")
+
+GREETING = "greeting"
+HELP = "help"
+OFF_TOPIC = "off_topic"
+EXPLAIN = "explain"
+QUIZ_REQUEST = "quiz_request"
+ANSWER_SUBMISSION = "answer_submission"
+NINE_MARK = "nine_mark"
+
+LOCAL_INTENTS = (GREETING, HELP, OFF_TOPIC)
+MODEL_INTENTS = (EXPLAIN, QUIZ_REQUEST, ANSWER_SUBMISSION, NINE_MARK)
+INTENTS = LOCAL_INTENTS + MODEL_INTENTS
+
+CONFIDENCE_THRESHOLD = 0.75
+SMOOTHING = 0.5
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+(?:[.'-][a-z0-9]+)*")
+GREETINGS = frozenset({
+    "hi", "hello", "hey", "yo", "hiya", "howdy", "greetings", "sup", "morning", "hi there", "hello there",
+    "hey there", "good morning", "good afternoon", "good evening",
+})
+HELP_PHRASES = frozenset({
+    "help", "help please", "please help", "what can you do", "how does this work", "how do i use this",
+    "what can i ask you", "what can you help with", "what can you help me with", "instructions",
+})
+NINE_MARK_PATTERN = re.compile(r"\b(?:9|nine)[\s-]*mark(?:er|s)?\b")
+MARKING_PATTERN = re.compile(r"\b(?:mark|marked|grade|check|assess)\b|\banswer|\bhere'?s my\b|\bhere is my\b")
+QUIZ_PATTERN = re.compile(r"\b(?:quiz|test me|mcqs?|practice questions?|exam[\s-]style question)\b")
+
+# Words in the specification's text that say nothing about the subject on their own
+GENERIC_WORDS = frozenset("""
+4 a accuracy across activity adding affects age an and application are areas as average balances balancing
+between by calculating change changing charts choosing climate closing contents cycle data depend described
+descriptions development different digital each effect effective effects exist factors fair figures fit for
+formal forms function functional gender good groups grows health how human identifying impact importance
+improving in including influence influences informal informing internet it its knowledge life lifestyle
+limitations limits living making maps media meeting method methods minimum national nature needs new
+observation of on one ongoing opening other people person place point pollution poor praise private process
+processes ps public purpose questions rate rates remote responding rights role safety sample satisfactory
+size social spotting strategies suitable tables teamwork tests that the their these threats to total trust uk
+uses using value verbal versus waste ways why with working written
+""".split())
+# What students call things that the specification words differently, or not at all
+COURSE_TERMS = frozenset("""
+company companies firm firms shop shops charity charities organisation organisations employee employees staff
+manager managers salary salaries shareholder shareholders investment economy government tax taxes supply
+inventory legislation appraisal acquisition hierarchy statement spending global environment community recruit
+motivate inorganic lifecycle brand branding price competitor plc ltd jit arr exam quiz mcq revise revision gcse
+ocr j204 ao1 ao2 ao3 unit units
+""".split())
+
+
+def stem(word):
+    """Crude singular form, so ``companies`` matches ``company`` and ``costs`` matches ``cost``"""
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith("ss"):
+        return word
+    return word.rstrip("s") or word
+
+
+def syllabus_vocabulary():
+    """Stemmed subject words of the specification's units and course terms, and its hyphenated phrases"""
+    terms = {stem(word) for word in COURSE_TERMS}
+    phrases = set()
+    for text in list(UNITS.values()) + list(UNIT_CONTENT.values()):
+        for word in tokenize(text):
+            if "-" in word:
+                # "just-in-time" is also typed "just in time" or "justintime"
+                phrases.add(word.replace("-", " "))
+                terms.add(word.replace("-", ""))
+            if word not in GENERIC_WORDS:
+                terms.add(stem(word))
+    return frozenset(terms), frozenset(phrases)
+
+
+NO_SYLLABUS = "__no_syllabus__"
+
+
+def tokenize(text):
+    """Lower-cased words of ``text``"""
+    return WORD_PATTERN.findall(text.lower())
+
+
+def mentions_syllabus(words):
+    """True if ``words`` use the specification's vocabulary or name a unit"""
+    if any(stem(word) in SYLLABUS_TERMS or re.fullmatch(r"\d\.\d", word) for word in words):
+        return True
+    text = f" {' '.join(words)} "
+    return any(f" {phrase} " in text for phrase in SYLLABUS_PHRASES)
+
+
+SYLLABUS_TERMS, SYLLABUS_PHRASES = syllabus_vocabulary()
+
+
+def features(text):
+    """Word unigrams and bigrams, plus a marker for messages with no syllabus vocabulary"""
+    words = tokenize(text)
+    terms = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    if not mentions_syllabus(words):
+        terms.append(NO_SYLLABUS)
+    return terms
+
+
+class Intent:
+    """The classified intent of one message"""
+
+    __slots__ = ("name", "confidence", "source")
+
+    def __init__(self, name, confidence=1.0, source="rule"):
+        self.name = name
+        self.confidence = confidence
+        self.source = source
+
+    @property
+    def tag(self):
+        """The intent to route by, or ``None`` when the router was unsure"""
+        return None if self.source in ("default", "uncertain") else self.name
+
+    @property
+    def local(self):
+        """True if the reply can be given without a model request"""
+        return self.name in LOCAL_INTENTS
+
+    def __repr__(self):
+        return f"Intent({self.name!r}, {self.confidence:.2f}, {self.source!r})"
+
+
+class NaiveBayes:
+    """Multinomial naive Bayes text classifier"""
+
+    def __init__(self, examples, smoothing=SMOOTHING):
+        """Train on ``examples``, a list of ``(text, label)`` pairs"""
+        self.smoothing = smoothing
+        label_counts = Counter(label for _, label in examples)
+        self.labels = sorted(label_counts)
+        self.log_prior = {label: math.log(count / len(examples)) for label, count in label_counts.items()}
+        counts = {label: Counter() for label in self.labels}
+        for text, label in examples:
+            counts[label].update(features(text))
+        vocabulary = set()
+        for counter in counts.values():
+            vocabulary.update(counter)
+        self.vocabulary = frozenset(vocabulary)
+        self.log_likelihood = {}
+        self.log_unseen = {}
+        for label, counter in counts.items():
+            denominator = sum(counter.values()) + smoothing * len(vocabulary)
+            self.log_likelihood[label] = {term: math.log((count + smoothing) / denominator)
+                                          for term, count in counter.items()}
+            self.log_unseen[label] = math.log(smoothing / denominator)
+
+    def predict(self, text):
+        """``(label, probability)`` of the most likely label, or ``(None, 0.0)`` for unknown words only"""
+        terms = [term for term in features(text) if term in self.vocabulary]
+        if not terms:
+            return None, 0.0
+        scores = {}
+        for label in self.labels:
+            likelihood = self.log_likelihood[label]
+            unseen = self.log_unseen[label]
+            scores[label] = self.log_prior[label] + sum(likelihood.get(term, unseen) for term in terms)
+        best = max(scores, key=scores.get)
+        total = sum(math.exp(score - scores[best]) for score in scores.values())
+        return best, 1.0 / total
+
+
+class IntentRouter:
+    """Keyword rules backed by a trained classifier"""
+
+    def __init__(self, examples, threshold=CONFIDENCE_THRESHOLD):
+        self.threshold = threshold
+        self.model = NaiveBayes(examples)
+
+    @classmethod
+    def from_file(cls, path=DEFAULT_EXAMPLES_PATH, threshold=CONFIDENCE_THRESHOLD):
+        """Train on a JSON-lines file of ``{"text": ..., "intent": ...}`` examples"""
+        return cls(load_examples(path), threshold)
+
+    def classify(self, text):
+        normalised = " ".join(tokenize(text))
+
+        # Stage 1: unambiguous keywords
+        if normalised in GREETINGS:
+            return Intent(GREETING)
+        if normalised in HELP_PHRASES:
+            return Intent(HELP)
+        if NINE_MARK_PATTERN.search(normalised) and MARKING_PATTERN.search(normalised):
+            return Intent(NINE_MARK)
+        if looks_like_answer_submission(text):
+            return Intent(ANSWER_SUBMISSION)
+        if QUIZ_PATTERN.search(normalised):
+            return Intent(QUIZ_REQUEST)
+
+        # Stage 2: the trained model, trusted for local replies only when confident
+        label, confidence = self.model.predict(text)
+        if label is None:
+            return Intent(EXPLAIN, 0.0, "default")
+        if confidence < self.threshold:
+            # A local reply needs confidence; other guesses keep their label but route as untagged
+            return Intent(EXPLAIN if label in LOCAL_INTENTS else label, confidence, "uncertain")
+        if label in LOCAL_INTENTS:
+            # A subject question phrased as a request for help still needs an answer
+            if label == HELP and mentions_syllabus(normalised.split()):
+                return Intent(EXPLAIN, confidence, "syllabus")
+            # A follow-up ("explain that again") depends on the conversation, not the words
+            if label == OFF_TOPIC and (mentions_syllabus(normalised.split()) or FOLLOW_UP.search(normalised)
+                                       or CONTINUATION.search(normalised)):
+                return Intent(EXPLAIN, confidence, "syllabus")
+        return Intent(label, confidence, "model")
+
+
+def load_examples(path):
+    """``(text, intent)`` pairs from a JSON-lines file"""
+    examples = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                examples.append((record["text"], record["intent"]))
+    return examples
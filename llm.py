@@ -0,0 +1,84 @@
+"""Shared provider clients and streaming calls to the OpenAI and Anthropic APIs.
+
+``ClientRegistry`` creates each SDK client once per process, so every session
+and thread reuses the same keep-alive connection pool instead of opening a new
+connection (and TLS handshake) per message. The stream functions yield text
+deltas as they arrive and report token usage through ``on_usage`` at the end.
+"""
+import importlib
+import threading
+
+POOL_SIZE = 20
+REQUEST_TIMEOUT = 60.0
+CONNECT_TIMEOUT = 5.0
+KEEPALIVE_EXPIRY = 30.0
+MAX_RETRIES = 2
+
+SDK_CLIENTS = {"openai": ("openai", "OpenAI"), "anthropic": ("anthropic", "Anthropic")}
+
+
+class ClientRegistry:
+    """One SDK client per provider and API key, shared by every session and thread"""
+
+    def __init__(self, pool_size=POOL_SIZE, timeout=REQUEST_TIMEOUT, connect_timeout=CONNECT_TIMEOUT,
+                 max_retries=MAX_RETRIES, base_urls=None):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_retries = max_retries
+        self.base_urls = base_urls or {}
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def get(self, provider, api_key):
+        """Return the shared client for ``provider``, creating it on first use"""
+        key = (provider, api_key)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = self._clients[key] = self._create(provider, api_key)
+            return client
+
+    def _create(self, provider, api_key):
+        module_name, class_name = SDK_CLIENTS[provider]
+        sdk = importlib.import_module(module_name)
+        # The SDK's own httpx Limits type, so httpx itself need not be imported here
+        limits = type(sdk.DEFAULT_CONNECTION_LIMITS)(
+            max_connections=self.pool_size,
+            max_keepalive_connections=self.pool_size,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        )
+        timeout = sdk.Timeout(self.timeout, connect=self.connect_timeout)
+        return getattr(sdk, class_name)(
+            api_key=api_key,
+            base_url=self.base_urls.get(provider),
+            timeout=timeout,
+            max_retries=self.max_retries,
+            http_client=sdk.DefaultHttpxClient(limits=limits, timeout=timeout),
+        )
+
+    def close(self):
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients.clear()
+
+
+def openai_stream(client, on_usage=None, **request):
+    """Yield text from a streamed Chat Completions request"""
+    # Closing the stream hands its keep-alive connection back to the pool
+    with client.chat.completions.create(stream=True, stream_options={"include_usage": True}, **request) as stream:
+        for chunk in stream:
+            # The final chunk carries usage and no choices
+            if chunk.usage is not None and on_usage:
+                on_usage(chunk.usage)
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+def anthropic_stream(client, on_usage=None, **request):
+    """Yield text from a streamed Messages request"""
+    with client.messages.stream(**request) as stream:
+        yield from stream.text_stream
+        if on_usage:
+            on_usage(stream.get_final_message().usage)
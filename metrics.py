@@ -0,0 +1,46 @@
+"""Process-wide counters and samples for the teacher Performance tab."""
+import threading
+from collections import deque
+
+SAMPLE_WINDOW = 500
+
+
+class Metrics:
+    """Thread-safe named counters plus a rolling window of samples per name"""
+
+    def __init__(self, window=SAMPLE_WINDOW):
+        self._lock = threading.Lock()
+        self._window = window
+        self.counters = {}
+        self._samples = {}
+        self._totals = {}
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name, value):
+        """Record one sample, e.g. a latency or a token count"""
+        with self._lock:
+            self._samples.setdefault(name, deque(maxlen=self._window)).append(value)
+            count, total = self._totals.get(name, (0, 0))
+            self._totals[name] = (count + 1, total + value)
+
+    def counter(self, name):
+        with self._lock:
+            return self.counters.get(name, 0)
+
+    def summary(self, name):
+        """Count and total over all time, plus mean/p50/p95 over the recent window"""
+        with self._lock:
+            samples = sorted(self._samples.get(name, ()))
+            count, total = self._totals.get(name, (0, 0))
+        if not samples:
+            return {'count': 0, 'total': 0, 'mean': 0, 'p50': 0, 'p95': 0}
+        return {
+            'count': count,
+            'total': total,
+            'mean': sum(samples) / len(samples),
+            'p50': samples[len(samples) // 2],
+            'p95': samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        }
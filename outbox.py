@@ -0,0 +1,85 @@
+"""Durable local outbox for quiz records on their way to Google Sheets.
+
+Every record is committed here before the student's rerun finishes, so a slow
+or unavailable Sheets API, a failed write or a server restart cannot lose it.
+``sheets.SheetWriter`` drains the outbox in batches and deletes rows only once
+the sheet has them. Rows still here when the server starts again are replayed.
+
+The outbox is a single SQLite table in WAL mode with ``synchronous=NORMAL``.
+A commit appends to the write-ahead log without waiting for an fsync. The log
+is synced at each checkpoint, so fsyncs are batched across many records. A
+commit survives a crash of the server process; only an operating system crash
+or power cut before the next checkpoint could lose the latest rows.
+
+Each row has a unique key (the quiz record's id), so adding a record twice
+keeps one copy.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_OUTBOX_PATH = os.path.join(os.path.expanduser("~"), ".cache", "ocr-revision-buddy", "sheets-outbox.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL UNIQUE,
+    row TEXT NOT NULL,
+    added REAL NOT NULL
+)
+"""
+
+
+class Outbox:
+    """Rows waiting for the sheet, oldest first, in an SQLite database"""
+
+    def __init__(self, path=DEFAULT_OUTBOX_PATH):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        # Autocommit: every statement is its own transaction
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(SCHEMA)
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def full(self):
+        """The outbox is bounded only by the disk"""
+        return False
+
+    def add(self, key, row):
+        with self._lock:
+            self._db.execute("INSERT OR IGNORE INTO outbox (key, row, added) VALUES (?, ?, ?)",
+                             (key, json.dumps(row), time.time()))
+        return True
+
+    def batch(self, limit):
+        """The oldest ``limit`` rows as (key, row) pairs"""
+        with self._lock:
+            found = self._db.execute("SELECT key, row FROM outbox ORDER BY seq LIMIT ?", (limit,)).fetchall()
+        return [(key, json.loads(row)) for key, row in found]
+
+    def ack(self, keys):
+        """Remove rows the sheet now has"""
+        keys = list(keys)
+        if not keys:
+            return
+        with self._lock:
+            self._db.execute(f"DELETE FROM outbox WHERE key IN ({', '.join('?' * len(keys))})", keys)
+
+    def oldest_age(self):
+        """Seconds the oldest row has waited, or ``None`` if the outbox is empty"""
+        with self._lock:
+            added = self._db.execute("SELECT MIN(added) FROM outbox").fetchone()[0]
+        return None if added is None else time.time() - added
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,193 @@
+"""Parallel, page-streaming PDF text extraction.
+
+PyPDF2 is pure Python and CPU-bound, so pages are extracted on a shared
+process pool rather than on the thread rendering the Streamlit script. Every
+task has to receive the PDF's bytes and parse the document before it can read
+a page, so a document is split into one contiguous page range per worker (and
+no range shorter than ``MIN_TASK_PAGES``), not into many small batches. The
+first task also reports the page count, so the caller never parses the PDF
+itself; with a single worker that task covers the whole document.
+``PageStream`` yields page text in page order as ranges finish and stops early
+once a document hits its page or time limit, so one broken PDF cannot hold up
+a whole corpus load.
+"""
+import atexit
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+# Per-document limits
+MAX_PAGES = 300
+TIME_LIMIT = 60.0
+
+# Worker processes in the shared pool
+WORKERS = max(1, (os.cpu_count() or 2) - 1)
+# Fewest pages worth a task of their own; each task parses the whole PDF once
+MIN_TASK_PAGES = 16
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _extract_range(data, start, stop):
+    """Worker task: parse one PDF once; return its page count and the text of pages ``start``..``stop``"""
+    import PyPDF2
+
+    reader = PyPDF2.PdfReader(BytesIO(data))
+    total = len(reader.pages)
+    return total, [reader.pages[idx].extract_text() or "" for idx in range(start, min(stop, total))]
+
+
+def get_pool():
+    """Return the process-wide extraction pool, or ``None`` if processes are unavailable"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            try:
+                # spawn, not fork: the Streamlit server process is multi-threaded
+                _pool = ProcessPoolExecutor(
+                    max_workers=WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            except (OSError, ValueError, NotImplementedError):
+                return None
+        return _pool
+
+
+def shutdown_pool(pool=None):
+    """Shut the shared pool down; with ``pool``, only if it is still the shared one"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None and (pool is None or pool is _pool):
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+atexit.register(shutdown_pool)
+
+
+def page_ranges(start, stop, workers):
+    """Split pages ``start``..``stop`` into contiguous ranges, one per worker, none shorter than ``MIN_TASK_PAGES``"""
+    if stop <= start:
+        return []
+    tasks = max(1, min(workers, -(-(stop - start) // MIN_TASK_PAGES)))
+    size, extra = divmod(stop - start, tasks)
+    ranges = []
+    for task in range(tasks):
+        end = start + size + (1 if task < extra else 0)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+class PageStream:
+    """Iterate over the page texts of a PDF, extracted in parallel.
+
+    After iteration ``stopped`` is ``None`` if every page was read, or a short
+    reason ("page limit", "time limit", "error: ...") if extraction ended early.
+    A worker stuck on a pathological page keeps its process slot until it
+    finishes, but the caller is released as soon as the time limit passes.
+    """
+
+    def __init__(self, data, max_pages=MAX_PAGES, time_limit=TIME_LIMIT, pool=None, workers=WORKERS):
+        self.data = data
+        self.max_pages = max_pages
+        self.time_limit = time_limit
+        # ``workers`` is the size of ``pool``, or of the shared pool
+        self.pool = pool
+        self.workers = workers
+        self.total_pages = 0
+        self.pages_read = 0
+        self.stopped = None
+
+    @property
+    def cacheable(self):
+        # A page-limited result is deterministic; a timed-out one is not
+        return self.stopped in (None, "page limit")
+
+    def describe_stop(self):
+        if self.stopped is None:
+            return ""
+        # The page count is unknown if the first task never finished
+        total = f" of {self.total_pages}" if self.total_pages else ""
+        return f"stopped after {self.pages_read}{total} pages ({self.stopped})"
+
+    def __iter__(self):
+        deadline = time.monotonic() + self.time_limit
+        pool = self.pool or get_pool()
+        first = None
+        if pool is not None:
+            # Until the page count is known, one task takes the first range, or everything with one worker
+            first_stop = MIN_TASK_PAGES if self.workers > 1 else self.max_pages
+            try:
+                first = pool.submit(_extract_range, self.data, 0, min(first_stop, self.max_pages))
+            except (BrokenProcessPool, RuntimeError):
+                # A dead pool is replaced on next use; this document runs inline
+                shutdown_pool(pool)
+        if first is None:
+            yield from self._iter_inline(0, deadline)
+        else:
+            yield from self._iter_futures(pool, first, deadline)
+        if self.stopped is None and self.total_pages > self.max_pages:
+            self.stopped = "page limit"
+
+    def _iter_futures(self, pool, first, deadline):
+        futures = [first]
+        try:
+            index = 0
+            while index < len(futures):
+                remaining = deadline - time.monotonic()
+                try:
+                    total, pages = futures[index].result(timeout=max(0.0, remaining))
+                except TimeoutError:
+                    self.stopped = "time limit"
+                    return
+                except BrokenProcessPool as e:
+                    shutdown_pool(pool)
+                    self.stopped = f"error: {e}"
+                    return
+                except Exception as e:
+                    if index == 0:
+                        # An unreadable file raises here, before anything is yielded
+                        raise
+                    self.stopped = f"error: {e}"
+                    return
+                if index == 0:
+                    self.total_pages = total
+                    rest = page_ranges(len(pages), min(total, self.max_pages), self.workers)
+                    try:
+                        futures += [pool.submit(_extract_range, self.data, start, stop) for start, stop in rest]
+                    except (BrokenProcessPool, RuntimeError):
+                        shutdown_pool(pool)
+                        futures = None
+                for page in pages:
+                    self.pages_read += 1
+                    yield page
+                if futures is None:
+                    yield from self._iter_inline(self.pages_read, deadline)
+                    return
+                index += 1
+        finally:
+            for future in futures or ():
+                future.cancel()
+
+    def _iter_inline(self, start, deadline):
+        import PyPDF2
+
+        reader = PyPDF2.PdfReader(BytesIO(self.data))
+        self.total_pages = len(reader.pages)
+        for idx in range(start, min(self.total_pages, self.max_pages)):
+            if time.monotonic() > deadline:
+                self.stopped = "time limit"
+                return
+            try:
+                page = reader.pages[idx].extract_text() or ""
+            except Exception as e:
+                self.stopped = f"error: {e}"
+                return
+            self.pages_read += 1
+            yield page
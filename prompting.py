@@ -0,0 +1,114 @@
+"""Provider request layouts that keep a cacheable prompt prefix.
+
+Both providers cache on an exact prefix of the request, so everything that is
+the same for every student comes first and in a fixed order: the system
+prompt, then the document reference block. Per-student details, the rolling
+history summary and the conversation follow it.
+
+Anthropic caches up to a ``cache_control`` breakpoint, and not at all below
+its minimum prefix (1,024 tokens; 2,048 for Haiku). The system prompt alone is
+about 400 tokens and the reference block changes with retrieval on almost
+every turn, so Anthropic requests add the J204 specification from
+``syllabus.py`` after the system prompt and put the breakpoint there. Cache
+reads cost a tenth of normal input, so the longer prefix costs less per
+request than the short uncached one (``benchmarks/prompt_cache.py``).
+OpenAI's automatic caching only halves the price of a cached prefix, so
+there the specification would add cost; OpenAI requests do not include it.
+"""
+
+from syllabus import SYLLABUS
+
+SYSTEM_PROMPT = """You are the OCR Business Revision Buddy, a friendly AI tutor for OCR GCSE Business (J204).
+
+🎓 BEHAVIOUR RULES:
+- Only answer OCR GCSE Business (J204) questions
+- Use British English always
+- Be friendly, supportive, encouraging, clear and structured
+- Use OCR command words: Identify, State, Explain, Analyse, Evaluate, Justify
+
+📚 CONTENT:
+- Component 1 - Business 1: business activity, marketing and people (01):
+  * Units 1.1-1.6: Business activity
+  * Units 2.1-2.4: Marketing
+  * Units 3.1-3.7: People
+- Component 2 - Business 2: operations, finance and influences on business (02):
+  * Units 4.1-4.6: Operations
+  * Units 5.1-5.5: Finance
+  * Units 6.1-6.3: Influences on business
+  * Unit 7: The interdependent nature of business
+- Use real business examples (cafés, gyms, shops, services)
+- Keep explanations concise and exam-focused
+
+📝 QUIZ/TEST BEHAVIOUR - CRITICAL:
+When student asks for tests/quizzes/MCQs/practice questions:
+1. Generate 3-5 exam-style questions
+2. Mix AO1 (1-2 marks), AO2 (2-3 marks), AO3 (3-6+ marks)
+3. ⚠️ DO NOT give answers in same response
+4. Say: "Here are your questions. Try them first, then send me your answers and I'll mark them."
+5. Only reveal answers when student submits their answers
+
+✅ MARKING BEHAVIOUR:
+When student submits answers:
+- Mark each question separately
+- State AO level (AO1/AO2/AO3)
+- Show: ✅ What was good, ❌ What was missing
+- Provide model answer
+- Give "💡 Next time" tip
+
+🚫 SAFETY:
+If non-Business topics: "I'm designed for OCR GCSE Business (J204). What Business topic would you like to revise?"
+
+Use uploaded documents if available for accuracy."""
+
+
+def openai_request(system_prompt, reference, student_context, messages):
+    """``messages`` for the Chat Completions API, stable parts first"""
+    stable = system_prompt if not reference else f"{system_prompt}\n\n{reference}"
+    request = [{"role": "system", "content": stable}]
+    if student_context:
+        request.append({"role": "system", "content": student_context.strip()})
+    return request + messages
+
+
+def anthropic_request(system_prompt, reference, student_context):
+    """``system`` blocks for the Messages API, cacheable up to the end of the specification"""
+    # The breakpoint caches the system prompt and specification, which never change, and none of the reference
+    blocks = [
+        {"type": "text", "text": system_prompt},
+        {"type": "text", "text": SYLLABUS, "cache_control": {"type": "ephemeral"}},
+    ]
+    if reference:
+        blocks.append({"type": "text", "text": reference})
+    if student_context:
+        blocks.append({"type": "text", "text": student_context.strip()})
+    return blocks
+
+
+def usage_tokens(provider, usage):
+    """``(input, cached input, output)`` token counts from a response's usage"""
+    if provider == "openai":
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = (getattr(details, "cached_tokens", 0) or 0) if details else 0
+        output_tokens = getattr(usage, "completion_tokens", 0) or 0
+    else:
+        cached = getattr(usage, "cache_read_input_tokens", 0) or 0
+        written = getattr(usage, "cache_creation_input_tokens", 0) or 0
+        prompt_tokens = (getattr(usage, "input_tokens", 0) or 0) + cached + written
+        output_tokens = getattr(usage, "output_tokens", 0) or 0
+    return prompt_tokens, cached, output_tokens
+
+
+def record_usage(metrics, provider, usage):
+    """Add a response's input, cached-input and cache-write token counts to ``metrics``"""
+    if usage is None:
+        return
+    prompt_tokens, cached, output_tokens = usage_tokens(provider, usage)
+    metrics.incr(f"{provider}_requests")
+    metrics.incr(f"{provider}_input_tokens", prompt_tokens)
+    metrics.incr(f"{provider}_cached_tokens", cached)
+    metrics.incr(f"{provider}_output_tokens", output_tokens)
+    # Anthropic charges extra for tokens written to its cache; OpenAI reports none
+    metrics.incr(f"{provider}_cache_write_tokens", getattr(usage, "cache_creation_input_tokens", 0) or 0)
+    if cached:
+        metrics.incr(f"{provider}_cache_hits")
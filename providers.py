@@ -0,0 +1,347 @@
+"""Model providers behind one interface, with deadlines, failover and hedging.
+
+Each configured provider (OpenAI, Anthropic, or a local ``StubProvider``)
+streams a reply from the same request parts. ``ProviderPool`` tries them in
+order:
+
+* every attempt has a deadline for its first token and for the whole reply,
+  so a stuck connection cannot freeze a session;
+* a circuit breaker per provider skips a provider after repeated failures
+  and lets one trial request through once ``reset_after`` has passed. A trial
+  that is cancelled before its outcome is known (it lost a hedge, or the
+  reader stopped) hands the trial back, so the next request can try again;
+* a provider that fails before producing any text is replaced by the next;
+* optionally (hedging), if the first provider has produced no text after
+  about its own p95 time to first token, the next one is started as well and
+  whichever answers first is used.
+
+Text from a provider is read on a helper thread and handed over through a
+queue, so deadlines hold even while the provider's socket is blocked.
+"""
+import queue
+import threading
+import time
+
+from llm import anthropic_stream, openai_stream
+from prompting import anthropic_request, openai_request
+
+FIRST_TOKEN_DEADLINE = 20.0
+TOTAL_DEADLINE = 90.0
+BREAKER_FAILURES = 3
+BREAKER_RESET_AFTER = 30.0
+HEDGE_MIN_DELAY = 2.0
+
+
+class DeadlineExceeded(Exception):
+    """A provider took longer than the request's deadline"""
+
+
+class ProvidersUnavailable(Exception):
+    """Every provider's circuit breaker is open"""
+
+
+def counts_as_failure(error):
+    """Client errors (bad request, auth) and rate limits say nothing about a provider's health"""
+    # A 429 is left to the scheduler, which backs off and retries in the request's queue place
+    status = getattr(error, "status_code", None)
+    return status is None or status >= 500 or status in (408, 409)
+
+
+class CircuitBreaker:
+    """Closed, open after ``failures`` in a row, then half-open after ``reset_after`` seconds"""
+
+    def __init__(self, failures=BREAKER_FAILURES, reset_after=BREAKER_RESET_AFTER):
+        self.failures = failures
+        self.reset_after = reset_after
+        self.consecutive = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.reset_after else "open"
+
+    def acquire(self):
+        """``"closed"`` or ``"trial"`` if a request may be sent, else ``None``; one trial at a time while half-open"""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return "closed"
+            if state == "half-open" and not self._trial:
+                self._trial = True
+                return "trial"
+            return None
+
+    def allow(self):
+        """True if a request may be sent; only one trial request while half-open"""
+        return self.acquire() is not None
+
+    def release_trial(self):
+        """Let another trial through after one ended without a success or failure"""
+        with self._lock:
+            self._trial = False
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive += 1
+            if self._trial or self.consecutive >= self.failures:
+                self.opened_at = time.monotonic()
+            self._trial = False
+
+
+class OpenAIProvider:
+    name = "openai"
+
+    def __init__(self, client):
+        self.client = client
+
+    def stream(self, route, system_prompt, reference, student_context, messages, on_usage=None):
+        return openai_stream(
+            self.client,
+            on_usage=on_usage,
+            model=route.openai_model,
+            messages=openai_request(system_prompt, reference, student_context, messages),
+            max_tokens=route.max_tokens,
+            temperature=route.temperature
+        )
+
+
+class AnthropicProvider:
+    name = "anthropic"
+
+    def __init__(self, client):
+        self.client = client
+
+    def stream(self, route, system_prompt, reference, student_context, messages, on_usage=None):
+        return anthropic_stream(
+            self.client,
+            on_usage=on_usage,
+            model=route.anthropic_model,
+            max_tokens=route.max_tokens,
+            temperature=route.temperature,
+            system=anthropic_request(system_prompt, reference, student_context),
+            messages=messages
+        )
+
+
+class StubProvider:
+    """Local stand-in for a provider, with injectable latency and errors"""
+
+    def __init__(self, name, reply="Stakeholders are groups affected by a business.", first_token_delay=0.0,
+                 token_delay=0.0, error=None, error_after=0, hang=False):
+        self.name = name
+        self.reply = reply
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        # ``error`` is raised after ``error_after`` words; ``hang`` never answers
+        self.error = error
+        self.error_after = error_after
+        self.hang = hang
+        self.calls = 0
+
+    def stream(self, route, system_prompt, reference, student_context, messages, on_usage=None):
+        self.calls += 1
+        time.sleep(self.first_token_delay)
+        if self.hang:
+            threading.Event().wait()
+        for i, word in enumerate(self.reply.split(" ")):
+            if self.error is not None and i == self.error_after:
+                raise self.error
+            if i:
+                time.sleep(self.token_delay)
+            yield word if i == 0 else " " + word
+
+
+class _Attempt:
+    """One provider's reply, read on a helper thread into a shared queue"""
+
+    def __init__(self, provider, deltas, inbox, trial=False):
+        self.provider = provider
+        # The half-open breaker's one trial request, until its outcome is recorded
+        self.trial = trial
+        self.started = time.monotonic()
+        self.first_token_at = None
+        self.cancelled = False
+        self._deltas = deltas
+        self._inbox = inbox
+        threading.Thread(target=self._pump, daemon=True, name=f"provider-{provider.name}").start()
+
+    def _pump(self):
+        try:
+            for delta in self._deltas:
+                if self.cancelled:
+                    break
+                self._inbox.put((self, "delta", delta))
+            else:
+                self._inbox.put((self, "done", None))
+        except Exception as e:
+            self._inbox.put((self, "error", e))
+        finally:
+            close = getattr(self._deltas, "close", None)
+            if close:
+                try:
+                    close()
+                except Exception:
+                    pass
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class ProviderPool:
+    """Failover, deadlines and optional hedging across providers"""
+
+    def __init__(self, providers, first_token_deadline=FIRST_TOKEN_DEADLINE, total_deadline=TOTAL_DEADLINE,
+                 hedge=False, hedge_min_delay=HEDGE_MIN_DELAY, breaker_failures=BREAKER_FAILURES,
+                 breaker_reset_after=BREAKER_RESET_AFTER, metrics=None):
+        self.providers = list(providers)
+        self.first_token_deadline = first_token_deadline
+        self.total_deadline = total_deadline
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.metrics = metrics
+        self.breakers = {p.name: CircuitBreaker(breaker_failures, breaker_reset_after) for p in self.providers}
+
+    @property
+    def names(self):
+        return [p.name for p in self.providers]
+
+    def _incr(self, name):
+        if self.metrics is not None:
+            self.metrics.incr(name)
+
+    def _observe(self, name, value):
+        if self.metrics is not None:
+            self.metrics.observe(name, value)
+
+    def hedge_delay(self, provider):
+        """Wait this long for a first token before starting a second provider"""
+        if self.metrics is None:
+            return self.hedge_min_delay
+        p95 = self.metrics.summary(f"{provider.name}_first_token_seconds")['p95']
+        return max(self.hedge_min_delay, p95)
+
+    def _record(self, attempt, error=None):
+        breaker = self.breakers[attempt.provider.name]
+        if error is None:
+            breaker.record_success()
+        elif counts_as_failure(error):
+            breaker.record_failure()
+            self._incr(f"{attempt.provider.name}_failures")
+        elif attempt.trial:
+            breaker.release_trial()
+        attempt.trial = False
+
+    def _abandon(self, attempt):
+        """Cancel an attempt whose outcome will never be recorded"""
+        attempt.cancel()
+        if attempt.trial:
+            self.breakers[attempt.provider.name].release_trial()
+            attempt.trial = False
+
+    def stream(self, route, system_prompt, reference, student_context, messages, on_usage=None):
+        """Yield the reply from the first provider that answers.
+
+        ``on_usage(provider_name, usage)`` receives the winning provider's usage.
+        """
+        candidates = list(self.providers)
+        inbox = queue.Queue()
+        running = []
+        last_error = None
+        winner = None
+        started = time.monotonic()
+
+        def launch():
+            """Start the next provider whose breaker allows it; False if none is left"""
+            while candidates:
+                provider = candidates.pop(0)
+                admitted = self.breakers[provider.name].acquire()
+                if admitted is None:
+                    continue
+                usage = (lambda u, name=provider.name: on_usage(name, u)) if on_usage else None
+                deltas = provider.stream(route, system_prompt, reference, student_context, messages, on_usage=usage)
+                running.append(_Attempt(provider, deltas, inbox, trial=admitted == "trial"))
+                return True
+            return False
+
+        if not launch():
+            raise ProvidersUnavailable("All model providers are temporarily unavailable")
+        try:
+            while True:
+                now = time.monotonic()
+                if winner is None:
+                    # Earliest deadline among the running attempts, and the hedge timer
+                    wait = min(a.started + self.first_token_deadline for a in running) - now
+                    hedge_at = None
+                    if self.hedge and candidates and len(running) == 1:
+                        hedge_at = running[0].started + self.hedge_delay(running[0].provider)
+                        wait = min(wait, hedge_at - now)
+                else:
+                    wait = started + self.total_deadline - now
+                try:
+                    attempt, kind, payload = inbox.get(timeout=max(0.0, wait))
+                except queue.Empty:
+                    now = time.monotonic()
+                    if winner is not None:
+                        winner.cancel()
+                        self._record(winner, DeadlineExceeded())
+                        raise DeadlineExceeded(f"{winner.provider.name} did not finish within {self.total_deadline:g}s")
+                    if hedge_at is not None and now >= hedge_at:
+                        if launch():
+                            self._incr("hedged_requests")
+                        continue
+                    for expired in [a for a in running if now - a.started >= self.first_token_deadline]:
+                        expired.cancel()
+                        running.remove(expired)
+                        last_error = DeadlineExceeded(
+                            f"{expired.provider.name} sent nothing within {self.first_token_deadline:g}s")
+                        self._record(expired, last_error)
+                    if not running:
+                        if not launch():
+                            raise last_error
+                        self._incr("failovers")
+                    continue
+
+                if winner is not None and attempt is not winner:
+                    continue
+                if attempt not in running and winner is None:
+                    continue  # A cancelled attempt's leftovers
+                if kind == "delta":
+                    if winner is None:
+                        winner = attempt
+                        attempt.first_token_at = time.monotonic()
+                        self._observe(f"{attempt.provider.name}_first_token_seconds",
+                                      attempt.first_token_at - attempt.started)
+                        for other in running:
+                            if other is not attempt:
+                                self._abandon(other)
+                                self._incr("hedge_losses")
+                        running[:] = [attempt]
+                    yield payload
+                elif kind == "done":
+                    self._record(attempt)
+                    self._incr(f"{attempt.provider.name}_replies")
+                    return
+                else:
+                    self._record(attempt, payload)
+                    if winner is not None:
+                        raise payload
+                    running.remove(attempt)
+                    last_error = payload
+                    if not running:
+                        if not launch():
+                            raise last_error
+                        self._incr("failovers")
+        finally:
+            # The reader stopped early, or the request failed; a trial still running has no outcome
+            for attempt in running:
+                self._abandon(attempt)
@@ -0,0 +1,371 @@
+"""Pre-generated J204 quiz questions, served without a model call.
+
+``python question_bank.py`` asks the model, once and offline, for exam-style
+questions with model answers for every unit in the specification at each
+assessment objective (AO1 recall, AO2 application, AO3 analysis and
+evaluation), and writes them to one compact binary file. The app memory-maps
+the file and answers quiz requests ("Test me on Unit 1.5", "5 MCQs on Unit
+2.2") from it instantly. A session is never set the same question twice; once
+a unit has too few unseen questions left, the request goes to the model as
+before.
+
+Selection is random with an even AO mix, or adaptive: a student scoring
+poorly on a unit gets more AO1 questions, one scoring well gets more AO3.
+
+File layout (little-endian)::
+
+    header   magic, format version, counts, section offsets
+    meta     JSON: unit titles, model, build time
+    cells    per (unit, AO level), sorted: unit, level, first question, count
+    rows     per question: data offset, data length, unit, level, marks, flags
+    data     per question: zlib-compressed JSON (question, options, answer)
+"""
+import argparse
+import json
+import mmap
+import os
+import random
+import re
+import struct
+import sys
+import tempfile
+import zlib
+from datetime import datetime
+
+from response_cache import normalise_prompt
+from retrieval import query_unit
+from syllabus import AO_DESCRIPTIONS, AO_LEVELS, AO_MARKS, UNITS
+
+MAGIC = b"RBQBNK01"
+FORMAT_VERSION = 1
+DEFAULT_BANK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "question_bank.bin")
+
+HEADER = struct.Struct("<8sIII4Q")
+CELL = struct.Struct("<4sBII")
+ROW = struct.Struct("<QI4sBBB")
+FLAG_MCQ = 1
+
+DEFAULT_QUIZ_LENGTH = 4
+MAX_QUIZ_LENGTH = 10
+QUESTION_COUNT = re.compile(r"(?<![\d.])\b(\d{1,2})\s+(?:\w+\s+)?(?:questions?|mcqs?|qs)\b", re.IGNORECASE)
+MCQ_REQUEST = re.compile(r"\b(?:mcqs?|multiple[\s-]choice)\b", re.IGNORECASE)
+MARKS = re.compile(r"\b(\d{1,2})\s*/\s*(\d{1,2})\b")
+
+
+def unit_for(text):
+    """The unit (or component, e.g. "2") ``text`` is about, by number or title; ``""`` if none"""
+    unit = query_unit(text)
+    if unit:
+        return unit
+    lowered = text.lower()
+    for code, title in UNITS.items():
+        if title.lower() in lowered:
+            return code
+    return ""
+
+
+def quiz_length(text):
+    """How many questions a request asks for, e.g. 5 for "Give me 5 MCQs" """
+    match = QUESTION_COUNT.search(text)
+    count = int(match.group(1)) if match else DEFAULT_QUIZ_LENGTH
+    return max(1, min(count, MAX_QUIZ_LENGTH))
+
+
+def wants_mcq(text):
+    return bool(MCQ_REQUEST.search(text))
+
+
+def marks_fraction(text):
+    """Marks awarded over marks available across every "x/y" in a marking reply, or ``None``"""
+    scored = available = 0
+    for got, out_of in MARKS.findall(text):
+        got, out_of = int(got), int(out_of)
+        if 0 < out_of and got <= out_of:
+            scored += got
+            available += out_of
+    return scored / available if available else None
+
+
+def ao_mix(count, mastery=None, rng=random):
+    """Questions to set at each level; ``mastery`` (0-1) shifts the mix from AO1 towards AO3"""
+    if mastery is None:
+        weights = (1, 1, 1)
+    elif mastery < 0.5:
+        weights = (3, 2, 1)
+    elif mastery < 0.8:
+        weights = (1, 1, 1)
+    else:
+        weights = (1, 2, 3)
+    shares = [count * weight / sum(weights) for weight in weights]
+    counts = [int(share) for share in shares]
+    # Largest remainder, so the counts add up to ``count``; ties are broken at random
+    by_remainder = sorted(range(len(shares)), key=lambda i: (shares[i] - counts[i], rng.random()), reverse=True)
+    for i in by_remainder[:count - sum(counts)]:
+        counts[i] += 1
+    return dict(zip(AO_LEVELS, counts))
+
+
+def format_quiz(questions):
+    """The quiz as a chat reply, without the answers"""
+    lines = ["Here are your questions. Try them first, then send me your answers and I'll mark them.", ""]
+    for number, question in enumerate(questions, 1):
+        marks = question['marks']
+        lines.append(f"{number}. **({question['ao']}, {marks} mark{'s' if marks != 1 else ''})** {question['question']}")
+        for letter, option in zip("ABCDEFGH", question['options']):
+            lines.append(f"   {letter}) {option}")
+    return "\n".join(lines)
+
+
+def answer_key(questions):
+    """Model answers for marking a quiz served from the bank"""
+    lines = ["Model answers for the questions the student was set (use these when marking):"]
+    for number, question in enumerate(questions, 1):
+        lines.append(f"{number}. ({question['ao']}, {question['marks']} marks) {question['question']}\n"
+                     f"   Model answer: {question['answer']}")
+    return "\n".join(lines)
+
+
+def write_bank(path, questions, model=""):
+    """Index and write ``questions`` (dicts with unit, ao, marks, question, options, answer) atomically"""
+    questions = sorted(
+        (q for q in questions if q['unit'] in UNITS and q['ao'] in AO_LEVELS),
+        key=lambda q: (list(UNITS).index(q['unit']), q['ao'])
+    )
+    meta = {'built_at': datetime.now().isoformat(timespec="seconds"), 'model': model, 'units': UNITS}
+    cells = {}
+    rows = []
+    data = []
+    data_bytes = 0
+    for qid, question in enumerate(questions):
+        first, count = cells.get((question['unit'], question['ao']), (qid, 0))
+        cells[(question['unit'], question['ao'])] = (first, count + 1)
+        payload = zlib.compress(json.dumps({
+            'question': question['question'],
+            'options': list(question.get('options') or []),
+            'answer': question['answer'],
+        }, separators=(",", ":")).encode('utf-8'), 9)
+        flags = FLAG_MCQ if question.get('options') else 0
+        rows.append(ROW.pack(data_bytes, len(payload), question['unit'].encode('ascii'),
+                             AO_LEVELS.index(question['ao']), question['marks'], flags))
+        data.append(payload)
+        data_bytes += len(payload)
+
+    sections = [
+        json.dumps(meta).encode('utf-8'),
+        b"".join(CELL.pack(unit.encode('ascii'), AO_LEVELS.index(ao), first, count)
+                 for (unit, ao), (first, count) in cells.items()),
+        b"".join(rows),
+        b"".join(data),
+    ]
+    offsets = []
+    position = HEADER.size
+    for section in sections:
+        offsets.append(position)
+        position += len(section)
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, len(rows), len(cells), *offsets)
+
+    # Write then rename, so a running app keeps its mapping of the old file
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "wb") as handle:
+        handle.write(header)
+        for section in sections:
+            handle.write(section)
+    os.replace(tmp_path, path)
+    return {'questions': len(rows), 'units': len({unit for unit, _ in cells}), 'bytes': position}
+
+
+class QuestionBank:
+    """Read-only question bank served from a memory-mapped file"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as handle:
+            self._mmap = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        (magic, version, self._count, cell_count,
+         meta_off, cells_off, self._rows_off, self._data_off) = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a question bank (format {FORMAT_VERSION})")
+        self.meta = json.loads(bytes(self._view[meta_off:cells_off]).decode('utf-8'))
+        self._cells = {}
+        for unit, level, first, count in CELL.iter_unpack(self._view[cells_off:self._rows_off]):
+            self._cells[(unit.rstrip(b"\0").decode('ascii'), AO_LEVELS[level])] = range(first, first + count)
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def units(self):
+        return sorted({unit for unit, _ in self._cells}, key=list(UNITS).index)
+
+    def count(self, unit, ao=None):
+        return sum(len(ids) for (u, level), ids in self._cells.items() if u == unit and ao in (None, level))
+
+    def _row(self, qid):
+        return ROW.unpack_from(self._mmap, self._rows_off + qid * ROW.size)
+
+    def get(self, qid):
+        offset, length, unit, level, marks, _ = self._row(qid)
+        start = self._data_off + offset
+        question = json.loads(zlib.decompress(self._view[start:start + length]).decode('utf-8'))
+        question.update(id=qid, unit=unit.rstrip(b"\0").decode('ascii'), ao=AO_LEVELS[level], marks=marks)
+        return question
+
+    def matching_units(self, unit):
+        """``unit`` itself, or every unit in a component, e.g. 2.1-2.4 for "2" """
+        if not unit:
+            return []
+        return [u for u in self.units if u == unit or u.startswith(unit + ".")]
+
+    def select(self, unit, count, seen=(), mcq=False, mastery=None, rng=random):
+        """``count`` unseen questions on ``unit``, or ``[]`` if the bank has run out for it"""
+        pools = {}
+        for level in AO_LEVELS:
+            pools[level] = [
+                qid for u in self.matching_units(unit) for qid in self._cells.get((u, level), ())
+                if qid not in seen and (not mcq or self._row(qid)[5] & FLAG_MCQ)
+            ]
+        if sum(len(pool) for pool in pools.values()) < count:
+            return []
+        chosen = []
+        if mcq:
+            chosen = rng.sample([qid for pool in pools.values() for qid in pool], count)
+        else:
+            for level, wanted in ao_mix(count, mastery, rng).items():
+                chosen += rng.sample(pools[level], min(wanted, len(pools[level])))
+            # A level with too few questions left is made up from the others
+            leftovers = [qid for pool in pools.values() for qid in pool if qid not in chosen]
+            chosen += rng.sample(leftovers, count - len(chosen))
+        questions = [self.get(qid) for qid in chosen]
+        return sorted(questions, key=lambda q: (q['ao'], q['id']))
+
+
+GENERATOR_PROMPT = """You write exam questions for OCR GCSE Business (J204).
+
+Reply with only a JSON array. Each item has:
+- "question": the question, in British English, using OCR command words
+- "marks": whole number of marks
+- "options": a list of four answer options for a multiple-choice question, otherwise []
+- "answer": a model answer that would earn full marks, with the correct letter first for multiple choice
+
+Use realistic small-business contexts (cafés, gyms, shops, services). Do not repeat questions."""
+
+
+def generation_request(unit, ao, count, mcq=False):
+    low, high = AO_MARKS[ao]
+    kind = "multiple-choice questions with four options each" if mcq else "written questions"
+    return (f"Write {count} {kind} on Unit {unit} ({UNITS[unit]}) testing {ao}: {AO_DESCRIPTIONS[ao]}. "
+            f"Each is worth {low}-{high} marks.")
+
+
+def parse_questions(text, unit, ao):
+    """Questions from a model reply, with marks kept within the level's range; bad items are dropped"""
+    start, end = text.find("["), text.rfind("]")
+    if start < 0 or end < start:
+        return []
+    try:
+        items = json.loads(text[start:end + 1])
+    except ValueError:
+        return []
+    low, high = AO_MARKS[ao]
+    questions = []
+    for item in items:
+        if not isinstance(item, dict) or not str(item.get('question', '')).strip() or not item.get('answer'):
+            continue
+        try:
+            marks = int(item.get('marks', low))
+        except (TypeError, ValueError):
+            marks = low
+        options = [str(option).strip() for option in item.get('options') or []]
+        questions.append({
+            'unit': unit,
+            'ao': ao,
+            'marks': max(low, min(marks, high)),
+            'question': str(item['question']).strip(),
+            'options': options if len(options) >= 2 else [],
+            'answer': str(item['answer']).strip(),
+        })
+    return questions
+
+
+def generate(pool, route, units, per_level, mcq_per_unit=0, existing=(), log=print):
+    """Ask the providers in ``pool`` for questions on ``units``; skips questions already in ``existing``"""
+    questions = list(existing)
+    known = {normalise_prompt(q['question']) for q in questions}
+    for unit in units:
+        batches = [(ao, per_level, False) for ao in AO_LEVELS]
+        if mcq_per_unit:
+            batches.append(("AO1", mcq_per_unit, True))
+        for ao, count, mcq in batches:
+            messages = [{"role": "user", "content": generation_request(unit, ao, count, mcq)}]
+            try:
+                reply = "".join(pool.stream(route, GENERATOR_PROMPT, "", "", messages))
+            except Exception as e:
+                log(f"❌ Unit {unit} {ao}: {e}")
+                continue
+            added = 0
+            for question in parse_questions(reply, unit, ao):
+                key = normalise_prompt(question['question'])
+                if key not in known:
+                    known.add(key)
+                    questions.append(question)
+                    added += 1
+            log(f"✅ Unit {unit} {ao}{' MCQ' if mcq else ''}: {added} questions")
+    return questions
+
+
+def read_secrets(path=".streamlit/secrets.toml"):
+    """The app's secrets file, if there is one"""
+    import tomllib
+
+    try:
+        with open(path, "rb") as handle:
+            return tomllib.load(handle)
+    except FileNotFoundError:
+        return {}
+
+
+def main(argv=None):
+    from llm import ClientRegistry
+    from providers import AnthropicProvider, OpenAIProvider, ProviderPool
+    from routing import DEFAULT_ROUTES, QUIZ
+
+    parser = argparse.ArgumentParser(description="Generate the question bank used by app.py for quiz requests")
+    parser.add_argument("--units", help="comma-separated units, e.g. 1.5,2.2 (default: every J204 unit)")
+    parser.add_argument("--per-level", type=int, default=8, help="written questions per unit and AO level")
+    parser.add_argument("--mcq", type=int, default=6, help="AO1 multiple-choice questions per unit")
+    parser.add_argument("--append", action="store_true", help="keep the questions already in the output file")
+    parser.add_argument("--secrets", default=".streamlit/secrets.toml")
+    parser.add_argument("-o", "--output", default=DEFAULT_BANK_PATH)
+    args = parser.parse_args(argv)
+
+    units = args.units.split(",") if args.units else list(UNITS)
+    unknown = [unit for unit in units if unit not in UNITS]
+    if unknown:
+        parser.error(f"unknown units: {', '.join(unknown)}")
+
+    secrets = read_secrets(args.secrets)
+    registry = ClientRegistry()
+    providers = []
+    for name, provider_class in (("openai", OpenAIProvider), ("anthropic", AnthropicProvider)):
+        key = os.environ.get(f"{name.upper()}_API_KEY") or secrets.get(f"{name.upper()}_API_KEY", "")
+        if key:
+            providers.append(provider_class(registry.get(name, key)))
+    if not providers:
+        parser.error("no provider: set OPENAI_API_KEY or ANTHROPIC_API_KEY")
+    route = DEFAULT_ROUTES[QUIZ].replace(max_tokens=4000, temperature=0.8)
+
+    existing = []
+    if args.append and os.path.exists(args.output):
+        bank = QuestionBank(args.output)
+        existing = [bank.get(qid) for qid in range(len(bank))]
+    questions = generate(ProviderPool(providers), route, units, args.per_level, args.mcq, existing)
+    stats = write_bank(args.output, questions, model=route.model(providers[0].name))
+    print(f"📦 Wrote {args.output}: {stats['questions']} questions across {stats['units']} units, "
+          f"{stats['bytes'] / 1024:.0f} KB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+"""Process-wide store of quiz records for the teacher dashboard.
+
+Quiz records used to live only in each student's browser session, so the
+dashboard could show the teacher's own session and nothing else. Every
+session now adds its records to one SQLite database, and the dashboard reads
+from it.
+
+Reads return one page at a time and are served from indexes:
+
+* ``(timestamp, id)`` for the newest records first;
+* ``(student_class, timestamp)`` for one class's records;
+* ``(student_class, student_name, topic, timestamp)`` to group records by
+  student without reading the table itself;
+* ``(topic)`` to count attempts per topic.
+
+A dashboard rerun therefore stays fast with a year group's worth (50,000+) of
+records. The database runs in WAL mode, so the dashboard's reads never wait
+for a student's write. Records are keyed by their ``record_id``, so adding
+one twice keeps a single copy.
+"""
+import json
+import os
+import sqlite3
+import threading
+
+DEFAULT_STORE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "ocr-revision-buddy", "quiz-history.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS quiz_records (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    record_id TEXT NOT NULL UNIQUE,
+    timestamp TEXT NOT NULL,
+    student_name TEXT NOT NULL,
+    student_class TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    raw_marking_text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS quiz_records_time ON quiz_records (timestamp, id);
+CREATE INDEX IF NOT EXISTS quiz_records_class_time ON quiz_records (student_class, timestamp);
+CREATE INDEX IF NOT EXISTS quiz_records_student ON quiz_records (student_class, student_name, topic, timestamp);
+CREATE INDEX IF NOT EXISTS quiz_records_topic ON quiz_records (topic);
+"""
+
+COLUMNS = ("record_id", "timestamp", "student_name", "student_class", "topic", "raw_marking_text")
+
+# Rows fetched at a time when exporting every record
+EXPORT_CHUNK = 1000
+
+
+def _where(student_class):
+    return ("WHERE student_class = ?", (student_class,)) if student_class is not None else ("", ())
+
+
+class QuizStore:
+    """Thread-safe quiz records in an SQLite database, read a page at a time"""
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        # Autocommit: every statement is its own transaction
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def add(self, quiz_record):
+        values = tuple(quiz_record.get(column, "") for column in COLUMNS)
+        with self._lock:
+            self._db.execute(
+                f"INSERT OR IGNORE INTO quiz_records ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                values)
+
+    def add_many(self, quiz_records):
+        """Add records in one transaction"""
+        rows = [tuple(record.get(column, "") for column in COLUMNS) for record in quiz_records]
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.executemany(
+                f"INSERT OR IGNORE INTO quiz_records ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                rows)
+            self._db.execute("COMMIT")
+
+    def count(self, student_class=None):
+        where, params = _where(student_class)
+        return self._query(f"SELECT COUNT(*) FROM quiz_records {where}", params)[0][0]
+
+    def records(self, limit, offset=0, student_class=None):
+        """One page of records, newest first"""
+        where, params = _where(student_class)
+        rows = self._query(
+            f"SELECT {', '.join(COLUMNS)} FROM quiz_records {where} ORDER BY timestamp DESC, id DESC LIMIT ? OFFSET ?",
+            params + (limit, offset))
+        return [dict(row) for row in rows]
+
+    def iter_records(self, student_class=None):
+        """Every record, oldest first, fetched ``EXPORT_CHUNK`` at a time"""
+        where, params = _where(student_class)
+        last = ("", 0)
+        while True:
+            # Keyset pagination: each chunk starts after the last row of the one before
+            condition = "(timestamp, id) > (?, ?)"
+            where_chunk = f"{where} AND {condition}" if where else f"WHERE {condition}"
+            rows = self._query(
+                f"SELECT id, {', '.join(COLUMNS)} FROM quiz_records {where_chunk} "
+                f"ORDER BY timestamp, id LIMIT {EXPORT_CHUNK}",
+                params + last)
+            if not rows:
+                return
+            for row in rows:
+                yield {column: row[column] for column in COLUMNS}
+            last = (rows[-1]['timestamp'], rows[-1]['id'])
+
+    def classes(self):
+        return [row[0] for row in self._query("SELECT DISTINCT student_class FROM quiz_records ORDER BY student_class")]
+
+    def student_count(self, student_class=None):
+        where, params = _where(student_class)
+        return self._query(
+            f"SELECT COUNT(*) FROM (SELECT 1 FROM quiz_records {where} GROUP BY student_class, student_name)",
+            params)[0][0]
+
+    def students(self, limit, offset=0, student_class=None):
+        """One page of students, by class then name, with their attempts, topics and last attempt"""
+        where, params = _where(student_class)
+        rows = self._query(
+            f"SELECT student_name, student_class, COUNT(*) AS attempts, json_group_array(DISTINCT topic) AS topics, "
+            f"MAX(timestamp) AS last_attempt FROM quiz_records {where} "
+            f"GROUP BY student_class, student_name ORDER BY student_class, student_name LIMIT ? OFFSET ?",
+            params + (limit, offset))
+        return [{'name': row['student_name'], 'class': row['student_class'], 'attempts': row['attempts'],
+                 'topics': json.loads(row['topics']), 'last_attempt': row['last_attempt']} for row in rows]
+
+    def topic_counts(self, limit=None):
+        """(topic, attempts), most attempted first"""
+        sql = "SELECT topic, COUNT(*) AS attempts FROM quiz_records GROUP BY topic ORDER BY attempts DESC, topic"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return [(row[0], row[1]) for row in self._query(sql)]
+
+    def class_counts(self):
+        """(class, attempts), most attempts first"""
+        rows = self._query(
+            "SELECT student_class, COUNT(*) AS attempts FROM quiz_records GROUP BY student_class "
+            "ORDER BY attempts DESC, student_class")
+        return [(row[0], row[1]) for row in rows]
+
+    def summary(self):
+        """Total attempts, distinct students (by name and class) and distinct topics"""
+        return {
+            'records': self.count(),
+            'students': self.student_count(),
+            'topics': self._query("SELECT COUNT(DISTINCT topic) FROM quiz_records")[0][0],
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
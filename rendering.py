@@ -0,0 +1,105 @@
+"""Markdown-to-HTML for chat bubbles, and the typing-effect reveal of a reply.
+
+The chat only uses a little markdown: bold, italics, and numbered or bulleted
+lines. Bold and italics never span a line break, so each finished line can be
+converted once and its HTML kept. ``IncrementalHtml`` does this as text
+arrives, so a growing reply is never re-parsed from the start.
+
+Every rerun redraws the whole chat history, so ``message_html`` keeps each
+message's HTML on the message itself, keyed by a hash of its content, and
+converts it again only if the content changes.
+
+``reveal_frames`` splits a reply into whole-word chunks, at most
+``REVEAL_FPS`` frames a second, for the typing effect. The reveal also takes
+at most ``MAX_REVEAL_SECONDS``, however long the message is.
+"""
+import re
+
+REVEAL_FPS = 20
+MAX_REVEAL_SECONDS = 2.0
+
+BOLD = re.compile(r'\*\*(.+?)\*\*')
+ITALIC = re.compile(r'\*(.+?)\*')
+# Matched against the whole converted message, where line breaks are already <br>
+NUMBERED = re.compile(r'^(\d+)\.\s+(.+)$', re.MULTILINE)
+BULLET = re.compile(r'^[-*]\s+(.+)$', re.MULTILINE)
+WORD = re.compile(r"\S+\s*|\s+")
+
+LINE_BREAK = "<br>"
+
+
+def inline_html(line):
+    """Bold and italics within one line"""
+    line = BOLD.sub(r'<strong>\1</strong>', line)
+    return ITALIC.sub(r'<em>\1</em>', line)
+
+
+def list_html(html):
+    html = NUMBERED.sub(r'<div style="margin-left: 20px;">\1. \2</div>', html)
+    return BULLET.sub(r'<div style="margin-left: 20px;">• \1</div>', html)
+
+
+def markdown_to_html(text):
+    """Convert basic markdown to HTML without external libraries"""
+    # Bold and italics cannot cross a line break, so one pass over the whole text equals one per line
+    return list_html(inline_html(text).replace("\n", LINE_BREAK))
+
+
+def message_html(message):
+    """``markdown_to_html`` of a chat message's content, cached on the message dict"""
+    content = message["content"]
+    # A str caches its own hash, so checking an unchanged message costs nothing
+    key = (hash(content), len(content))
+    cached = message.get("html")
+    if cached is None or cached[0] != key:
+        cached = message["html"] = (key, markdown_to_html(content))
+    return cached[1]
+
+
+class IncrementalHtml:
+    """HTML for text that arrives in pieces; finished lines are converted only once"""
+
+    def __init__(self):
+        self._done = ""
+        self._has_done = False
+        self._tail = ""
+
+    def feed(self, text):
+        lines = (self._tail + text).split("\n")
+        self._tail = lines.pop()
+        if lines:
+            converted = LINE_BREAK.join(inline_html(line) for line in lines)
+            self._done = self._done + LINE_BREAK + converted if self._has_done else converted
+            self._has_done = True
+
+    def html(self):
+        """The same HTML as ``markdown_to_html`` of everything fed so far"""
+        tail = inline_html(self._tail)
+        return list_html(self._done + LINE_BREAK + tail if self._has_done else tail)
+
+
+def reveal_chunks(text, frames):
+    """Split ``text`` into at most ``frames`` pieces of similar length, breaking only after whole words"""
+    frames = max(1, frames)
+    target = len(text) / frames
+    chunks = []
+    current = []
+    size = 0
+    for match in WORD.finditer(text):
+        current.append(match.group())
+        size += len(match.group())
+        if size >= target * (len(chunks) + 1):
+            chunks.append("".join(current))
+            current = []
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+
+def reveal_frames(text, seconds, fps=REVEAL_FPS):
+    """HTML of each frame of a typing effect lasting about ``seconds`` (capped at ``MAX_REVEAL_SECONDS``)"""
+    seconds = min(seconds, MAX_REVEAL_SECONDS)
+    renderer = IncrementalHtml()
+    for chunk in reveal_chunks(text, int(seconds * fps)):
+        renderer.feed(chunk)
+        yield renderer.html()
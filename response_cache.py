@@ -0,0 +1,188 @@
+"""Shared cache of model replies for repeated student questions.
+
+A class revising the same unit asks near-identical questions. Replies are
+cached under the normalised prompt and the corpus version. Lookups first try
+an exact match, then near-duplicates found with MinHash signatures over
+character shingles and locality-sensitive hashing (LSH) buckets. Entries
+expire after a TTL and the least recently used entries are evicted first.
+Only self-contained questions are cached. Answer submissions for marking and
+statements that are not questions are never cached or served from the cache,
+and the app only consults the cache on the first turn of a conversation, with
+the student's details left out of the request.
+"""
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+
+SIMILARITY_THRESHOLD = 0.8
+TTL_SECONDS = 24 * 60 * 60
+MAX_ENTRIES = 1000
+
+SHINGLE_CHARS = 4
+BANDS = 16
+ROWS = 4
+NUM_PERM = BANDS * ROWS
+_PRIME = (1 << 61) - 1
+_PERMUTATIONS = [
+    (int.from_bytes(hashlib.blake2b(f"a{i}".encode(), digest_size=8).digest(), "little") % _PRIME | 1,
+     int.from_bytes(hashlib.blake2b(f"b{i}".encode(), digest_size=8).digest(), "little") % _PRIME)
+    for i in range(NUM_PERM)
+]
+
+PUNCTUATION = re.compile(r"[^\w\s.]|(?<!\d)\.|\.(?!\d)")
+WHITESPACE = re.compile(r"\s+")
+NUMBER = re.compile(r"\d+(?:\.\d+)?")
+FILLER = re.compile(r"\b(please|pls|can you|could you|i want you to|thanks|thank you)\b")
+
+# Follow-ups that only make sense in the context of one conversation
+FOLLOW_UP = re.compile(r"\b(this|that|it|these|those|above|again|more|another|previous|last one|same)\b")
+# Openings that continue the previous turn ("what about a charity?")
+CONTINUATION = re.compile(r"^(?:(?:what|how) about|and|but|so|what if)\b")
+ANSWER_PHRASES = re.compile(r"\b(my answers?|here (?:are|is) my|answers?\s*:|mark (?:this|my)|my response)\b")
+NUMBERED_ANSWER = re.compile(r"(?:^|\s)(?:q?\d{1,2}|[a-e])\)\s*\S|(?:^|\n)\s*(?:q?\d{1,2}|[a-e])[.:]\s+\S", re.IGNORECASE)
+# Answers given inline: "1. B 2. C", "Q1 A, Q2 C"
+INLINE_ANSWERS = re.compile(r"\b(?:q\d{1,2}|\d{1,2}[.)])\s*[a-e]\b", re.IGNORECASE)
+# A question or an instruction, as opposed to a statement the student wants checked
+QUESTION = re.compile(r"^(?:what|whats|why|how|when|where|which|who|whose|explain|define|describe|give|list|"
+                      r"compare|outline|state|tell|identify|analyse|evaluate|is|are|can|does|do|should|would)\b")
+MIN_CONTENT_WORDS = 3
+MAX_CACHEABLE_CHARS = 300
+
+
+def normalise_prompt(prompt):
+    """Lower-case, drop punctuation and filler words, collapse whitespace"""
+    text = FILLER.sub(" ", prompt.lower())
+    text = PUNCTUATION.sub(" ", text)
+    return WHITESPACE.sub(" ", text).strip()
+
+
+def looks_like_answer_submission(prompt):
+    """True if the message carries a student's own answers to be marked"""
+    if len(prompt) > MAX_CACHEABLE_CHARS:
+        return True
+    if ANSWER_PHRASES.search(prompt.lower()):
+        return True
+    return len(NUMBERED_ANSWER.findall(prompt)) >= 2 or len(INLINE_ANSWERS.findall(prompt)) >= 2
+
+
+def is_cacheable(prompt):
+    """Only self-contained questions can be shared between students"""
+    if looks_like_answer_submission(prompt):
+        return False
+    normalised = normalise_prompt(prompt)
+    if FOLLOW_UP.search(normalised) or CONTINUATION.search(normalised):
+        return False
+    if "?" not in prompt and not QUESTION.search(normalised):
+        return False
+    return len(normalised.split()) >= MIN_CONTENT_WORDS
+
+
+def key_numbers(normalised):
+    """Unit, mark and question numbers, which near-duplicates must share exactly"""
+    return frozenset(NUMBER.findall(normalised))
+
+
+def minhash(text):
+    """MinHash signature of ``text``'s character shingles"""
+    padded = f" {text} "
+    shingles = {padded[i:i + SHINGLE_CHARS] for i in range(max(1, len(padded) - SHINGLE_CHARS + 1))}
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "little") for s in shingles]
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of two signatures"""
+    return sum(x == y for x, y in zip(sig_a, sig_b)) / NUM_PERM
+
+
+class ResponseCache:
+    """Thread-safe near-duplicate reply cache shared by every session"""
+
+    def __init__(self, threshold=SIMILARITY_THRESHOLD, ttl=TTL_SECONDS, max_entries=MAX_ENTRIES):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (corpus_version, normalised) -> entry
+        self._buckets = {}  # (corpus_version, band, rows) -> set of entry keys
+        self.stats = {'exact_hits': 0, 'near_hits': 0, 'misses': 0, 'stores': 0, 'skipped': 0, 'evictions': 0}
+
+    def _bands(self, corpus_version, signature):
+        return [(corpus_version, band, signature[band * ROWS:(band + 1) * ROWS]) for band in range(BANDS)]
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        for bucket in self._bands(key[0], entry['signature']):
+            members = self._buckets.get(bucket)
+            if members is not None:
+                members.discard(key)
+                if not members:
+                    del self._buckets[bucket]
+
+    def get(self, prompt, corpus_version):
+        """Cached reply for ``prompt`` (or a near-duplicate of it), else ``None``"""
+        if not is_cacheable(prompt):
+            with self._lock:
+                self.stats['skipped'] += 1
+            return None
+        normalised = normalise_prompt(prompt)
+        key = (corpus_version, normalised)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry['created'] <= self.ttl:
+                self._entries.move_to_end(key)
+                self.stats['exact_hits'] += 1
+                return entry['response']
+
+            signature = minhash(normalised)
+            numbers = key_numbers(normalised)
+            best_key, best_score = None, self.threshold
+            candidates = set()
+            for bucket in self._bands(corpus_version, signature):
+                candidates.update(self._buckets.get(bucket, ()))
+            for candidate in candidates:
+                candidate_entry = self._entries[candidate]
+                if now - candidate_entry['created'] > self.ttl or candidate_entry['numbers'] != numbers:
+                    continue
+                score = similarity(signature, candidate_entry['signature'])
+                if score >= best_score:
+                    best_key, best_score = candidate, score
+            if best_key is None:
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(best_key)
+            self.stats['near_hits'] += 1
+            return self._entries[best_key]['response']
+
+    def put(self, prompt, corpus_version, response):
+        """Store a reply, unless the prompt must never be shared"""
+        if not is_cacheable(prompt):
+            return
+        normalised = normalise_prompt(prompt)
+        key = (corpus_version, normalised)
+        signature = minhash(normalised)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = {
+                'signature': signature, 'numbers': key_numbers(normalised),
+                'response': response, 'created': time.time(),
+            }
+            for bucket in self._bands(corpus_version, signature):
+                self._buckets.setdefault(bucket, set()).add(key)
+            self.stats['stores'] += 1
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.stats['evictions'] += 1
+
+    def clear(self):
+        """Drop every entry, e.g. after the system prompt changes"""
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    def __len__(self):
+        return len(self._entries)
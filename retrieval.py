@@ -0,0 +1,231 @@
+"""Chunking and BM25 retrieval over the document corpus.
+
+Instead of pasting every document into the prompt, the corpus is split into
+chunks and indexed with an inverted index. Each turn only the best-scoring
+chunks for the student's message and topic are packed into a size budget.
+"""
+import math
+import re
+from collections import Counter
+
+CHUNK_CHARS = 1200
+TOP_K = 6
+CONTEXT_BUDGET_CHARS = 8000
+
+# Roughly four characters per token for English text
+CHARS_PER_TOKEN = 4
+
+# Keeps unit numbers such as "1.4" together as one term
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)*")
+PARAGRAPH_PATTERN = re.compile(r"\n\s*\n")
+UNIT_PATTERN = re.compile(r"\bunit\s+([1-7](?:\.[1-7])?)\b", re.IGNORECASE)
+
+# Score multiplier for chunks tagged with the unit a query names
+UNIT_BOOST = 1.5
+
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from give has have how i if in into is it its me
+my of on or so than that the their them then there these they this to was we were what when
+where which who why will with you your
+""".split())
+
+
+def tokenize(text):
+    """Lower-case terms of ``text`` with stopwords removed"""
+    return [term for term in TOKEN_PATTERN.findall(text.lower()) if term not in STOPWORDS]
+
+
+def chunk_spans(text, size=CHUNK_CHARS):
+    """``(start, end)`` spans of ``text`` of at most ``size`` characters, cut on paragraph boundaries"""
+    pieces = []
+    position = 0
+    for separator in [*PARAGRAPH_PATTERN.finditer(text), None]:
+        stop = separator.start() if separator else len(text)
+        start = position
+        while start < stop and text[start].isspace():
+            start += 1
+        end = stop
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        while end - start > size:
+            cut = text.rfind(" ", start, start + size)
+            cut = cut if cut > start + size // 2 else start + size
+            pieces.append((start, cut))
+            start = cut
+            while start < end and text[start].isspace():
+                start += 1
+        if end > start:
+            pieces.append((start, end))
+        if separator:
+            position = separator.end()
+
+    spans = []
+    for start, end in pieces:
+        if spans and end - spans[-1][0] <= size:
+            spans[-1] = (spans[-1][0], end)
+        else:
+            spans.append((start, end))
+    return spans
+
+
+def chunk_text(text, size=CHUNK_CHARS):
+    """Split ``text`` into chunks of at most ``size`` characters on paragraph boundaries"""
+    return [text[start:end] for start, end in chunk_spans(text, size)]
+
+
+def unit_tags(chunks):
+    """Tag each chunk of one document with the J204 unit it belongs to.
+
+    A chunk takes the first unit it mentions, or carries over the last unit seen
+    earlier in the same document, so text under a "Unit 2.2" heading stays tagged.
+    """
+    tags = []
+    current = ""
+    for text in chunks:
+        mentions = UNIT_PATTERN.findall(text)
+        tags.append(mentions[0] if mentions else current)
+        if mentions:
+            current = mentions[-1]
+    return tags
+
+
+def query_unit(query):
+    """The unit a query asks about, e.g. "2.2" for "5 MCQs on Unit 2.2", or ``""``"""
+    mentions = UNIT_PATTERN.findall(query)
+    return mentions[0] if mentions else ""
+
+
+class Chunk:
+    """A piece of one document"""
+
+    __slots__ = ("chunk_id", "doc_name", "text", "unit")
+
+    def __init__(self, chunk_id, doc_name, text, unit=""):
+        self.chunk_id = chunk_id
+        self.doc_name = doc_name
+        self.text = text
+        self.unit = unit
+
+
+class BM25Scorer:
+    """Okapi BM25 ranking over an inverted index.
+
+    Subclasses provide the storage: ``term_postings()``, ``chunk_length()``,
+    ``chunk_unit()`` and ``get_chunk()``.
+    """
+
+    k1 = 1.5
+    b = 0.75
+    avg_length = 0.0
+
+    def search(self, query, k=TOP_K):
+        """Return up to ``k`` ``(score, chunk)`` pairs, best first"""
+        scores = {}
+        for term in set(tokenize(query)):
+            found = self.term_postings(term)
+            if found is None:
+                continue
+            idf, posting = found
+            for chunk_id, freq in posting:
+                norm = self.k1 * (1 - self.b + self.b * self.chunk_length(chunk_id) / self.avg_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * freq * (self.k1 + 1) / (freq + norm)
+        unit = query_unit(query)
+        if unit:
+            for chunk_id in scores:
+                if self.chunk_unit(chunk_id) == unit:
+                    scores[chunk_id] *= UNIT_BOOST
+        best = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+        return [(score, self.get_chunk(chunk_id)) for chunk_id, score in best]
+
+
+class BM25Index(BM25Scorer):
+    """In-memory BM25 index built from the live corpus"""
+
+    def __init__(self, chunks, k1=1.5, b=0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        self.postings = {}
+        self.lengths = []
+        for chunk in chunks:
+            terms = Counter(tokenize(chunk.text))
+            self.lengths.append(sum(terms.values()))
+            for term, freq in terms.items():
+                self.postings.setdefault(term, []).append((chunk.chunk_id, freq))
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        self.idf = {term: bm25_idf(len(chunks), len(posting)) for term, posting in self.postings.items()}
+
+    @classmethod
+    def from_documents(cls, documents, chunk_chars=CHUNK_CHARS):
+        """Chunk and index a corpus ``{doc_id: {'name', 'content', ...}}``"""
+        chunks = []
+        # Sorted so chunk ids do not depend on load order
+        for doc_id in sorted(documents):
+            doc = documents[doc_id]
+            texts = chunk_text(doc.get('content', ''), chunk_chars)
+            for text, unit in zip(texts, unit_tags(texts)):
+                chunks.append(Chunk(len(chunks), doc['name'], text, unit))
+        return cls(chunks)
+
+    @property
+    def chunk_count(self):
+        return len(self.chunks)
+
+    @property
+    def term_count(self):
+        return len(self.postings)
+
+    def term_postings(self, term):
+        posting = self.postings.get(term)
+        return (self.idf[term], posting) if posting else None
+
+    def chunk_length(self, chunk_id):
+        return self.lengths[chunk_id]
+
+    def chunk_unit(self, chunk_id):
+        return self.chunks[chunk_id].unit
+
+    def get_chunk(self, chunk_id):
+        return self.chunks[chunk_id]
+
+
+def bm25_idf(chunk_count, document_frequency):
+    return math.log(1 + (chunk_count - document_frequency + 0.5) / (document_frequency + 0.5))
+
+
+def pack_context(results, budget_chars=CONTEXT_BUDGET_CHARS):
+    """Format retrieved chunks as a reference block no longer than ``budget_chars``.
+
+    Chunks are chosen best-first but written in chunk id order, so the same
+    selection always produces byte-identical text for provider prompt caching.
+    """
+    selected = []
+    used = 0
+    for _, chunk in results:
+        block = f"\n[OCR Document: {chunk.doc_name}]\n{chunk.text}\n"
+        if used + len(block) > budget_chars:
+            remaining = budget_chars - used
+            if remaining < 200:
+                break
+            block = block[:remaining]
+        selected.append((chunk.chunk_id, block))
+        used += len(block)
+    return "".join(block for _, block in sorted(selected))
+
+
+def full_context(documents, per_doc_chars=15000):
+    """The original behaviour: the start of every document, concatenated"""
+    return "".join(
+        f"\n[OCR Document: {doc['name']}]\n{doc.get('content', '')[:per_doc_chars]}\n"
+        for doc in documents.values()
+    )
+
+
+def full_context_chars(documents, per_doc_chars=15000):
+    """Size of ``full_context(documents)``, from stored sizes where a document has them"""
+    total = 0
+    for doc in documents.values():
+        # A mapped document reports its size without decoding its text
+        size = doc.content_size() if hasattr(doc, "content_size") else len(doc.get('content', ''))
+        total += len(f"\n[OCR Document: {doc['name']}]\n\n") + min(size, per_doc_chars)
+    return total
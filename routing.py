@@ -0,0 +1,118 @@
+"""Model, output length and context size chosen per class of request.
+
+A one-line definition does not need the model, output budget or document
+context that marking a 9-mark answer does. Each request class has a route.
+The message's intent (see ``intents.py``) picks the route. Only an ``explain``
+message asking what a term means ("define X", "what is X?") takes the short
+definition route; fuller explanations, and messages the router was unsure
+of, take the general route. The defaults below can be overridden per route
+from the ``MODEL_ROUTES`` secrets table:
+
+    [MODEL_ROUTES.extended_marking]
+    openai_model = "gpt-4o"
+    max_tokens = 2500
+
+Latency and token counts are recorded per route so the routes can be tuned.
+"""
+import re
+import time
+
+from prompting import usage_tokens
+
+
+class Route:
+    """Request settings for one class of request"""
+
+    FIELDS = ("openai_model", "anthropic_model", "max_tokens", "temperature", "top_k", "context_chars")
+
+    def __init__(self, name, openai_model, anthropic_model, max_tokens, temperature, top_k=None, context_chars=None):
+        self.name = name
+        self.openai_model = openai_model
+        self.anthropic_model = anthropic_model
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        # Caps on retrieval; ``None`` leaves the teacher's retrieval settings as they are
+        self.top_k = top_k
+        self.context_chars = context_chars
+
+    def model(self, provider):
+        return self.openai_model if provider == "openai" else self.anthropic_model
+
+    def replace(self, name=None, **overrides):
+        """Copy of this route with some fields changed"""
+        values = {field: getattr(self, field) for field in self.FIELDS}
+        values.update(overrides)
+        return Route(name or self.name, **values)
+
+
+GENERAL = "general"
+DEFINITION = "definition"
+QUIZ = "quiz"
+SHORT_MARKING = "short_marking"
+EXTENDED_MARKING = "extended_marking"
+
+DEFAULT_ROUTES = {
+    # Used when a message has no intent; the settings every request used before routing
+    GENERAL: Route(GENERAL, "gpt-4o-mini", "claude-sonnet-4-20250514", 1500, 0.7),
+    DEFINITION: Route(DEFINITION, "gpt-4o-mini", "claude-3-5-haiku-latest", 600, 0.5, top_k=3, context_chars=4000),
+    QUIZ: Route(QUIZ, "gpt-4o-mini", "claude-sonnet-4-20250514", 1200, 0.7, top_k=6, context_chars=8000),
+    SHORT_MARKING: Route(SHORT_MARKING, "gpt-4o-mini", "claude-sonnet-4-20250514", 1000, 0.3, top_k=4, context_chars=6000),
+    EXTENDED_MARKING: Route(EXTENDED_MARKING, "gpt-4o", "claude-sonnet-4-20250514", 2000, 0.3),
+}
+
+ROUTE_FOR_INTENT = {
+    "explain": GENERAL,
+    "quiz_request": QUIZ,
+    "answer_submission": SHORT_MARKING,
+    "nine_mark": EXTENDED_MARKING,
+}
+
+
+def load_routes(config=None):
+    """Default routes with overrides from a ``{route: {field: value}}`` mapping"""
+    routes = dict(DEFAULT_ROUTES)
+    for name, overrides in (config or {}).items():
+        overrides = {field: value for field, value in dict(overrides).items() if field in Route.FIELDS}
+        base = routes.get(name, DEFAULT_ROUTES[GENERAL])
+        routes[name] = base.replace(name, **overrides)
+    return routes
+
+
+# "define X", "what does X mean", "what is X?" with X a term of up to three words
+DEFINITION_REQUEST = re.compile(
+    r"^(?:define\b|definitions? of\b|meaning of\b|what (?:is|are) meant by\b|what does .{1,40} mean\b|"
+    r"what(?:'s| is| are) (?:a |an |the )?[\w-]+(?: [\w-]+){0,2}\W*$)")
+POLITE_OPENING = re.compile(r"^(?:(?:please|pls|can you|could you|quickly)\s+)+")
+
+
+def is_definition(message):
+    """True if ``message`` only asks what a term means"""
+    return bool(DEFINITION_REQUEST.search(POLITE_OPENING.sub("", message.lower().strip())))
+
+
+def route_for(routes, intent, message=""):
+    """The route for ``message`` with ``intent`` (``None`` when untagged or uncertain)"""
+    name = DEFINITION if intent == "explain" and is_definition(message) else ROUTE_FOR_INTENT.get(intent, GENERAL)
+    return routes.get(name, routes[GENERAL])
+
+
+def timed(deltas, metrics, route):
+    """Pass ``deltas`` through, recording time to first token and to the full reply"""
+    started = time.monotonic()
+    first = True
+    for delta in deltas:
+        if first:
+            metrics.observe(f"route_{route.name}_first_token_seconds", time.monotonic() - started)
+            first = False
+        yield delta
+    metrics.observe(f"route_{route.name}_seconds", time.monotonic() - started)
+
+
+def record_route_usage(metrics, route, provider, usage):
+    """Add a response's token counts to its route's statistics"""
+    if usage is None:
+        return
+    input_tokens, _, output_tokens = usage_tokens(provider, usage)
+    metrics.incr(f"route_{route.name}_requests")
+    metrics.observe(f"route_{route.name}_input_tokens", input_tokens)
+    metrics.observe(f"route_{route.name}_output_tokens", output_tokens)
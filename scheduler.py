@@ -0,0 +1,224 @@
+"""Process-wide admission control for model requests.
+
+Every session's model request waits here for a turn before it reaches a
+provider. Turns are limited by three things:
+
+* token buckets for requests per minute and tokens per minute, with tokens
+  estimated as the prompt size plus ``max_tokens``;
+* a cap on requests in flight at once;
+* fair queueing. Waiting requests are served round-robin across classes,
+  then across students within a class, so one busy class cannot starve the
+  rest.
+
+A rate-limit response (HTTP 429) that arrives before any text has streamed
+pauses every request for a jittered, exponentially growing delay (or the
+provider's ``Retry-After``), then the request is queued and retried.
+"""
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+
+REQUESTS_PER_MINUTE = 500
+TOKENS_PER_MINUTE = 200000
+MAX_CONCURRENT = 20
+MAX_RETRIES = 4
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 30.0
+WAIT_POLL = 0.25
+
+
+class TokenBucket:
+    """``rate`` units per ``period`` seconds, with bursts of up to ``capacity``"""
+
+    def __init__(self, rate, capacity=None, period=60.0):
+        self.rate = rate / period
+        self.capacity = capacity or rate
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until ``amount`` is available (0 if it is now)"""
+        self._refill(now)
+        # A request larger than the whole bucket waits for a full bucket
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount, now):
+        self._refill(now)
+        self.level -= min(amount, self.capacity)
+
+
+def is_rate_limited(error):
+    """True for a provider's HTTP 429 response"""
+    return getattr(error, "status_code", None) == 429
+
+
+def retry_after(error):
+    """The provider's ``Retry-After`` in seconds, if it sent one"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after", 0) or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def backoff_delay(attempt, minimum=0.0, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    """Full-jitter exponential backoff, never shorter than ``minimum``"""
+    return max(minimum, random.uniform(0, min(cap, base * 2 ** attempt)))
+
+
+class Ticket:
+    """A place in the queue, and then a slot in flight"""
+
+    __slots__ = ("group", "owner", "tokens", "enqueued", "admitted")
+
+    def __init__(self, group, owner, tokens):
+        self.group = group
+        self.owner = owner
+        self.tokens = tokens
+        self.enqueued = time.monotonic()
+        self.admitted = False
+
+
+class Scheduler:
+    """Fair, rate-limited admission for every session's model requests"""
+
+    def __init__(self, requests_per_minute=REQUESTS_PER_MINUTE, tokens_per_minute=TOKENS_PER_MINUTE,
+                 max_concurrent=MAX_CONCURRENT, max_retries=MAX_RETRIES, metrics=None, period=60.0):
+        # ``period`` only shrinks the "minute" for load tests
+        self.requests = TokenBucket(requests_per_minute, period=period)
+        self.tokens = TokenBucket(tokens_per_minute, period=period)
+        self.max_concurrent = max_concurrent
+        self.max_retries = max_retries
+        self.metrics = metrics
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._cond = threading.Condition()
+        # group (class) -> owner (student) -> tickets, each level in round-robin order
+        self._queues = OrderedDict()
+
+    def _observe(self, name, value):
+        if self.metrics is not None:
+            self.metrics.observe(name, value)
+
+    def _incr(self, name):
+        if self.metrics is not None:
+            self.metrics.incr(name)
+
+    def _order(self):
+        """Waiting tickets in the order they will be admitted"""
+        groups = [[deque(tickets) for tickets in owners.values()] for owners in self._queues.values()]
+        cursors = [0] * len(groups)
+        order = []
+        while any(groups):
+            for g, owners in enumerate(groups):
+                if not owners:
+                    continue
+                owner = owners[cursors[g] % len(owners)]
+                order.append(owner.popleft())
+                if owner:
+                    cursors[g] += 1
+                else:
+                    owners.remove(owner)
+        return order
+
+    @property
+    def queued(self):
+        with self._cond:
+            return sum(len(tickets) for owners in self._queues.values() for tickets in owners.values())
+
+    def _dequeue(self, ticket):
+        owners = self._queues[ticket.group]
+        tickets = owners[ticket.owner]
+        tickets.remove(ticket)
+        # Served groups and owners go to the back of the rotation
+        del owners[ticket.owner]
+        if tickets:
+            owners[ticket.owner] = tickets
+        del self._queues[ticket.group]
+        if owners:
+            self._queues[ticket.group] = owners
+
+    def acquire(self, group, owner, tokens, on_wait=None):
+        """Wait for a turn; ``on_wait(position)`` is called while queued"""
+        ticket = Ticket(group, owner, tokens)
+        reported = None
+        with self._cond:
+            self._queues.setdefault(group, OrderedDict()).setdefault(owner, deque()).append(ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    order = self._order()
+                    wait = self.paused_until - now
+                    if order[0] is ticket and wait <= 0 and self.in_flight < self.max_concurrent:
+                        wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+                        if wait <= 0:
+                            self.requests.take(1, now)
+                            self.tokens.take(tokens, now)
+                            self._dequeue(ticket)
+                            self.in_flight += 1
+                            ticket.admitted = True
+                            self._cond.notify_all()
+                            break
+                    position = order.index(ticket) + 1
+                    if on_wait and position != reported:
+                        reported = position
+                        # Release the lock while the caller redraws its placeholder
+                        self._cond.release()
+                        try:
+                            on_wait(position)
+                        finally:
+                            self._cond.acquire()
+                        continue
+                    self._cond.wait(min(WAIT_POLL, wait) if wait > 0 else WAIT_POLL)
+            finally:
+                if not ticket.admitted:
+                    self._dequeue(ticket)
+                    self._cond.notify_all()
+        self._observe("scheduler_wait_seconds", time.monotonic() - ticket.enqueued)
+        return ticket
+
+    def release(self, ticket):
+        with self._cond:
+            if ticket.admitted:
+                ticket.admitted = False
+                self.in_flight -= 1
+                self._cond.notify_all()
+
+    def pause(self, seconds):
+        """Hold every queued request for ``seconds``, e.g. after a 429"""
+        with self._cond:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def stream(self, start, group, owner, tokens, on_wait=None):
+        """Yield text from ``start()`` once admitted, retrying rate limits.
+
+        ``start`` creates a fresh text stream per attempt. A rate limit is only
+        retried before any text has been yielded. ``on_wait(position)`` reports
+        the queue position, and 0 while waiting out a rate limit.
+        """
+        attempt = 0
+        while True:
+            ticket = self.acquire(group, owner, tokens, on_wait)
+            streamed = False
+            try:
+                for delta in start():
+                    streamed = True
+                    yield delta
+                return
+            except Exception as e:
+                if streamed or not is_rate_limited(e) or attempt >= self.max_retries:
+                    raise
+                delay = backoff_delay(attempt, retry_after(e))
+                self._incr("scheduler_rate_limited")
+                self.pause(delay)
+                attempt += 1
+            finally:
+                self.release(ticket)
+            if on_wait:
+                on_wait(0)
@@ -0,0 +1,294 @@
+"""Write-behind persistence of quiz records to Google Sheets.
+
+Saving a record used to authorise a service account, open the spreadsheet and
+append one row on the thread rendering the student's rerun: several HTTP
+round trips for every marked answer. ``SheetWriter`` adds records to a buffer
+instead and returns at once. A background thread writes them with one
+``append_rows`` call per batch, when ``batch_size`` rows are waiting or the
+oldest has waited ``flush_interval`` seconds.
+
+The buffer is either ``MemoryBuffer``, bounded and lost on restart, or the
+durable SQLite ``outbox.Outbox``. Rows leave the buffer only once the sheet
+has them, so a failed batch is simply retried, with jittered backoff and a
+reopened handle. Each row ends with its record's key. When the worksheet is
+opened (at start-up and after every failed write) the keys already in the
+sheet are read, and rows the sheet already has are not appended again. A
+write that timed out after reaching Google, or a crash between writing and
+clearing the outbox, therefore cannot duplicate rows.
+
+The worksheet handle (and the authorised client inside it) is otherwise
+reused. If a ``MemoryBuffer`` is full, ``put`` waits up to ``put_timeout`` for
+room and then drops the record rather than stall the student. ``close``
+writes whatever is left when the server shuts down.
+
+``FakeSheet`` is an in-memory stand-in for a worksheet, with per-call latency
+and injectable errors, for benchmarks and trying the writer without Google.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from itertools import islice
+
+from scheduler import backoff_delay
+
+SCOPES = [
+    'https://www.googleapis.com/auth/spreadsheets',
+    'https://www.googleapis.com/auth/drive'
+]
+
+BATCH_SIZE = 20
+FLUSH_INTERVAL = 5.0
+MAX_PENDING = 1000
+PUT_TIMEOUT = 0.5
+RETRY_CAP = 60.0
+CLOSE_TIMEOUT = 10.0
+
+# Sheets cells hold at most 50,000 characters; the marking text is cut well short of that
+MAX_TEXT_CHARS = 1000
+
+# The record key is the last column, after the five written before keys existed
+KEY_COLUMN = 6
+
+
+def record_key(quiz_record):
+    """The record's id, or a hash of its content for records made without one"""
+    if quiz_record.get("record_id"):
+        return quiz_record["record_id"]
+    return hashlib.sha1(json.dumps(quiz_record, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def record_row(quiz_record):
+    """The sheet row for a quiz record"""
+    return [
+        quiz_record["timestamp"],
+        quiz_record["student_name"],
+        quiz_record["student_class"],
+        quiz_record["topic"],
+        quiz_record["raw_marking_text"][:MAX_TEXT_CHARS],
+        record_key(quiz_record)
+    ]
+
+
+def open_google_sheet(service_account_info, sheet_id):
+    """The first worksheet of a Google Sheet, opened with a service account"""
+    import gspread
+    from google.oauth2.service_account import Credentials
+
+    creds = Credentials.from_service_account_info(service_account_info, scopes=SCOPES)
+    return gspread.authorize(creds).open_by_key(sheet_id).sheet1
+
+
+class FakeSheet:
+    """In-memory worksheet with per-call latency; the first ``fail_calls`` appends raise"""
+
+    def __init__(self, latency=0.0, fail_calls=0):
+        self.latency = latency
+        self.fail_calls = fail_calls
+        self.rows = []
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def append_row(self, values, **kwargs):
+        self.append_rows([values], **kwargs)
+
+    def append_rows(self, values, **kwargs):
+        with self._lock:
+            self.calls += 1
+            failed = self.calls <= self.fail_calls
+        time.sleep(self.latency)
+        if failed:
+            raise ConnectionError("fake Sheets API error")
+        with self._lock:
+            self.rows.extend(list(row) for row in values)
+
+    def col_values(self, col):
+        with self._lock:
+            self.calls += 1
+            return [row[col - 1] for row in self.rows if len(row) >= col]
+
+
+class MemoryBuffer:
+    """Rows waiting for the sheet, oldest first, held in memory up to ``max_pending``"""
+
+    def __init__(self, max_pending=MAX_PENDING):
+        self.max_pending = max_pending
+        self._rows = OrderedDict()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def full(self):
+        return len(self._rows) >= self.max_pending
+
+    def add(self, key, row):
+        if key not in self._rows:
+            if self.full():
+                return False
+            self._rows[key] = row
+        return True
+
+    def batch(self, limit):
+        """The oldest ``limit`` rows as (key, row) pairs"""
+        return list(islice(self._rows.items(), limit))
+
+    def ack(self, keys):
+        for key in keys:
+            self._rows.pop(key, None)
+
+
+class SheetWriter:
+    """Buffers quiz records and appends them to a worksheet in batches on a background thread"""
+
+    def __init__(self, open_worksheet, buffer=None, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL,
+                 put_timeout=PUT_TIMEOUT, metrics=None):
+        # ``open_worksheet()`` returns an object with gspread's ``append_rows`` and ``col_values``
+        self.open_worksheet = open_worksheet
+        self.buffer = MemoryBuffer() if buffer is None else buffer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.metrics = metrics
+        self.written = 0
+        self.skipped = 0
+        self.batches = 0
+        self.errors = 0
+        self.dropped = 0
+        self.last_error = None
+        self._worksheet = None
+        self._sheet_keys = set()
+        self._pending = len(self.buffer)
+        # Rows left in a durable buffer by an earlier run are replayed straight away
+        self._oldest = time.monotonic() - flush_interval if self._pending else None
+        self._flush_waiters = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="sheet-writer")
+        self._thread.start()
+
+    def _incr(self, name, amount=1):
+        if self.metrics is not None:
+            self.metrics.incr(name, amount)
+
+    def _observe(self, name, value):
+        if self.metrics is not None:
+            self.metrics.observe(name, value)
+
+    def put(self, quiz_record):
+        """Add a record to the buffer; False if it was dropped because the buffer stayed full"""
+        row = record_row(quiz_record)
+        deadline = time.monotonic() + self.put_timeout
+        with self._cond:
+            # Backpressure: wait briefly for the writer to make room, never indefinitely
+            while self.buffer.full() and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            if self._closed or not self.buffer.add(row[KEY_COLUMN - 1], row):
+                self.dropped += 1
+                self._incr("sheets_dropped")
+                return False
+            self._pending = len(self.buffer)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            if self._pending >= self.batch_size:
+                self._cond.notify_all()
+        return True
+
+    def _due(self, now):
+        if not self._pending:
+            return False
+        return (self._pending >= self.batch_size or self._closed or self._flush_waiters > 0
+                or now - self._oldest >= self.flush_interval)
+
+    def _run(self):
+        failures = 0
+        while True:
+            with self._cond:
+                while not self._due(time.monotonic()):
+                    if self._closed and not self._pending:
+                        return
+                    timeout = None if not self._pending else self._oldest + self.flush_interval - time.monotonic()
+                    self._cond.wait(timeout)
+                batch = self.buffer.batch(self.batch_size)
+            # Rows stay in the buffer until the sheet has them, so a failed batch is retried as it is
+            ok = self._write(batch)
+            with self._cond:
+                if ok:
+                    self.buffer.ack(key for key, _ in batch)
+                self._pending = len(self.buffer)
+                self._oldest = time.monotonic() if self._pending else None
+                self._cond.notify_all()
+            if ok:
+                failures = 0
+            else:
+                failures += 1
+                time.sleep(backoff_delay(failures, cap=RETRY_CAP))
+
+    def _write(self, batch):
+        started = time.monotonic()
+        try:
+            if self._worksheet is None:
+                worksheet = self.open_worksheet()
+                # A write whose outcome was never seen may have reached the sheet
+                self._sheet_keys = set(worksheet.col_values(KEY_COLUMN))
+                self._worksheet = worksheet
+            rows = [row for key, row in batch if key not in self._sheet_keys]
+            if rows:
+                self._worksheet.append_rows(rows)
+        except Exception as e:
+            # An expired or revoked handle is opened again on the next attempt
+            self._worksheet = None
+            self.errors += 1
+            self.last_error = str(e)
+            self._incr("sheets_errors")
+            print(f"Google Sheets error: {e}")
+            return False
+        self.written += len(rows)
+        self.skipped += len(batch) - len(rows)
+        self.batches += 1
+        self._incr("sheets_rows_written", len(rows))
+        self._observe("sheets_batch_seconds", time.monotonic() - started)
+        return True
+
+    def pending(self):
+        """Records in the buffer, including any batch being written"""
+        with self._cond:
+            return self._pending
+
+    def flush(self, timeout=None):
+        """Write everything buffered now; True if it was all written within ``timeout``"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._flush_waiters += 1
+            self._cond.notify_all()
+            try:
+                while self._pending:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+                return True
+            finally:
+                self._flush_waiters -= 1
+
+    def close(self, timeout=CLOSE_TIMEOUT):
+        """Stop taking records and write the rest; returns how many could not be written in time"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        return self.pending()
+
+    def stats(self):
+        return {
+            'pending': self.pending(),
+            'written': self.written,
+            'skipped': self.skipped,
+            'batches': self.batches,
+            'errors': self.errors,
+            'dropped': self.dropped,
+            'last_error': self.last_error,
+        }
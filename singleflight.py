@@ -0,0 +1,149 @@
+"""Coalescing of identical model requests that are in flight at the same time.
+
+When a class clicks the same suggestion chip at the start of a lesson, every
+session would otherwise make the same provider call. ``SingleFlight`` lets
+the first request (the leader) make the call while identical requests that
+arrive before it finishes attach to it and stream the same text. A request
+is identical if its normalised messages, model settings and corpus version
+match. Followers only see text; token usage is recorded once, by the leader.
+If the leading session stops reading part-way (e.g. on a rerun), the rest of
+the reply is read on a background thread for its followers. If the leader
+fails before a follower has received any text, the follower makes its own
+call instead.
+"""
+import hashlib
+import json
+import threading
+
+from response_cache import normalise_prompt
+
+POLL_INTERVAL = 0.02
+
+
+def request_fingerprint(provider, model, corpus_version, messages, **settings):
+    """Stable key for a request: provider, model, settings and normalised messages"""
+    normalised = [[m["role"], normalise_prompt(m["content"])] for m in messages]
+    payload = json.dumps([provider, model, corpus_version, sorted(settings.items()), normalised])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Abandoned(Exception):
+    """The leading request stopped before its reply was complete"""
+
+
+class Relay:
+    """Text deltas written by one thread and read, as they arrive, by others"""
+
+    def __init__(self):
+        self.error = None
+        self.followers = 0
+        self._parts = []
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    def append(self, delta):
+        with self._lock:
+            self._parts.append(delta)
+
+    def finish(self, error=None):
+        self.error = error
+        self._done.set()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def deltas(self):
+        """Yield everything written so far, then the rest as it arrives"""
+        sent = 0
+        while True:
+            finished = self._done.is_set()
+            with self._lock:
+                pending = self._parts[sent:]
+            for delta in pending:
+                yield delta
+            sent += len(pending)
+            if finished:
+                break
+            self._done.wait(POLL_INTERVAL)
+        if self.error is not None:
+            raise self.error
+
+
+class SingleFlight:
+    """Shares one provider call between identical concurrent requests"""
+
+    def __init__(self, metrics=None):
+        self.metrics = metrics
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def stream(self, key, start):
+        """Yield the text of ``start()``, or of an identical call already in flight"""
+        with self._lock:
+            relay = self._flights.get(key)
+            leader = relay is None
+            if leader:
+                relay = self._flights[key] = Relay()
+            else:
+                relay.followers += 1
+        if leader:
+            yield from self._lead(key, relay, start)
+        else:
+            if self.metrics is not None:
+                self.metrics.incr("singleflight_collapsed")
+            yield from self._follow(relay, start)
+
+    def _lead(self, key, relay, start):
+        deltas = start()
+        error = None
+        handed_off = False
+        try:
+            for delta in deltas:
+                relay.append(delta)
+                yield delta
+        except GeneratorExit:
+            # The leading session stopped reading; finish the reply for its followers
+            if relay.followers:
+                handed_off = True
+                threading.Thread(target=self._drain, args=(key, relay, deltas), daemon=True).start()
+                return
+            error = Abandoned()
+            raise
+        except BaseException as e:
+            error = e if isinstance(e, Exception) else Abandoned()
+            raise
+        finally:
+            if not handed_off:
+                self._finish(key, relay, error)
+
+    def _drain(self, key, relay, deltas):
+        error = None
+        try:
+            for delta in deltas:
+                relay.append(delta)
+        except Exception as e:
+            error = e
+        self._finish(key, relay, error)
+
+    def _finish(self, key, relay, error):
+        relay.finish(error)
+        with self._lock:
+            if self._flights.get(key) is relay:
+                del self._flights[key]
+
+    def _follow(self, relay, start):
+        received = False
+        try:
+            for delta in relay.deltas():
+                received = True
+                yield delta
+        except Exception:
+            if received:
+                raise
+            if self.metrics is not None:
+                self.metrics.incr("singleflight_fallbacks")
+            yield from start()
+
+    def __len__(self):
+        return len(self._flights)
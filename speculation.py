@@ -0,0 +1,62 @@
+"""Background model requests started before the student is ready for them.
+
+A question asked before onboarding (a suggestion chip, or a message typed
+before "Name, Class") is sent to the model straight away on a worker thread.
+Its text is buffered while the student types their details, then replayed,
+or streamed on as it arrives if still running, once onboarding finishes. Each
+run carries a key describing everything that shapes the answer; if the key
+has changed by the time the reply is needed the run is cancelled instead.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from singleflight import Relay
+
+MAX_WORKERS = 4
+
+
+def new_pool(max_workers=MAX_WORKERS):
+    """Thread pool shared by every session's speculative requests"""
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="speculate")
+
+
+class Speculation:
+    """One speculative request, buffering its text deltas as they arrive"""
+
+    def __init__(self, key, deltas, pool):
+        self.key = key
+        self.started = time.monotonic()
+        self.relay = Relay()
+        self._cancelled = False
+        pool.submit(self._run, deltas)
+
+    def _run(self, deltas):
+        error = None
+        try:
+            for delta in deltas:
+                if self._cancelled:
+                    break
+                self.relay.append(delta)
+        except Exception as e:
+            error = e
+        finally:
+            # Closing the generator closes the provider stream
+            close = getattr(deltas, "close", None)
+            if close:
+                close()
+            self.relay.finish(error)
+
+    @property
+    def failed(self):
+        return self.relay.done and self.relay.error is not None
+
+    def matches(self, key):
+        return not self._cancelled and key == self.key
+
+    def cancel(self):
+        """Stop reading the reply; the worker drops it at the next delta"""
+        self._cancelled = True
+
+    def deltas(self):
+        """Yield the buffered text, then the rest as it arrives"""
+        return self.relay.deltas()
@@ -0,0 +1,149 @@
+"""The J204 specification: units, assessment objectives and command words.
+
+The unit titles and assessment objectives are shared by the question bank and
+the intent router. ``SYLLABUS``, the whole specification as text, follows the
+system prompt in Anthropic requests: it is the same for every student and
+every turn, and it takes the cached prefix past Anthropic's minimum length
+(see ``prompting.py``).
+"""
+AO_LEVELS = ("AO1", "AO2", "AO3")
+# Marks per question at each level, as in the system prompt's quiz rules
+AO_MARKS = {"AO1": (1, 2), "AO2": (2, 3), "AO3": (3, 6)}
+AO_DESCRIPTIONS = {
+    "AO1": "recall of knowledge (Identify, State, Define)",
+    "AO2": "application to a business context (Explain, Calculate)",
+    "AO3": "analysis and evaluation (Analyse, Evaluate, Justify)",
+}
+
+UNITS = {
+    "1.1": "The role of business enterprise and entrepreneurship",
+    "1.2": "Business planning",
+    "1.3": "Business ownership",
+    "1.4": "Business aims and objectives",
+    "1.5": "Stakeholders in business",
+    "1.6": "Business growth",
+    "2.1": "The role of marketing",
+    "2.2": "Market research",
+    "2.3": "Market segmentation",
+    "2.4": "The marketing mix",
+    "3.1": "The role of human resources",
+    "3.2": "Organisational structures and different ways of working",
+    "3.3": "Communication in business",
+    "3.4": "Recruitment and selection",
+    "3.5": "Motivation and retention",
+    "3.6": "Training and development",
+    "3.7": "Employment law",
+    "4.1": "Production processes",
+    "4.2": "Quality of goods and services",
+    "4.3": "The sales process and customer service",
+    "4.4": "Consumer law",
+    "4.5": "Business location",
+    "4.6": "Working with suppliers",
+    "5.1": "The role of the finance function",
+    "5.2": "Sources of finance",
+    "5.3": "Revenue, costs, profit and loss",
+    "5.4": "Break-even",
+    "5.5": "Cash and cash flow",
+    "6.1": "Ethical and environmental considerations",
+    "6.2": "The economic climate",
+    "6.3": "Globalisation",
+    "7": "The interdependent nature of business",
+}
+
+# What each unit covers, after the J204 specification
+UNIT_CONTENT = {
+    "1.1": "why businesses exist; entrepreneurs and their characteristics; risk and reward; adding value; "
+           "spotting a gap in the market",
+    "1.2": "purpose and contents of a business plan; uses for owners, lenders and investors; limits of planning",
+    "1.3": "sole traders, partnerships, private and public limited companies, franchises, social enterprises; "
+           "unlimited and limited liability; choosing and changing ownership",
+    "1.4": "aims and objectives (survival, profit, growth, market share, customer satisfaction, ethics); "
+           "SMART objectives; how objectives change as a business grows",
+    "1.5": "internal and external stakeholders; their objectives and influence; conflict between stakeholder groups",
+    "1.6": "organic growth (new products, new markets, new locations) and external growth (mergers, takeovers); "
+           "economies and diseconomies of scale; sources of finance for growth",
+    "2.1": "purpose of marketing; identifying and anticipating customer needs; informing, persuading and "
+           "retaining customers",
+    "2.2": "primary research (surveys, questionnaires, focus groups, observation) and secondary research; "
+           "qualitative and quantitative data; cost, accuracy and sample size; interpreting charts and tables",
+    "2.3": "segmenting a market by age, gender, income, location and lifestyle; target markets; market maps; "
+           "competition, monopoly and barriers to entry",
+    "2.4": "the 4 Ps; product life cycle and extension strategies; product portfolio; pricing methods "
+           "(cost-plus, competitive, penetration, skimming); promotion (advertising, sponsorship, social media, "
+           "sales promotion); place and distribution channels including e-commerce; balancing the mix",
+    "3.1": "purpose of human resources; workforce planning; HR as a cost and an asset",
+    "3.2": "hierarchical and flat structures; span of control, chain of command, delegation; centralised and "
+           "decentralised decision making; full-time, part-time, flexible, zero-hours and remote working",
+    "3.3": "purpose of communication; formal and informal, written, verbal and digital methods; barriers to "
+           "effective communication and their impact",
+    "3.4": "job descriptions and person specifications; internal and external recruitment; application forms, "
+           "CVs, interviews and tests; costs and benefits of each method",
+    "3.5": "financial motivation (pay, bonus, commission, profit share) and non-financial motivation (praise, "
+           "job rotation, job enrichment, empowerment, teamwork); retention and labour turnover",
+    "3.6": "induction, on-the-job and off-the-job training; ongoing development; costs and benefits of training",
+    "3.7": "contracts of employment; the national minimum and living wage; discrimination and equality law; "
+           "health and safety; how employment law affects businesses",
+    "4.1": "job, batch and flow production; lean production and just-in-time stock control; the impact of "
+           "technology on production and productivity",
+    "4.2": "quality control and quality assurance; the cost of poor quality; quality as a competitive advantage",
+    "4.3": "the sales process; product knowledge, customer engagement, responding to feedback, after-sales "
+           "service; the benefits of good customer service",
+    "4.4": "consumer rights (goods that are of satisfactory quality, fit for purpose and as described); "
+           "the costs of meeting consumer law and of breaking it",
+    "4.5": "factors in choosing a location: costs, labour, customers, competitors, infrastructure, "
+           "the internet and e-commerce",
+    "4.6": "choosing suppliers on cost, quality, reliability and trust; procurement and logistics; "
+           "the effect of suppliers on a business's costs and reputation",
+    "5.1": "purpose of the finance function; its influence on business activity and decision making",
+    "5.2": "internal sources (retained profit, selling assets) and external sources (loans, overdrafts, share "
+           "capital, venture capital, crowdfunding, trade credit, leasing); choosing a suitable source",
+    "5.3": "revenue; fixed, variable and total costs; gross and net profit; profit margins; average rate of "
+           "return; calculating and interpreting these figures",
+    "5.4": "break-even point and break-even charts; margin of safety; using break-even in decision making and "
+           "its limitations",
+    "5.5": "the importance of cash; cash flow forecasts (inflows, outflows, net cash flow, opening and closing "
+           "balances); improving cash flow; working capital; cash versus profit",
+    "6.1": "ethical considerations (fair trade, treatment of workers and suppliers); environmental "
+           "considerations (sustainability, pollution, waste); trade-offs with profit",
+    "6.2": "unemployment, inflation, interest rates, exchange rates and consumer income, and their effects on "
+           "businesses and consumers",
+    "6.3": "globalisation; imports and exports; multinational companies; opportunities and threats for UK "
+           "businesses; the effect of exchange rates on trade",
+    "7": "how the functional areas (marketing, people, operations, finance) depend on each other and on external "
+         "influences; the effect of one decision across the business; synoptic 9-mark questions",
+}
+
+# OCR's command words, as the mark schemes read them
+COMMAND_WORDS = {
+    "Identify / State": "give a point or fact, with no explanation needed",
+    "Outline": "set out the main characteristics in a sentence or two",
+    "Describe": "give an account of the main features, without reasons",
+    "Explain": "give a point and develop it with a reason or consequence (because..., which means...)",
+    "Calculate": "work out a figure, showing the formula and each step",
+    "Analyse": "build a chain of reasoning, linking causes and effects to the business in the question",
+    "Evaluate": "weigh the arguments for and against, then reach a judgement that depends on the context",
+    "Justify": "choose an option and support it with reasons why it is better than the alternatives",
+    "Recommend": "make a decision for the business and justify it with evidence from the case study",
+}
+
+
+def syllabus_text():
+    """The specification as a reference block: units with their content, assessment objectives and command words"""
+    lines = ["📖 J204 SPECIFICATION (use these unit numbers and titles when you refer to the course):"]
+    for code, title in UNITS.items():
+        lines.append(f"- Unit {code} {title}: {UNIT_CONTENT[code]}")
+    lines.append("")
+    lines.append("🎯 ASSESSMENT OBJECTIVES AND MARKS PER QUESTION:")
+    for level, description in AO_DESCRIPTIONS.items():
+        low, high = AO_MARKS[level]
+        lines.append(f"- {level}: {description}; {low}-{high} marks")
+    lines.append("- 9-mark questions assess AO2 and AO3: apply the case study, analyse both sides with chains of "
+                 "reasoning, and reach a justified conclusion")
+    lines.append("")
+    lines.append("🗝️ COMMAND WORDS:")
+    for word, meaning in COMMAND_WORDS.items():
+        lines.append(f"- {word}: {meaning}")
+    return "\n".join(lines)
+
+
+SYLLABUS = syllabus_text()
@@ -0,0 +1,99 @@
+"""Content-addressed on-disk cache of extracted PDF text.
+
+Entries are keyed by a content hash (the git blob SHA of the file bytes), so a
+process restart or a re-upload of the same PDF skips parsing entirely. The
+cache is bounded in bytes and evicts the least recently used entries first.
+"""
+import os
+import tempfile
+import threading
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "ocr-revision-buddy", "pdf-text")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class TextCache:
+    """Thread-safe, size-bounded text store on the local filesystem"""
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._sizes = {}
+        for folder, _, names in os.walk(directory):
+            for name in names:
+                if name.endswith(".txt"):
+                    self._sizes[name[:-4]] = os.path.getsize(os.path.join(folder, name))
+        self.total_bytes = sum(self._sizes.values())
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.txt")
+
+    def get(self, key):
+        """Return the cached text for ``key`` or ``None``"""
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as handle:
+                text = handle.read()
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        # Touch the entry so eviction sees it as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return text
+
+    def put(self, key, text):
+        """Store ``text`` under ``key`` and evict old entries if over budget"""
+        path = self._path(key)
+        data = text.encode("utf-8")
+        if len(data) > self.max_bytes:
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so a concurrent reader never sees half a file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as handle:
+            handle.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.total_bytes += len(data) - self._sizes.get(key, 0)
+            self._sizes[key] = len(data)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        def last_used(key):
+            try:
+                return os.path.getmtime(self._path(key))
+            except OSError:
+                return 0
+
+        for key in sorted(self._sizes, key=last_used):
+            if self.total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            self.total_bytes -= self._sizes.pop(key)
+            self.evictions += 1
+
+    def stats(self):
+        """Counters for the teacher dashboard"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._sizes),
+                'bytes': self.total_bytes,
+            }